@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auction', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['starting_date', 'id'], name='auction_auc_startin_644569_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auction',
+            index=models.Index(fields=['service', 'starting_date', 'id'], name='auction_auc_service_570ff7_idx'),
+        ),
+    ]
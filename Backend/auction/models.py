@@ -15,4 +15,10 @@ class Auction(models.Model):
     starting_bid = models.IntegerField()
     time_frame = models.IntegerField()
 
-    service = models.ForeignKey(Service, on_delete=models.CASCADE)
\ No newline at end of file
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['starting_date', 'id']),
+            models.Index(fields=['service', 'starting_date', 'id']),
+        ]
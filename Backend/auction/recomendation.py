@@ -1,8 +1,22 @@
-import json
+from datetime import datetime
 from openai import OpenAI
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Any
 
+from service.models import split_categories
+from service.recomendation import LLM_TIMEOUT, parse_recomendation
+
+
+# Peso de una subasta histórica por cada rasgo que comparte con la nueva
+CATEGORY_WEIGHT = 2
+WEEKDAY_WEIGHT = 1
+WEEKEND_WEIGHT = 1
+
+# Fracción del valor estimado que se recomienda como puja inicial cuando no hay subastas históricas
+VALUE_RANGE = (0.8, 1.0)
+VALUE_OPTIMO = 0.9
+
 
 # Procesar y analizar los datos históricos
 def analyze_historical_data(data: pd.DataFrame) -> Dict[str, Any]:
@@ -45,13 +59,76 @@ def analyze_historical_data(data: pd.DataFrame) -> Dict[str, Any]:
     
     return analysis
 
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: List[float]) -> np.ndarray:
+    """Cuantiles de unos valores en los que cada uno cuenta según su peso"""
+    order = np.argsort(values)
+    values = values[order]
+    weights = weights[order]
+    positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+    return np.interp(quantiles, positions, values)
+
+
+def local_starting_bid_recommendation(
+    historical_data_list: List[Dict],
+    service_category: str,
+    estimated_value: float,
+    end_date
+) -> Dict[str, Any]:
+    """
+    Recomienda un starting_bid sin llamar al modelo.
+
+    Cada subasta histórica con ganador pesa más cuanto más se parece a la
+    nueva: si comparte alguna categoría, si acaba el mismo día de la semana y
+    si ambas acaban en fin de semana o entre semana. El rango son los
+    cuartiles ponderados de sus starting_bid y el óptimo la mediana. Sin
+    subastas históricas se parte del valor estimado.
+
+    Args:
+        historical_data_list: Subastas históricas con starting_bid, end_date y category
+        service_category: Categoría del servicio a subastar
+        estimated_value: Valor estimado por el vendedor
+        end_date: Fecha de la subasta (YYYY-MM-DD)
+
+    Returns:
+        Diccionario con "rango" y "optimo", vacío si no hay datos
+    """
+    data = pd.DataFrame(historical_data_list, columns=['starting_bid', 'end_date', 'category'])
+    if data.empty:
+        if not estimated_value:
+            return {}
+        return {
+            "rango": f"{estimated_value * VALUE_RANGE[0]:.0f}-{estimated_value * VALUE_RANGE[1]:.0f}",
+            "optimo": int(round(estimated_value * VALUE_OPTIMO)),
+        }
+
+    categories = set(split_categories(service_category))
+    weights = 1 + CATEGORY_WEIGHT * data['category'].map(
+        lambda category: bool(categories & set(split_categories(category)))
+    ).to_numpy(dtype=float)
+    try:
+        weekday = datetime.strptime(str(end_date), '%Y-%m-%d').weekday()
+    except ValueError:
+        weekday = None
+    if weekday is not None:
+        weekdays = pd.to_datetime(data['end_date']).dt.weekday.to_numpy()
+        weights += WEEKDAY_WEIGHT * (weekdays == weekday)
+        weights += WEEKEND_WEIGHT * ((weekdays >= 5) == (weekday >= 5))
+
+    low, optimo, high = weighted_quantiles(data['starting_bid'].to_numpy(dtype=float), weights, [0.25, 0.5, 0.75])
+    return {
+        "rango": f"{low:.0f}-{high:.0f}",
+        "optimo": int(round(optimo)),
+    }
+
+
 # Función principal para generar recomendaciones
 def generate_starting_bid_recommendation(
     api_key: str,
     historical_data_list: List[Dict],
     service_category: str,
     estimated_value: float,
-    end_date
+    end_date,
+    timeout: float = LLM_TIMEOUT,
 ) -> Dict[str, Any]:
     """
     Genera una recomendación de starting_bid para una nueva subasta.
@@ -64,6 +141,7 @@ def generate_starting_bid_recommendation(
         estimated_value: Valor estimado por el vendedor
         urgency: Urgencia de venta (1-10)
         seller_rating: Calificación del vendedor
+        timeout: Segundos que se espera la respuesta del modelo
         
     Returns:
         Diccionario con la recomendación y justificación
@@ -112,7 +190,7 @@ def generate_starting_bid_recommendation(
     """
 
    
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, timeout=timeout, max_retries=0)
     response = client.chat.completions.create(
         model="gpt-4o-mini",  # o "gpt-4o-mini"
         messages=[
@@ -122,19 +200,6 @@ def generate_starting_bid_recommendation(
         temperature=0.7,
     )
     
-    raw_content = response.choices[0].message.content
-
-    # 2. Limpiar el bloque ```json ... ```
-    cleaned = raw_content.strip("`")  # quita los backticks
-    cleaned = cleaned.replace("json", "", 1).strip()  # quita la palabra "json" si está al inicio
-
-    recomendation = {}
-    # 3. Parsear el contenido JSON
-    try:
-        recomendation = json.loads(cleaned)
-    except json.JSONDecodeError as e:
-        print("Error al parsear JSON:", e)
-    
-    return recomendation
+    return parse_recomendation(response.choices[0].message.content)
 
 
@@ -2,8 +2,9 @@ from rest_framework import serializers
 from .models import Auction
 from django.db.models import Q
 from service.serializers import ServiceSerializer
+from uchoose.serializers import DynamicFieldsMixin
 
-class AuctionSerializer(serializers.ModelSerializer):
+class AuctionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     service_details = ServiceSerializer(source='service', read_only=True)
     class Meta:
         model = Auction
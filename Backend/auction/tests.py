@@ -1,3 +1,78 @@
-from django.test import TestCase
+from datetime import datetime
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from establishment.models import Establishment
+from service.models import Service
+from user.models import CustomUser
+from worker.models import Worker
+from .models import Auction
+from .recomendation import local_starting_bid_recommendation, weighted_quantiles
+
+
+class LocalStartingBidRecommendationTests(SimpleTestCase):
+    """El recomendador local de starting_bid responde sin el modelo"""
+
+    def auction(self, starting_bid, end_date, category):
+        return {'starting_bid': starting_bid, 'end_date': end_date, 'category': category, 'quantity': starting_bid * 2}
+
+    def test_weighted_quantiles(self):
+        values = np.array([1.0, 2.0, 3.0])
+        self.assertEqual(list(weighted_quantiles(values, np.ones(3), [0.5])), [2.0])
+        self.assertGreater(weighted_quantiles(values, np.array([1.0, 1.0, 4.0]), [0.5])[0], 2.0)
+
+    def test_without_history_uses_estimated_value(self):
+        self.assertEqual(
+            local_starting_bid_recommendation([], 'billar', 20, '2025-06-07'),
+            {'rango': '16-20', 'optimo': 18}
+        )
+        self.assertEqual(local_starting_bid_recommendation([], 'billar', 0, '2025-06-07'), {})
+
+    def test_similar_auctions_weigh_more(self):
+        history = [self.auction(50, datetime(2025, 5, 31, 20), 'billar, profesional')] * 3 + [
+            self.auction(5, datetime(2025, 6, 3, 12), 'dardos')
+        ] * 3
+        saturday = local_starting_bid_recommendation(history, 'Billar', 0, '2025-06-07')
+        tuesday = local_starting_bid_recommendation(history, 'dardos', 0, '2025-06-10')
+        self.assertGreater(saturday['optimo'], 25)
+        self.assertLess(tuesday['optimo'], 25)
+        self.assertRegex(saturday['rango'], r'^\d+-\d+$')
+
+
+class AuctionExpandTests(TestCase):
+    """Las subastas solo incluyen el servicio y su establecimiento cuando se piden"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com', rol='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web',
+            owner=Worker.objects.create(rol='owner', user=user)
+        )
+        service = Service.objects.create(
+            name='Billar', description='Billar', category='billar',
+            max_people=4, max_reservation=60, deposit=0, establishment=establishment
+        )
+        for day in range(1, 4):
+            Auction.objects.create(
+                starting_date=datetime(2025, 6, day), end_date=datetime(2025, 6, day, 12),
+                starting_bid=10, time_frame=60, service=service
+            )
+
+    def test_expand_levels(self):
+        auction = self.client.get('/auctions/?expand=service_details').data[0]
+        self.assertEqual(auction['service_details']['name'], 'Billar')
+        self.assertNotIn('establishment_details', auction['service_details'])
+
+        # Una consulta con los joins y otra para los trabajadores de los establecimientos
+        with self.assertNumQueries(2):
+            response = self.client.get('/auctions/?expand=service_details.establishment_details')
+        self.assertEqual(response.data[0]['service_details']['establishment_details']['name'], 'Club')
+
+    def test_fields_without_expand(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/auctions/?fields=id,starting_bid')
+        self.assertEqual([set(auction) for auction in response.data], [{'id', 'starting_bid'}] * 3)
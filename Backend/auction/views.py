@@ -2,28 +2,30 @@ from datetime import datetime
 import os
 from django.shortcuts import get_object_or_404
 from dotenv import load_dotenv
+from openai import OpenAIError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 
-from bid.serializers import BidSerializer
 from bid.models import Bid
 from client.models import Client
 from user.models import CustomUser
-from auction.recomendation import generate_starting_bid_recommendation
+from auction.recomendation import generate_starting_bid_recommendation, local_starting_bid_recommendation
+from service.recomendation import RECOMMENDATION_ENGINES
 from service.models import Service
 from service.views import ServicePriceForDateView
 from .models import Auction
 from .serializers import AuctionSerializer
 from .scraping import obtener_programacion
+from uchoose.pagination import list_response, DATE_ORDERING
+from uchoose.serializers import get_field_options, optimize_queryset
 
 @permission_classes([IsAuthenticated])
 class AuctionListView(APIView):
     def get(self, request):
         auctions = Auction.objects.all()
-        serializer = AuctionSerializer(auctions, many=True)
-        return Response(serializer.data)
+        return list_response(request, auctions, AuctionSerializer)
 
 @permission_classes([IsAuthenticated])
 class AuctionCreateView(APIView):
@@ -38,8 +40,9 @@ class AuctionCreateView(APIView):
 @permission_classes([IsAuthenticated])
 class AuctionDetailView(APIView):
     def get(self, request, pk):
-        auction = get_object_or_404(Auction, pk=pk)
-        serializer = AuctionSerializer(auction)
+        options = get_field_options(request)
+        auction = get_object_or_404(optimize_queryset(Auction.objects.all(), AuctionSerializer(**options)), pk=pk)
+        serializer = AuctionSerializer(auction, **options)
         return Response(serializer.data)
 
 @permission_classes([IsAuthenticated])
@@ -69,9 +72,8 @@ class AuctionEventsView(APIView):
 @permission_classes([IsAuthenticated])
 class AuctionListByServiceView(APIView):
     def get(self, request, fk):
-        auctions = Auction.objects.filter(service=fk).order_by('-starting_date')
-        serializer = AuctionSerializer(auctions, many=True)
-        return Response(serializer.data)
+        auctions = Auction.objects.filter(service=fk).order_by(*DATE_ORDERING)
+        return list_response(request, auctions, AuctionSerializer, ordering=DATE_ORDERING)
     
 
 @permission_classes([IsAuthenticated])
@@ -81,9 +83,8 @@ class AuctionActiveListView(APIView):
         auctions = Auction.objects.filter(
             starting_date__lte=moment_helper,
             end_date__gt=moment_helper
-        ).order_by('-starting_date')
-        serializer = AuctionSerializer(auctions, many=True)
-        return Response(serializer.data)
+        ).order_by(*DATE_ORDERING)
+        return list_response(request, auctions, AuctionSerializer, ordering=DATE_ORDERING)
     
 @permission_classes([IsAuthenticated])
 class AuctionBidListView(APIView):
@@ -97,13 +98,11 @@ class AuctionBidListView(APIView):
             auctions = Auction.objects.filter(
                 starting_date__lte=moment_helper,
                 end_date__gt=moment_helper
-            ).order_by('-starting_date')
-            bids = Bid.objects.filter(client=client, auction__in=auctions)
-            serializer = BidSerializer(bids, many=True)
-            
-            participant_auctions = [bid["auction"] for bid in serializer.data]
-            auctions_serializer = AuctionSerializer(auctions, many=True)
-            filtered_auctions = [auction for auction in auctions_serializer.data if auction['id'] in participant_auctions]
+            ).order_by(*DATE_ORDERING)
+            participant_auctions = Bid.objects.filter(client=client, auction__in=auctions).values('auction')
+            options = get_field_options(request)
+            auctions = optimize_queryset(auctions.filter(id__in=participant_auctions), AuctionSerializer(**options))
+            filtered_auctions = AuctionSerializer(auctions, many=True, **options).data
             
             
         else:
@@ -115,6 +114,13 @@ class AuctionBidListView(APIView):
 class AuctionPriceRecomendation(APIView):
     
     def get(self, request, date, service_id):
+        engine = request.query_params.get('engine', 'llm')
+        if engine not in RECOMMENDATION_ENGINES:
+            return Response(
+                {"error": f"Motor de recomendación inválido. Use {' o '.join(RECOMMENDATION_ENGINES)}"},
+                status=400
+            )
+
         load_dotenv()
 
         # Acceder a las variables
@@ -158,10 +164,22 @@ class AuctionPriceRecomendation(APIView):
         else:
             estimated_value=0
 
-        print(estimated_value)
+        result = {}
+        if engine == 'llm' and OPENAI_API_KEY:
+            try:
+                result = generate_starting_bid_recommendation(
+                        api_key=OPENAI_API_KEY,
+                        historical_data_list=data_list,
+                        service_category=service.category,
+                        estimated_value=float(estimated_value),
+                        end_date=date
+                    )
+            except OpenAIError as e:
+                print("Error al generar la recomendación con el modelo:", e)
 
-        result = generate_starting_bid_recommendation(
-                api_key=OPENAI_API_KEY,
+        # El recomendador local responde cuando se pide o cuando el modelo falla o tarda demasiado
+        if not result:
+            result = local_starting_bid_recommendation(
                 historical_data_list=data_list,
                 service_category=service.category,
                 estimated_value=float(estimated_value),
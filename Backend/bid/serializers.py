@@ -2,8 +2,9 @@ from rest_framework import serializers
 from .models import Bid
 from datetime import datetime
 from auction.serializers import AuctionSerializer
+from uchoose.serializers import DynamicFieldsMixin
 
-class BidSerializer(serializers.ModelSerializer):
+class BidSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     auction_details = AuctionSerializer(source='auction', read_only=True)
     class Meta:
         model = Bid
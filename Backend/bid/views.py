@@ -8,19 +8,19 @@ from client.models import Client
 from .models import Bid
 from .serializers import BidSerializer
 from datetime import datetime
+from uchoose.pagination import list_response
+from uchoose.serializers import get_field_options, optimize_queryset
 
 @permission_classes([IsAuthenticated])
 class BidListView(APIView):
     def get(self, request):
         bids = Bid.objects.all()
-        serializer = BidSerializer(bids, many=True)
-        return Response(serializer.data)
+        return list_response(request, bids, BidSerializer)
     
 @permission_classes([IsAuthenticated])
 class BidListByAuctionView(APIView):
     def get(self, request, fk):
-        bids = Bid.objects.filter(auction = fk)
-        serializer = BidSerializer(bids, many=True)
+        bids = Bid.objects.filter(auction = fk).only('event', 'platform', 'quantity')
         summary = {}
         for bid in bids:
             key = (bid.event, bid.platform)
@@ -60,8 +60,9 @@ class BidCreateView(APIView):
 @permission_classes([IsAuthenticated])
 class BidDetailView(APIView):
     def get(self, request, pk):
-        bid = get_object_or_404(Bid, pk=pk)
-        serializer = BidSerializer(bid)
+        options = get_field_options(request)
+        bid = get_object_or_404(optimize_queryset(Bid.objects.all(), BidSerializer(**options)), pk=pk)
+        serializer = BidSerializer(bid, **options)
         return Response(serializer.data)
 
 @permission_classes([IsAuthenticated])
@@ -1,13 +1,14 @@
 from rest_framework import serializers
 from .models import Client
+from uchoose.serializers import DynamicFieldsMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Client.user.field.related_model
         fields = ['name', 'surname', 'email'] 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
     class Meta:
         model = Client
@@ -7,13 +7,13 @@ from rest_framework.permissions import IsAuthenticated
 from user.models import CustomUser
 from .models import Client
 from .serializers import ClientSerializer
+from uchoose.pagination import list_response
 
 @permission_classes([IsAuthenticated])
 class ClientListView(APIView):
     def get(self, request):
         clients = Client.objects.all()
-        serializer = ClientSerializer(clients, many=True)
-        return Response(serializer.data)
+        return list_response(request, clients, ClientSerializer)
 
 @permission_classes([IsAuthenticated])
 class ClientCreateView(APIView):
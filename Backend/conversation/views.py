@@ -7,7 +7,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import ConversationSession, ConversationMessages
-from service.models import Service
+from service.models import Category
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from datetime import datetime
@@ -158,7 +158,7 @@ class ConversationServiceExtractor(APIView):
             """
         if (request.user.rol == "client"):
 
-            categorias = Service.objects.values_list('category', flat=True)
+            categorias = Category.objects.values_list('name', flat=True)
             print(f"CATEGORIAS {categorias}")
 
             system_message = f"""
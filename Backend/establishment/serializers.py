@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import Establishment
+from uchoose.serializers import DynamicFieldsMixin
 
-class EstablishmentSerializer(serializers.ModelSerializer):
+class EstablishmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Establishment
         fields = '__all__'
\ No newline at end of file
@@ -11,6 +11,7 @@ from worker.models import Worker
 from user.models import CustomUser
 from .models import Establishment
 from .serializers import EstablishmentSerializer
+from uchoose.pagination import list_response
 
 @permission_classes([IsAuthenticated])
 class EstablishmentListView(APIView):
@@ -20,14 +21,11 @@ class EstablishmentListView(APIView):
             worker= Worker.objects.get(user=user)
             if (worker.rol == "owner"):
                 establishments = Establishment.objects.filter(owner=worker)
-                serializer = EstablishmentSerializer(establishments, many=True)
             else:
                 establishments = Establishment.objects.all()
-                serializer = EstablishmentSerializer(establishments, many=True)
         else:
             establishments = Establishment.objects.all()
-            serializer = EstablishmentSerializer(establishments, many=True)
-        return Response(serializer.data)
+        return list_response(request, establishments, EstablishmentSerializer)
 @permission_classes([IsAuthenticated])
 class EstablishmentCreateView(APIView):
     def post(self, request):
@@ -4,6 +4,17 @@ from django.core.validators import MinLengthValidator, MaxLengthValidator, Regex
 from service.models import Service
 from client.models import Client
 
+
+class ReservationQuerySet(models.QuerySet):
+    def overlapping(self, service, starting_date, end_date):
+        """
+        Reservas del servicio que se solapan con el intervalo. Las que solo se
+        tocan en un extremo no se solapan. El índice (service, starting_date,
+        end_date) resuelve la consulta sin leer las filas.
+        """
+        return self.filter(service=service, starting_date__lt=end_date, end_date__gt=starting_date)
+
+
 class Reservation(models.Model):
 
     def random_id():
@@ -14,4 +25,13 @@ class Reservation(models.Model):
     end_date = models.DateTimeField()
 
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
-    service = models.ForeignKey(Service, on_delete=models.CASCADE)
\ No newline at end of file
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+
+    objects = ReservationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['starting_date', 'id']),
+            models.Index(fields=['client', 'starting_date', 'id']),
+            models.Index(fields=['service', 'starting_date', 'end_date']),
+        ]
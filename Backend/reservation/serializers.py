@@ -1,15 +1,36 @@
 from rest_framework import serializers
 from .models import Reservation, Service
 from client.serializers import ClientSerializer
-from django.db.models import Q
+from uchoose.serializers import DynamicFieldsMixin
 
-class ServiceSerializer(serializers.ModelSerializer):
+
+def validate_reservation(data, instance=None):
+    """
+    Validar que la fecha de inicio sea anterior a la fecha de fin y que no
+    haya otra reserva del mismo servicio que se solape. En las
+    actualizaciones parciales se usan los valores actuales de la reserva.
+    """
+    starting_date = data.get('starting_date', getattr(instance, 'starting_date', None))
+    end_date = data.get('end_date', getattr(instance, 'end_date', None))
+    service = data.get('service', getattr(instance, 'service', None))
+
+    if starting_date >= end_date:
+        raise serializers.ValidationError("La fecha de inicio debe ser anterior a la fecha de fin")
+
+    reservations = Reservation.objects.all() if instance is None else Reservation.objects.exclude(pk=instance.pk)
+    if reservations.overlapping(service, starting_date, end_date).exists():
+        raise serializers.ValidationError("Ya hay una reserva de este servicio que se solapa con esta")
+
+    return data
+
+
+class ServiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Service
         fields = '__all__'
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     client_details = ClientSerializer(source='client', read_only=True)
     service_details = ServiceSerializer(source='service', read_only=True)
     
@@ -19,36 +40,7 @@ class ReservationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
     
     def validate(self, data):
-        """
-        Validar que la fecha de inicio sea anterior a la fecha de fin
-        """
-        if data['starting_date'] >= data['end_date']:
-            raise serializers.ValidationError("La fecha de inicio debe ser anterior a la fecha de fin")
-        
-        """
-        Comprobar que no hayan otras pujas activas para el mismo servicio a la vez
-        """
-
-        auctions = Reservation.objects.filter(
-            Q(
-                # Inicio del nuevo objeto dentro de un intervalo existente
-                Q(starting_date__lte=data['starting_date']) & 
-                Q(end_date__gte=data['starting_date'])
-            ) | Q(
-                # Fin del nuevo objeto dentro de un intervalo existente
-                Q(starting_date__lte=data['end_date']) & 
-                Q(end_date__gte=data['end_date'])
-            ) | Q(
-                # Nuevo objeto completamente dentro de un intervalo existente
-                Q(starting_date__gte=data['starting_date']) & 
-                Q(end_date__lte=data['end_date'])
-            )
-        )
-
-        if auctions.exists():
-            raise serializers.ValidationError("There is an active auction for this service that overlaps with this one")
-        
-        return data
+        return validate_reservation(data, self.instance)
 
 
 class ReservationCreateSerializer(serializers.ModelSerializer):
@@ -60,6 +52,4 @@ class ReservationCreateSerializer(serializers.ModelSerializer):
         fields = ['starting_date', 'end_date', 'client', 'service']
     
     def validate(self, data):
-        if data['starting_date'] >= data['end_date']:
-            raise serializers.ValidationError("La fecha de inicio debe ser anterior a la fecha de fin")
-        return data
\ No newline at end of file
+        return validate_reservation(data, self.instance)
\ No newline at end of file
@@ -1,3 +1,154 @@
+from datetime import datetime
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from client.models import Client
+from establishment.models import Establishment
+from service.models import Service
+from uchoose.pagination import DATE_ORDERING, list_response
+from user.models import CustomUser
+from worker.models import Worker
+from .models import Reservation
+from .serializers import ReservationSerializer
+
+
+class ReservationTestCase(TestCase):
+    """Un cliente con servicios de varias categorías para reservar"""
+
+    def setUp(self):
+        cache.clear()
+        user = CustomUser.objects.create(username='client', email='client@uchoose.com', rol='client')
+        self.customer = Client.objects.create(gender='other', credits=0, preferences='', user=user)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        owner = Worker.objects.create(rol='owner', user=CustomUser.objects.create(username='owner', email='owner@uchoose.com'))
+        self.establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web', owner=owner
+        )
+        self.billar = self.create_service('billar, profesional', 4)
+        self.dardos = self.create_service('dardos', 2)
+        self.karaoke = self.create_service('karaoke', 10)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_service(self, category, max_people):
+        return Service.objects.create(
+            name=category, description=category, category=category,
+            max_people=max_people, max_reservation=60, deposit=0, establishment=self.establishment
+        )
+
+    def reserve(self, service, count=1):
+        for hour in range(count):
+            Reservation.objects.create(
+                starting_date=datetime(2025, 6, 2, hour), end_date=datetime(2025, 6, 2, hour, 30),
+                client=self.customer, service=service
+            )
+
+
+class ReservationPaginationTests(ReservationTestCase):
+    """Las páginas de reservas siguen el orden de la lista completa sin saltarse ni repetir filas"""
+
+    def test_pages_follow_full_list(self):
+        self.reserve(self.billar, 4)
+        # Reservas que empiezan a la vez, separadas en páginas solo por su id
+        self.reserve(self.dardos, 2)
+        self.reserve(self.karaoke, 1)
+        full = [reservation['id'] for reservation in self.client.get('/reservations/client/').data]
+        self.assertEqual(len(full), 7)
+
+        paged = []
+        url = '/reservations/client/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            paged += [reservation['id'] for reservation in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(paged, full)
+
+
+class SparseFieldsTests(ReservationTestCase):
+    """Con ?fields= y ?expand= las reservas traen solo lo pedido y se leen en una consulta"""
+
+    def setUp(self):
+        super().setUp()
+        self.reserve(self.billar, 3)
+
+    def test_full_response_without_options(self):
+        reservation = self.client.get('/reservations/client/').data[0]
+        self.assertIn('client_details', reservation)
+        self.assertIn('service_details', reservation)
+
+    def test_queryset_unchanged_without_options(self):
+        queryset = Reservation.objects.filter(client=self.customer)
+        request = APIRequestFactory().get('/reservations/client/')
+        with mock.patch('uchoose.pagination.optimize_queryset') as optimize:
+            response = list_response(Request(request), queryset, ReservationSerializer, DATE_ORDERING)
+        optimize.assert_not_called()
+        self.assertEqual(len(response.data), 3)
+
+    def test_fields(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/reservations/client/?fields=id,starting_date')
+        self.assertEqual([set(reservation) for reservation in response.data], [{'id', 'starting_date'}] * 3)
+
+    def test_expand(self):
+        reservation = self.client.get('/reservations/client/?expand=service_details').data[0]
+        self.assertIn('service_details', reservation)
+        self.assertNotIn('client_details', reservation)
+        self.assertEqual(reservation['service_details']['name'], self.billar.name)
+
+    def test_nested_fields(self):
+        response = self.client.get('/reservations/client/?fields=id,service_details.name&page_size=2')
+        self.assertEqual(response.data['results'][0]['service_details'], {'name': self.billar.name})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'service_details'})
+        self.assertIsNotNone(response.data['next'])
+
+
+class ReservationOverlapTests(ReservationTestCase):
+    """Una reserva no puede solaparse con otra del mismo servicio, al crearla ni al modificarla"""
+
+    def setUp(self):
+        super().setUp()
+        # Reserva del billar de 0:00 a 0:30
+        self.reserve(self.billar)
+        self.reservation = Reservation.objects.get()
+
+    def create(self, service, start, end):
+        return self.client.post('/reservations/create/', {
+            'starting_date': datetime(2025, 6, 2, *start), 'end_date': datetime(2025, 6, 2, *end), 'service': service.id
+        }, format='json')
+
+    def test_create(self):
+        self.assertEqual(self.create(self.billar, (0, 15), (1, 0)).status_code, 400)
+        self.assertEqual(self.create(self.billar, (0, 10), (0, 20)).status_code, 400)
+        # Las que solo se tocan en un extremo o son de otro servicio no se solapan
+        self.assertEqual(self.create(self.billar, (0, 30), (1, 0)).status_code, 201)
+        self.assertEqual(self.create(self.dardos, (0, 0), (0, 30)).status_code, 201)
+        self.assertEqual(Reservation.objects.count(), 3)
+
+    def test_update(self):
+        self.create(self.billar, (1, 0), (2, 0))
+        url = f"/reservations/{self.reservation.id}/update/"
+        self.assertEqual(self.client.put(url, {'end_date': datetime(2025, 6, 2, 1, 30)}, format='json').status_code, 400)
+        # La reserva no se solapa consigo misma
+        self.assertEqual(self.client.put(url, {'end_date': datetime(2025, 6, 2, 1, 0)}, format='json').status_code, 200)
+
+    def test_existing_overlapping_reservations(self):
+        # Reservas anteriores a la comprobación que ya se solapan entre sí: 0:00-5:00 y 1:00-1:30
+        self.reservation.end_date = datetime(2025, 6, 2, 5)
+        self.reservation.save()
+        Reservation.objects.create(
+            starting_date=datetime(2025, 6, 2, 1), end_date=datetime(2025, 6, 2, 1, 30),
+            client=self.customer, service=self.billar
+        )
+        self.assertEqual(self.create(self.billar, (2, 0), (3, 0)).status_code, 400)
+        self.assertEqual(self.create(self.billar, (5, 0), (6, 0)).status_code, 201)
 
-# Create your tests here.
+    def test_uses_index(self):
+        plan = Reservation.objects.overlapping(self.billar, datetime(2025, 6, 2), datetime(2025, 6, 3)).explain()
+        self.assertIn('reservation_service_', plan)
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -5,15 +6,31 @@ from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 
 from client.models import Client
+from service.models import Service
 from user.models import CustomUser
 from .models import Reservation
 from .serializers import ReservationSerializer, ReservationCreateSerializer
 from datetime import datetime
+from uchoose.pagination import list_response, DATE_ORDERING
+from uchoose.serializers import get_field_options, optimize_queryset
+
+def lock_service(service_id):
+    """
+    Bloquea la fila del servicio hasta el final de la transacción, para que
+    dos reservas del mismo servicio no pasen a la vez la comprobación de
+    solapes antes de guardarse
+    """
+    try:
+        Service.objects.select_for_update().filter(pk=int(service_id)).first()
+    except (TypeError, ValueError):
+        # Sin un servicio válido no hay nada que bloquear; el serializer lo rechaza
+        pass
+
 
 @permission_classes([IsAuthenticated])
 class ReservationListView(APIView):
     def get(self, request):
-        reservations = Reservation.objects.all().select_related('client', 'service').order_by('-starting_date')
+        reservations = Reservation.objects.all().select_related('client', 'service').order_by(*DATE_ORDERING)
         
         # Filtros opcionales
         client_id = request.query_params.get('client_id')
@@ -24,8 +41,7 @@ class ReservationListView(APIView):
         if service_id:
             reservations = reservations.filter(service_id=service_id)
         
-        serializer = ReservationSerializer(reservations, many=True)
-        return Response(serializer.data)
+        return list_response(request, reservations, ReservationSerializer, ordering=DATE_ORDERING)
 
 @permission_classes([IsAuthenticated])
 class ReservationListByClientView(APIView):
@@ -33,11 +49,10 @@ class ReservationListByClientView(APIView):
         user = CustomUser.objects.get(username=request.user)
         if user.rol == "client":
             client = Client.objects.get(user=user)
-            reservations = Reservation.objects.filter(client=client.id).select_related('client', 'service').order_by('-starting_date')
-            serializer = ReservationSerializer(reservations, many=True)
+            reservations = Reservation.objects.filter(client=client.id).select_related('client', 'service').order_by(*DATE_ORDERING)
         else:
             return Response("Inicia sesión como cliente para ver tus reservas", status=403)
-        return Response(serializer.data)
+        return list_response(request, reservations, ReservationSerializer, ordering=DATE_ORDERING)
 
 @permission_classes([IsAuthenticated])
 class ReservationListByServiceView(APIView):
@@ -52,11 +67,10 @@ class ReservationListByServiceView(APIView):
             except ValueError:
                 return Response("Formato de fecha inválido. Use YYYY-MM-DD.", status=400)
         if start_date and end_date:
-            reservations = Reservation.objects.filter(service=fk, starting_date__gte = start_date, end_date__lte = end_date).select_related('client', 'service').order_by('-starting_date')
+            reservations = Reservation.objects.filter(service=fk, starting_date__gte = start_date, end_date__lte = end_date).select_related('client', 'service').order_by(*DATE_ORDERING)
         else:
-            reservations = Reservation.objects.filter(service=fk).select_related('client', 'service').order_by('-starting_date')
-        serializer = ReservationSerializer(reservations, many=True)
-        return Response(serializer.data)
+            reservations = Reservation.objects.filter(service=fk).select_related('client', 'service').order_by(*DATE_ORDERING)
+        return list_response(request, reservations, ReservationSerializer, ordering=DATE_ORDERING)
 
 @permission_classes([IsAuthenticated])
 class ReservationCreateView(APIView):
@@ -65,10 +79,12 @@ class ReservationCreateView(APIView):
         if (user.rol == "client"):
             client= Client.objects.get(user=user)
             request.data["client"] = client.id
-            serializer = ReservationCreateSerializer(data=request.data)
-            if serializer.is_valid():
-                serializer.save()
-                return Response(serializer.data, status=201)
+            with transaction.atomic():
+                lock_service(request.data.get("service"))
+                serializer = ReservationCreateSerializer(data=request.data)
+                if serializer.is_valid():
+                    serializer.save()
+                    return Response(serializer.data, status=201)
                 
         else:
             return Response("Inicia sesión como cliente para registrar una reserva", status=403)
@@ -78,19 +94,22 @@ class ReservationCreateView(APIView):
 @permission_classes([IsAuthenticated])
 class ReservationDetailView(APIView):
     def get(self, request, pk):
-        reservation = get_object_or_404(Reservation, pk=pk)
-        serializer = ReservationSerializer(reservation)
+        options = get_field_options(request)
+        reservation = get_object_or_404(optimize_queryset(Reservation.objects.all(), ReservationSerializer(**options)), pk=pk)
+        serializer = ReservationSerializer(reservation, **options)
         return Response(serializer.data)
 
 @permission_classes([IsAuthenticated])
 class ReservationUpdateView(APIView):
     def put(self, request, pk):
         reservation = get_object_or_404(Reservation, pk=pk)
-        serializer = ReservationCreateSerializer(reservation, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            response_serializer = ReservationSerializer(reservation)
-            return Response(response_serializer.data)
+        with transaction.atomic():
+            lock_service(request.data.get("service", reservation.service_id))
+            serializer = ReservationCreateSerializer(reservation, data=request.data, partial=True)
+            if serializer.is_valid():
+                serializer.save()
+                response_serializer = ReservationSerializer(reservation)
+                return Response(response_serializer.data)
         return Response(serializer.errors, status=400)
 
 @permission_classes([IsAuthenticated])
@@ -0,0 +1,198 @@
+import statistics
+import time as timer
+from datetime import date as date_type, time, timedelta
+
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from establishment.models import Establishment
+from service.models import Service, ServicePriceAssignment
+from user.models import CustomUser
+from worker.models import Worker
+from .materialization import rebuild
+from .models import TimeSlot, WeeklySchedule, GroupSchedule, SpecificSchedule, SlotAssignment
+
+
+# Synthetic data sizes: time slots per schedule, specific dates and overlapping group schedules
+SCALES = {
+    'small': {'weekly_slots': 4, 'specific_dates': 30, 'group_schedules': 3},
+    'medium': {'weekly_slots': 12, 'specific_dates': 200, 'group_schedules': 10},
+    'large': {'weekly_slots': 24, 'specific_dates': 500, 'group_schedules': 30},
+}
+
+# Relative slowdown of the median time reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+class BenchmarkError(Exception):
+    """A benchmarked view did not answer successfully"""
+
+
+def generate(weekly_slots, specific_dates, group_schedules):
+    """
+    Creates a synthetic schedule starting today: a weekly schedule per weekday,
+    overlapping group schedules with increasing priority, a specific schedule
+    per date, and a service price for every slot assignment.
+
+    Every schedule uses all the time slots, which overlap each other by half
+    their length. The effective schedule is rebuilt at the end.
+    """
+    user = CustomUser.objects.create(username='benchmark', email='benchmark@uchoose.com')
+    owner = Worker.objects.create(rol='owner', user=user)
+    establishment = Establishment.objects.create(
+        name='Benchmark', description='Benchmark', location='Benchmark', platforms='Benchmark', owner=owner
+    )
+    service = Service.objects.create(
+        name='Benchmark', description='Benchmark', category='Benchmark',
+        max_people=1, max_reservation=1, deposit=0, establishment=establishment
+    )
+
+    step = 24 * 60 // weekly_slots
+    time_slots = TimeSlot.objects.bulk_create([
+        TimeSlot(
+            name=f"Slot {index}",
+            start_time=_minutes_to_time(index * step),
+            end_time=_minutes_to_time(min((index + 2) * step, 24 * 60 - 1))
+        )
+        for index in range(weekly_slots)
+    ])
+
+    today = date_type.today()
+    weekly = WeeklySchedule.objects.bulk_create([
+        WeeklySchedule(name=f"Weekly {weekday}", weekday=weekday) for weekday in range(7)
+    ])
+    groups = GroupSchedule.objects.bulk_create([
+        GroupSchedule(
+            name=f"Group {index}",
+            start_date=today + timedelta(days=index),
+            end_date=today + timedelta(days=index + specific_dates),
+            weekdays='0,1,2,3,4,5,6',
+            priority=index
+        )
+        for index in range(group_schedules)
+    ])
+    specific = SpecificSchedule.objects.bulk_create([
+        SpecificSchedule(name=f"Specific {offset}", date=today + timedelta(days=offset))
+        for offset in range(specific_dates)
+    ])
+
+    assignments = SlotAssignment.objects.bulk_create([
+        SlotAssignment(time_slot=time_slot, order=order, **{field: schedule})
+        for field, schedules in (
+            ('weekly_schedule', weekly),
+            ('group_schedule', groups),
+            ('specific_schedule', specific),
+        )
+        for schedule in schedules
+        for order, time_slot in enumerate(time_slots)
+    ])
+    ServicePriceAssignment.objects.bulk_create([
+        ServicePriceAssignment(service=service, time_slot=assignment, price=10, bookable=True)
+        for assignment in assignments
+    ])
+
+    rebuild()
+    return {
+        'user': user,
+        'service': service,
+        'weekly': weekly,
+        'time_slots': len(time_slots),
+        'schedules': len(weekly) + len(groups) + len(specific),
+        'assignments': len(assignments),
+    }
+
+
+def _minutes_to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries without keeping them in memory"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, method, url, repeat, data=None):
+    """Median, minimum and maximum wall time in milliseconds and query count of a request"""
+    durations = []
+    for run in range(repeat):
+        request_data = data(run) if callable(data) else data
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = timer.perf_counter()
+            response = getattr(client, method)(url, request_data, format='json')
+            durations.append((timer.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise BenchmarkError(f"{method.upper()} {url} answered {response.status_code}: {response.data}")
+    return {
+        'median_ms': round(statistics.median(durations), 3),
+        'min_ms': round(min(durations), 3),
+        'max_ms': round(max(durations), 3),
+        'queries': queries.count,
+    }
+
+
+def run_scale(weekly_slots, specific_dates, group_schedules, repeat=5):
+    """Generates the data of a scale and times the schedule views end to end through the test client"""
+    data = generate(weekly_slots, specific_dates, group_schedules)
+    client = APIClient()
+    client.force_authenticate(data['user'])
+
+    # A date covered by the three schedule levels
+    busy_date = date_type.today() + timedelta(days=min(group_schedules, specific_dates - 1))
+    # Dates after the specific schedules, one per run, so every copy succeeds
+    free_dates = [date_type.today() + timedelta(days=specific_dates + run) for run in range(repeat)]
+    weekly_by_weekday = {schedule.weekday: schedule for schedule in data['weekly']}
+
+    views = {
+        'GetScheduleForDateView': measure(
+            client, 'get', reverse('schedule-for-date', args=[busy_date.isoformat()]), repeat
+        ),
+        'ServicePriceForDateView': measure(
+            client, 'get', reverse('service-price-for-date', args=[busy_date.isoformat(), data['service'].id]), repeat
+        ),
+        'CreateSpecificScheduleFromView': measure(
+            client, 'post', reverse('specific-schedules-create-from'), repeat,
+            data=lambda run: {
+                'date': free_dates[run].isoformat(),
+                'template_id': weekly_by_weekday[free_dates[run].weekday()].id,
+                'template_type': 'weekly',
+            }
+        ),
+    }
+    return {
+        'data': {
+            'time_slots': data['time_slots'],
+            'schedules': data['schedules'],
+            'assignments': data['assignments'],
+        },
+        'views': views,
+    }
+
+
+def compare_reports(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Regressions of a report against a baseline: views whose query count grew
+    or whose median time grew by more than the threshold.
+    """
+    regressions = []
+    for scale, result in current['scales'].items():
+        baseline_views = baseline.get('scales', {}).get(scale, {}).get('views', {})
+        for view, measures in result['views'].items():
+            before = baseline_views.get(view)
+            if before is None:
+                continue
+            if measures['queries'] > before['queries']:
+                regressions.append(
+                    f"{scale} {view}: {before['queries']} -> {measures['queries']} queries"
+                )
+            if measures['median_ms'] > before['median_ms'] * (1 + threshold):
+                regressions.append(
+                    f"{scale} {view}: {before['median_ms']} -> {measures['median_ms']} ms"
+                )
+    return regressions
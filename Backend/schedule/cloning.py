@@ -0,0 +1,75 @@
+from django.db import IntegrityError, transaction
+
+from .materialization import refresh_on_commit
+from .models import SpecificSchedule, SlotAssignment
+from .signals import assignments_cloned
+
+
+# Times a clone is retried when a concurrent clone takes some of its dates first
+CLONE_ATTEMPTS = 3
+
+
+def clone_template(template, dates, clone_prices=False):
+    """
+    Creates a specific schedule per date copying the slot assignments of a
+    weekly or group template, optionally with the service prices attached to
+    them. Everything is inserted with bulk_create in a single transaction;
+    the prices are copied by the receivers of assignments_cloned.
+
+    The copies belong to the establishment of the template, and dates that
+    already have a specific schedule of that establishment are skipped.
+    Returns the created schedules and the skipped dates.
+    """
+    dates = sorted(set(dates))
+    assignments = list(template.slotassignment_set.select_related('time_slot'))
+
+    for attempt in range(CLONE_ATTEMPTS):
+        try:
+            schedules, skipped = _clone(template, dates, assignments, clone_prices)
+            break
+        except IntegrityError:
+            # Another clone created some of the dates after they were checked
+            if attempt == CLONE_ATTEMPTS - 1:
+                raise
+
+    # bulk_create skips the signals that keep the materialized schedule in sync
+    refresh_on_commit([schedule.date for schedule in schedules], template.establishment_id)
+    return schedules, skipped
+
+
+def _clone(template, dates, assignments, clone_prices):
+    with transaction.atomic():
+        skipped = set(SpecificSchedule.objects.filter(
+            establishment=template.establishment_id,
+            date__in=dates
+        ).values_list('date', flat=True))
+        new_dates = [date for date in dates if date not in skipped]
+        if not new_dates:
+            return [], sorted(skipped)
+
+        schedules = SpecificSchedule.objects.bulk_create([
+            SpecificSchedule(
+                name=f"Schedule for {date.strftime('%d/%m/%Y')} (based on {template.name})",
+                date=date,
+                establishment_id=template.establishment_id
+            )
+            for date in new_dates
+        ])
+
+        sources = []
+        copies = []
+        for schedule in schedules:
+            for assignment in assignments:
+                sources.append(assignment)
+                copies.append(SlotAssignment(
+                    specific_schedule=schedule,
+                    time_slot=assignment.time_slot,
+                    order=assignment.order,
+                    notes=assignment.notes
+                ))
+        copies = SlotAssignment.objects.bulk_create(copies)
+
+        if clone_prices and copies:
+            assignments_cloned.send(sender=SlotAssignment, pairs=list(zip(sources, copies)))
+
+    return schedules, sorted(skipped)
@@ -0,0 +1,113 @@
+import heapq
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import SlotAssignment
+from .resolution import WEEKLY, GROUP, SPECIFIC, time_to_seconds
+
+
+def find_overlaps(intervals):
+    """
+    Finds every overlapping pair among (start, end, item) intervals.
+
+    The intervals are swept in start order keeping a heap of the open ones
+    by end, so the cost is O(n log n + k) for k overlapping pairs. Empty
+    intervals never overlap anything.
+    """
+    ordered = sorted(
+        (interval for interval in intervals if interval[1] > interval[0]),
+        key=lambda interval: interval[0]
+    )
+    open_intervals = []
+    pairs = []
+    for sequence, (start, end, item) in enumerate(ordered):
+        while open_intervals and open_intervals[0][0] <= start:
+            heapq.heappop(open_intervals)
+        pairs.extend((other, item) for _, _, other in open_intervals)
+        heapq.heappush(open_intervals, (end, sequence, item))
+    return pairs
+
+
+def assignment_interval(assignment):
+    """(start, end, assignment) interval of a slot assignment"""
+    return (
+        time_to_seconds(assignment.time_slot.start_time),
+        time_to_seconds(assignment.time_slot.end_time),
+        assignment,
+    )
+
+
+def find_assignment_overlaps(assignments):
+    """Overlapping pairs among the slot assignments of a single schedule"""
+    return find_overlaps(assignment_interval(assignment) for assignment in assignments)
+
+
+def assignment_schedule(assignment):
+    """(schedule type, schedule id) of a slot assignment"""
+    if assignment.weekly_schedule_id:
+        return WEEKLY, assignment.weekly_schedule_id
+    if assignment.group_schedule_id:
+        return GROUP, assignment.group_schedule_id
+    return SPECIFIC, assignment.specific_schedule_id
+
+
+def overlapping_assignments(schedule_filter, start_time, end_time):
+    """Slot assignments of a schedule whose time slot overlaps the given times"""
+    if end_time <= start_time:
+        return SlotAssignment.objects.none()
+    return SlotAssignment.objects.filter(
+        time_slot__start_time__lt=end_time,
+        time_slot__end_time__gt=start_time,
+        **schedule_filter
+    )
+
+
+def time_slot_conflicts(time_slot, start_time, end_time):
+    """Slot assignments that would overlap the time slot in the schedules using it with the given times"""
+    if end_time <= start_time:
+        return SlotAssignment.objects.none()
+    uses = SlotAssignment.objects.filter(time_slot=time_slot)
+    return SlotAssignment.objects.filter(
+        Q(weekly_schedule__in=uses.values('weekly_schedule')) |
+        Q(group_schedule__in=uses.values('group_schedule')) |
+        Q(specific_schedule__in=uses.values('specific_schedule')),
+        time_slot__start_time__lt=end_time,
+        time_slot__end_time__gt=start_time
+    ).exclude(time_slot=time_slot)
+
+
+def serialize_overlap(first, second):
+    """Describes a pair of overlapping slot assignments"""
+    return {
+        'first': _serialize_assignment(first),
+        'second': _serialize_assignment(second),
+    }
+
+
+def _serialize_assignment(assignment):
+    time_slot = assignment.time_slot
+    return {
+        'assignment': assignment.id,
+        'time_slot': time_slot.id,
+        'name': time_slot.name,
+        'start_time': time_slot.start_time,
+        'end_time': time_slot.end_time,
+    }
+
+
+def audit_conflicts():
+    """Every overlapping pair of slot assignments across all schedules, in one query"""
+    assignments_by_schedule = defaultdict(list)
+    for assignment in SlotAssignment.objects.select_related('time_slot'):
+        assignments_by_schedule[assignment_schedule(assignment)].append(assignment)
+
+    conflicts = []
+    for (schedule_type, schedule_id), assignments in sorted(assignments_by_schedule.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        for first, second in find_assignment_overlaps(assignments):
+            conflicts.append({
+                'schedule_type': schedule_type,
+                'schedule_id': schedule_id,
+                **serialize_overlap(first, second),
+            })
+    return conflicts
@@ -0,0 +1,83 @@
+import json
+import subprocess
+from datetime import datetime
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from schedule.benchmarks import SCALES, REGRESSION_THRESHOLD, BenchmarkError, run_scale, compare_reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the schedule and price views against synthetic schedules of several "
+        "sizes in a throwaway test database and writes a JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(SCALES))
+        parser.add_argument('--repeat', type=int, default=5, help="Requests timed per view")
+        parser.add_argument('--output', help="File the JSON report is written to, stdout by default")
+        parser.add_argument('--compare', help="Baseline JSON report to check for regressions")
+        parser.add_argument(
+            '--threshold', type=float, default=REGRESSION_THRESHOLD,
+            help="Relative slowdown of the median time reported as a regression"
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.get_commit(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'scales': {},
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for scale in options['scales']:
+                report['scales'][scale] = {
+                    'size': SCALES[scale],
+                    **run_scale(repeat=options['repeat'], **SCALES[scale]),
+                }
+                call_command('flush', interactive=False, verbosity=0)
+        except BenchmarkError as error:
+            raise CommandError(str(error))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(f"Regression: {regression}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from schedule.materialization import rebuild, get_horizon
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized effective schedule for the whole horizon"
+
+    def handle(self, *args, **options):
+        rebuild()
+        start_date, end_date = get_horizon()
+        self.stdout.write(self.style.SUCCESS(
+            f"Effective schedule rebuilt from {start_date} to {end_date}"
+        ))
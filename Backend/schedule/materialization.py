@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import date as date_type, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import EffectiveDay, EffectiveSlot, SlotAssignment, WeeklySchedule, GroupSchedule, SpecificSchedule
+from .resolution import ScheduleIndex, format_seconds, serialize_day
+
+
+# Number of days, starting today, kept materialized
+HORIZON_DAYS = getattr(settings, 'SCHEDULE_MATERIALIZATION_DAYS', 180)
+
+
+def get_horizon():
+    """First and last date of the materialized window"""
+    today = date_type.today()
+    return today, today + timedelta(days=HORIZON_DAYS - 1)
+
+
+def date_range(start_date, end_date):
+    """Every date between start_date and end_date, both included"""
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def materialize_dates(dates, establishment_id=None):
+    """
+    Recomputes the materialized schedule of the given dates inside the horizon
+    for an establishment, or for the shared schedules when it is None.
+    """
+    start_date, end_date = get_horizon()
+    dates = sorted(date for date in set(dates) if start_date <= date <= end_date)
+    if not dates:
+        return
+
+    index = ScheduleIndex.load(dates[0], dates[-1], establishment_id)
+    resolved = {}
+    for date in dates:
+        blocks, schedule_name = index.resolve(date)
+        resolved[date] = (blocks, schedule_name, any(index.schedules_for(date)))
+
+    with transaction.atomic():
+        EffectiveSlot.objects.filter(establishment_id=establishment_id, date__in=dates).delete()
+        EffectiveDay.objects.filter(establishment_id=establishment_id, date__in=dates).delete()
+        # A concurrent refresh of the same dates may insert them after the delete
+        EffectiveDay.objects.bulk_create([
+            EffectiveDay(establishment_id=establishment_id, date=date, schedule_name=schedule_name, scheduled=scheduled)
+            for date, (_, schedule_name, scheduled) in resolved.items()
+        ], ignore_conflicts=True)
+
+        # Locking the days serializes concurrent refreshes from here on
+        days = list(EffectiveDay.objects.select_for_update().filter(establishment_id=establishment_id, date__in=dates))
+        for day in days:
+            _, day.schedule_name, day.scheduled = resolved[day.date]
+        EffectiveDay.objects.bulk_update(days, ['schedule_name', 'scheduled'])
+
+        EffectiveSlot.objects.filter(day__in=days).delete()
+        EffectiveSlot.objects.bulk_create([
+            EffectiveSlot(
+                day=day,
+                establishment_id=establishment_id,
+                date=day.date,
+                start=block['start'],
+                end=block['end'],
+                schedule_type=block['schedule_type'],
+                assignment=block['assignment'],
+                time_slot=block['time_slot']
+            )
+            for day in days
+            for block in resolved[day.date][0]
+        ])
+
+
+def get_scopes():
+    """Shared scope plus every establishment owning a schedule"""
+    establishments = set()
+    for model in (WeeklySchedule, GroupSchedule, SpecificSchedule):
+        establishments.update(
+            model.objects.filter(establishment__isnull=False).order_by().values_list('establishment', flat=True).distinct()
+        )
+    return [None] + sorted(establishments)
+
+
+def rebuild():
+    """Rebuilds the whole horizon of every scope and drops the days that fell out of it"""
+    start_date, end_date = get_horizon()
+    scopes = get_scopes()
+    with transaction.atomic():
+        EffectiveSlot.objects.exclude(date__range=(start_date, end_date)).delete()
+        EffectiveDay.objects.exclude(date__range=(start_date, end_date)).delete()
+        EffectiveDay.objects.filter(establishment__isnull=False).exclude(establishment__in=scopes[1:]).delete()
+        for establishment_id in scopes:
+            materialize_dates(date_range(start_date, end_date), establishment_id)
+
+
+def materialized_scopes(establishment_id):
+    """
+    Scopes whose materialized days depend on the schedules of an establishment.
+
+    Shared schedules are part of the resolution of every establishment, so
+    changing one refreshes the shared days and every materialized establishment.
+    """
+    if establishment_id is not None:
+        return [establishment_id]
+    return [None] + list(
+        EffectiveDay.objects.filter(establishment__isnull=False).order_by().values_list('establishment', flat=True).distinct()
+    )
+
+
+def refresh_on_commit(dates, establishment_id=None):
+    """Recomputes the given dates of the affected scopes once the current transaction commits"""
+    dates = set(dates)
+    if dates:
+        transaction.on_commit(lambda: _refresh(dates, establishment_id))
+
+
+def _refresh(dates, establishment_id):
+    # Runs after the commit of the request, so it needs a transaction of its own
+    with transaction.atomic():
+        for scope in materialized_scopes(establishment_id):
+            materialize_dates(dates, scope)
+
+
+def schedule_dates(schedule):
+    """Materialized dates a weekly, group or specific schedule applies to"""
+    start_date, end_date = get_horizon()
+    if isinstance(schedule, WeeklySchedule):
+        first = start_date + timedelta(days=(schedule.weekday - start_date.weekday()) % 7)
+        return set(date_range(first, end_date)[::7]) if first <= end_date else set()
+    if isinstance(schedule, GroupSchedule):
+        start_date = max(start_date, schedule.start_date)
+        end_date = min(end_date, schedule.end_date)
+        if start_date > end_date:
+            return set()
+        return {date for date in date_range(start_date, end_date) if schedule.applies_to_date(date)}
+    return {schedule.date}
+
+
+def get_assignment_schedule(assignment):
+    """Weekly, group or specific schedule of a slot assignment"""
+    return assignment.weekly_schedule or assignment.group_schedule or assignment.specific_schedule
+
+
+def time_slot_dates(time_slot):
+    """Materialized dates of every schedule the time slot is assigned to, by establishment id"""
+    assignments = SlotAssignment.objects.filter(time_slot=time_slot).select_related(
+        'weekly_schedule', 'group_schedule', 'specific_schedule'
+    )
+    dates = defaultdict(set)
+    for assignment in assignments:
+        schedule = get_assignment_schedule(assignment)
+        if schedule:
+            dates[schedule.establishment_id] |= schedule_dates(schedule)
+    return dates
+
+
+def get_days(start_date, end_date, establishment_id=None):
+    """
+    Resolved days of a range for an establishment as (response data, scheduled) pairs.
+
+    Materialized dates inside the horizon are read with two indexed range
+    scans, and the rest of the range is resolved in memory. Days left behind
+    by the horizon are no longer refreshed, so they are never read.
+    """
+    dates = date_range(start_date, end_date)
+    horizon_start, horizon_end = get_horizon()
+    read_range = (max(start_date, horizon_start), min(end_date, horizon_end))
+    days = {}
+    if read_range[0] <= read_range[1]:
+        days = {
+            day.date: day
+            for day in EffectiveDay.objects.filter(establishment_id=establishment_id, date__range=read_range)
+        }
+
+    blocks_by_date = defaultdict(list)
+    if days:
+        slots = EffectiveSlot.objects.filter(
+            establishment_id=establishment_id,
+            date__range=read_range
+        ).select_related('time_slot', 'assignment')
+        for slot in slots:
+            blocks_by_date[slot.date].append({
+                'name': slot.time_slot.name,
+                'start_time': format_seconds(slot.start),
+                'end_time': format_seconds(slot.end),
+                'color': slot.time_slot.color,
+                'notes': slot.assignment.notes or '',
+            })
+
+    missing = [date for date in dates if date not in days]
+    index = ScheduleIndex.load(missing[0], missing[-1], establishment_id) if missing else None
+
+    result = []
+    for date in dates:
+        if date in days:
+            day = days[date]
+            result.append((serialize_day(date, blocks_by_date[date], day.schedule_name), day.scheduled))
+        else:
+            blocks, schedule_name = index.resolve(date)
+            result.append((serialize_day(date, blocks, schedule_name), any(index.schedules_for(date))))
+    return result
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0003_alter_slotassignment_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupschedule',
+            index=models.Index(fields=['active', 'start_date', 'end_date'], name='schedule_gr_active_5545ff_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def weekdays_to_mask(apps, schema_editor):
+    GroupSchedule = apps.get_model('schedule', 'GroupSchedule')
+    for group in GroupSchedule.objects.all():
+        mask = 0
+        for day in (group.weekdays or '').split(','):
+            day = day.strip()
+            if day.isdigit() and int(day) < 7:
+                mask |= 1 << int(day)
+        group.weekday_mask = mask
+        group.save(update_fields=['weekday_mask'])
+
+
+def mask_to_weekdays(apps, schema_editor):
+    GroupSchedule = apps.get_model('schedule', 'GroupSchedule')
+    for group in GroupSchedule.objects.all():
+        group.weekdays = ','.join(str(day) for day in range(7) if group.weekday_mask & (1 << day))
+        group.save(update_fields=['weekdays'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0004_groupschedule_schedule_gr_active_5545ff_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupschedule',
+            name='weekday_mask',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Bitmask of weekdays: bit 0 = Monday ... bit 6 = Sunday'),
+        ),
+        migrations.AlterField(
+            model_name='groupschedule',
+            name='weekdays',
+            field=models.CharField(blank=True, default='', max_length=13),
+        ),
+        migrations.RunPython(weekdays_to_mask, mask_to_weekdays),
+        migrations.RemoveField(
+            model_name='groupschedule',
+            name='weekdays',
+        ),
+    ]
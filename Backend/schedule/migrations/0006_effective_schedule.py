@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0005_groupschedule_weekday_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('schedule_name', models.CharField(blank=True, max_length=500)),
+                ('scheduled', models.BooleanField(default=False, help_text='Whether any schedule applies to the date')),
+            ],
+            options={
+                'verbose_name': 'Effective Day',
+                'verbose_name_plural': 'Effective Days',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EffectiveSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start', models.PositiveIntegerField(help_text='Seconds since midnight')),
+                ('end', models.PositiveIntegerField(help_text='Seconds since midnight')),
+                ('schedule_type', models.CharField(max_length=10)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedule.slotassignment')),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='schedule.effectiveday')),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedule.timeslot')),
+            ],
+            options={
+                'verbose_name': 'Effective Slot',
+                'verbose_name_plural': 'Effective Slots',
+                'ordering': ['date', 'start'],
+                'indexes': [models.Index(fields=['date', 'start'], name='schedule_ef_date_a6224b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('establishment', '0004_alter_establishment_subscription'),
+        ('schedule', '0006_effective_schedule'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='effectiveslot',
+            name='schedule_ef_date_a6224b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='groupschedule',
+            name='schedule_gr_active_5545ff_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='weeklyschedule',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='effectiveday',
+            name='establishment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AddField(
+            model_name='effectiveslot',
+            name='establishment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AddField(
+            model_name='groupschedule',
+            name='establishment',
+            field=models.ForeignKey(blank=True, help_text='Owner of the schedule, shared by every establishment when empty', null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AddField(
+            model_name='specificschedule',
+            name='establishment',
+            field=models.ForeignKey(blank=True, help_text='Owner of the schedule, shared by every establishment when empty', null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AddField(
+            model_name='timeslot',
+            name='establishment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AddField(
+            model_name='weeklyschedule',
+            name='establishment',
+            field=models.ForeignKey(blank=True, help_text='Owner of the schedule, shared by every establishment when empty', null=True, on_delete=django.db.models.deletion.CASCADE, to='establishment.establishment'),
+        ),
+        migrations.AlterField(
+            model_name='effectiveday',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='specificschedule',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AddIndex(
+            model_name='effectiveslot',
+            index=models.Index(fields=['establishment', 'date', 'start'], name='schedule_ef_establi_1cfe16_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupschedule',
+            index=models.Index(fields=['establishment', 'active', 'start_date', 'end_date'], name='schedule_gr_establi_de8e8b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='effectiveday',
+            constraint=models.UniqueConstraint(fields=('establishment', 'date'), name='unique_effective_establishment_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='effectiveday',
+            constraint=models.UniqueConstraint(condition=models.Q(('establishment__isnull', True)), fields=('date',), name='unique_effective_shared_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='specificschedule',
+            constraint=models.UniqueConstraint(fields=('establishment', 'date'), name='unique_establishment_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='specificschedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('establishment__isnull', True)), fields=('date',), name='unique_shared_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyschedule',
+            constraint=models.UniqueConstraint(fields=('establishment', 'weekday'), name='unique_establishment_weekday'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyschedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('establishment__isnull', True)), fields=('weekday',), name='unique_shared_weekday'),
+        ),
+    ]
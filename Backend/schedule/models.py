@@ -1,13 +1,28 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 
+class EstablishmentQuerySet(models.QuerySet):
+    def for_establishment(self, establishment):
+        """
+        Rows of an establishment plus the shared ones, which have no
+        establishment. Without an establishment only shared rows are returned.
+        """
+        if establishment is None:
+            return self.filter(establishment__isnull=True)
+        return self.filter(models.Q(establishment=establishment) | models.Q(establishment__isnull=True))
+
+
 class TimeSlot(models.Model):
     """Model for time periods (morning, afternoon, etc.)"""
     name = models.CharField(max_length=100)
     start_time = models.TimeField()
     end_time = models.TimeField()
     color = models.CharField(max_length=20, default="#3498db")
+    establishment = models.ForeignKey('establishment.Establishment', on_delete=models.CASCADE, null=True, blank=True)
+
+    objects = EstablishmentQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} ({self.start_time} - {self.end_time})"
@@ -17,6 +32,17 @@ class TimeSlot(models.Model):
         verbose_name_plural = "Time Slots"
 
 
+class ScheduleQuerySet(EstablishmentQuerySet):
+    def with_assignments(self):
+        """Prefetches the slot assignments of the schedules with their time slots"""
+        return self.prefetch_related(
+            models.Prefetch(
+                'slotassignment_set',
+                queryset=SlotAssignment.objects.select_related('time_slot')
+            )
+        )
+
+
 class BaseSchedule(models.Model):
     """Abstract base model for schedule rules"""
     WEEKDAYS = [
@@ -32,6 +58,15 @@ class BaseSchedule(models.Model):
     name = models.CharField(max_length=200)
     time_slots = models.ManyToManyField(TimeSlot, through='SlotAssignment')
     active = models.BooleanField(default=True)
+    establishment = models.ForeignKey(
+        'establishment.Establishment',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Owner of the schedule, shared by every establishment when empty"
+    )
+    
+    objects = ScheduleQuerySet.as_manager()
     
     def __str__(self):
         return self.name
@@ -63,46 +98,165 @@ class WeeklySchedule(BaseSchedule):
     class Meta:
         verbose_name = "Weekly Schedule"
         verbose_name_plural = "Weekly Schedules"
-        unique_together = ['weekday']
+        constraints = [
+            models.UniqueConstraint(fields=['establishment', 'weekday'], name='unique_establishment_weekday'),
+            models.UniqueConstraint(
+                fields=['weekday'],
+                condition=models.Q(establishment__isnull=True),
+                name='unique_shared_weekday'
+            ),
+        ]
         
     def __str__(self):
         return f"{self.name} - {self.get_weekday_display()}"
 
 
+def weekdays_to_mask(weekdays):
+    """
+    Converts a weekdays string like '0,1,5' to a bitmask (bit n = weekday n).
+    Unknown weekdays and an empty string, which would give a group that never
+    applies, raise ValidationError.
+    """
+    mask = 0
+    for day in (weekdays or '').split(','):
+        day = day.strip()
+        if not day:
+            continue
+        if not (day.isdigit() and int(day) < 7):
+            raise ValidationError(f"Unknown weekday '{day}', use 0 (Monday) to 6 (Sunday)")
+        mask |= 1 << int(day)
+    if not mask:
+        raise ValidationError("At least one weekday is required")
+    return mask
+
+
+def mask_to_weekdays(mask):
+    """Converts a weekday bitmask back to the '0,1,5' string format"""
+    return ','.join(str(day) for day in range(7) if mask & (1 << day))
+
+
+class GroupScheduleQuerySet(ScheduleQuerySet):
+    def on_weekdays(self, weekdays):
+        """Groups active on any of the given weekdays"""
+        mask = 0
+        for weekday in weekdays:
+            mask |= 1 << weekday
+        return self.alias(
+            matching_weekdays=models.F('weekday_mask').bitand(mask)
+        ).filter(matching_weekdays__gt=0)
+
+    def overlapping(self, start_date, end_date):
+        """Active groups that apply to at least one date of a range"""
+        days = (end_date - start_date).days + 1
+        weekdays = {(start_date.weekday() + offset) % 7 for offset in range(min(days, 7))}
+        return self.filter(
+            active=True,
+            start_date__lte=end_date,
+            end_date__gte=start_date
+        ).on_weekdays(weekdays)
+
+    def applying_to(self, date):
+        """Active groups that apply to a date, highest priority first"""
+        return self.overlapping(date, date).order_by('-priority')
+
+
 class GroupSchedule(BaseSchedule):
     """Schedule for a group of days (intermediate level)"""
     start_date = models.DateField()
     end_date = models.DateField()
-    weekdays = models.CharField(max_length=13, help_text="Format: '0,1,5' for Monday, Tuesday and Saturday")
+    weekday_mask = models.PositiveSmallIntegerField(default=0, help_text="Bitmask of weekdays: bit 0 = Monday ... bit 6 = Sunday")
     priority = models.PositiveSmallIntegerField(default=10, help_text="Higher number = higher priority")
     
+    objects = GroupScheduleQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Group Schedule"
         verbose_name_plural = "Group Schedules"
         ordering = ['-priority']
+        indexes = [
+            models.Index(fields=['establishment', 'active', 'start_date', 'end_date']),
+        ]
+    
+    @property
+    def weekdays(self):
+        """Weekdays in the format '0,1,5' for Monday, Tuesday and Saturday"""
+        return mask_to_weekdays(self.weekday_mask)
+    
+    @weekdays.setter
+    def weekdays(self, value):
+        self.weekday_mask = weekdays_to_mask(value)
         
     def get_weekdays_list(self):
-        """Converts the weekdays string to a list of integers"""
-        if not self.weekdays:
-            return []
-        return [int(d) for d in self.weekdays.split(',') if d.strip().isdigit()]
+        """Converts the weekday bitmask to a list of integers"""
+        return [day for day in range(7) if self.weekday_mask & (1 << day)]
     
     def applies_to_date(self, date):
         """Checks if this group applies to a specific date"""
         return (
             self.start_date <= date <= self.end_date and
-            date.weekday() in self.get_weekdays_list()
+            bool(self.weekday_mask & (1 << date.weekday()))
         )
 
 
 class SpecificSchedule(BaseSchedule):
     """Schedule for a specific date (highest priority level)"""
-    date = models.DateField(unique=True)
+    date = models.DateField()
     
     class Meta:
         verbose_name = "Specific Schedule"
         verbose_name_plural = "Specific Schedules"
         ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['establishment', 'date'], name='unique_establishment_date'),
+            models.UniqueConstraint(
+                fields=['date'],
+                condition=models.Q(establishment__isnull=True),
+                name='unique_shared_date'
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.name} - {self.date.strftime('%d/%m/%Y')}"
+
+class EffectiveDay(models.Model):
+    """Materialized resolution of the schedule of a date for an establishment"""
+    establishment = models.ForeignKey('establishment.Establishment', on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    schedule_name = models.CharField(max_length=500, blank=True)
+    scheduled = models.BooleanField(default=False, help_text="Whether any schedule applies to the date")
+    
+    class Meta:
+        verbose_name = "Effective Day"
+        verbose_name_plural = "Effective Days"
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['establishment', 'date'], name='unique_effective_establishment_date'),
+            models.UniqueConstraint(
+                fields=['date'],
+                condition=models.Q(establishment__isnull=True),
+                name='unique_effective_shared_date'
+            ),
+        ]
         
     def __str__(self):
-        return f"{self.name} - {self.date.strftime('%d/%m/%Y')}"
\ No newline at end of file
+        return f"{self.schedule_name} - {self.date.strftime('%d/%m/%Y')}"
+
+
+class EffectiveSlot(models.Model):
+    """Resolved time interval of a materialized day, linked to the winning assignment"""
+    day = models.ForeignKey(EffectiveDay, on_delete=models.CASCADE, related_name='slots')
+    establishment = models.ForeignKey('establishment.Establishment', on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    start = models.PositiveIntegerField(help_text="Seconds since midnight")
+    end = models.PositiveIntegerField(help_text="Seconds since midnight")
+    schedule_type = models.CharField(max_length=10)
+    assignment = models.ForeignKey(SlotAssignment, on_delete=models.CASCADE)
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
+    
+    class Meta:
+        verbose_name = "Effective Slot"
+        verbose_name_plural = "Effective Slots"
+        ordering = ['date', 'start']
+        indexes = [
+            models.Index(fields=['establishment', 'date', 'start']),
+        ]
@@ -0,0 +1,269 @@
+import heapq
+
+from django.db.models import Q
+
+from .models import WeeklySchedule, GroupSchedule, SpecificSchedule
+
+
+# Schedule levels, from lowest to highest precedence
+WEEKLY = 'weekly'
+GROUP = 'group'
+SPECIFIC = 'specific'
+
+LEVEL_RANK = {
+    WEEKLY: 0,
+    GROUP: 1,
+    SPECIFIC: 2,
+}
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def time_to_seconds(value):
+    """Converts a time object to seconds since midnight"""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def format_seconds(seconds):
+    """Formats seconds since midnight as HH:MM (HH:MM:SS when needed)"""
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if seconds:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def resolve_intervals(intervals, merge_key=None):
+    """
+    Resolves overlapping intervals into non-overlapping segments.
+
+    Each interval is a dict with 'start', 'end' and 'priority' keys (plus any
+    payload). Wherever intervals overlap the highest priority wins, and on a
+    tie the one that comes later in the input wins. The sweep runs over the
+    sorted interval boundaries, so the cost is O(n log n) in the number of
+    intervals regardless of their granularity.
+
+    Adjacent segments whose winners share the same merge_key are joined, the
+    joined segment keeping the winner of its first part.
+
+    Returns a list of dicts with 'start', 'end' and 'interval' keys.
+    """
+    if merge_key is None:
+        merge_key = id
+
+    starts = sorted(
+        (
+            (interval['start'], sequence, interval)
+            for sequence, interval in enumerate(intervals)
+            if interval['end'] > interval['start']
+        ),
+        key=lambda event: event[0]
+    )
+    boundaries = sorted(
+        {event[0] for event in starts} | {event[2]['end'] for event in starts}
+    )
+
+    segments = []
+    active = []
+    next_start = 0
+    for index, point in enumerate(boundaries[:-1]):
+        # Open every interval starting at this point
+        while next_start < len(starts) and starts[next_start][0] <= point:
+            _, sequence, interval = starts[next_start]
+            heapq.heappush(active, (_descending(interval['priority']), -sequence, interval))
+            next_start += 1
+
+        # Drop the intervals that are already closed
+        while active and active[0][2]['end'] <= point:
+            heapq.heappop(active)
+
+        if not active:
+            continue
+
+        winner = active[0][2]
+        end = boundaries[index + 1]
+        previous = segments[-1] if segments else None
+        if (
+            previous is not None
+            and previous['end'] == point
+            and merge_key(previous['interval']) == merge_key(winner)
+        ):
+            previous['end'] = end
+        else:
+            segments.append({'start': point, 'end': end, 'interval': winner})
+
+    return segments
+
+
+def _descending(priority):
+    """Heap key that pops the highest priority first"""
+    if isinstance(priority, tuple):
+        return tuple(-value for value in priority)
+    return -priority
+
+
+def schedule_intervals(schedule, level, priority=0):
+    """Builds the intervals of the slot assignments of a schedule"""
+    intervals = []
+    for assignment in schedule.slotassignment_set.all():
+        time_slot = assignment.time_slot
+        intervals.append({
+            'start': time_to_seconds(time_slot.start_time),
+            'end': time_to_seconds(time_slot.end_time),
+            'priority': (LEVEL_RANK[level], priority),
+            'type': level,
+            'schedule': schedule,
+            'assignment': assignment,
+            'time_slot': time_slot,
+        })
+    return intervals
+
+
+def resolve_schedule(weekly_schedule=None, group_schedules=(), specific_schedule=None):
+    """
+    Resolves the effective time slots of a day.
+
+    Specific schedules overlay group schedules, which overlay the weekly
+    schedule. Among groups, the one with the higher priority wins.
+    """
+    intervals = []
+    if weekly_schedule:
+        intervals.extend(schedule_intervals(weekly_schedule, WEEKLY))
+    for group_schedule in group_schedules:
+        intervals.extend(schedule_intervals(group_schedule, GROUP, group_schedule.priority))
+    if specific_schedule:
+        intervals.extend(schedule_intervals(specific_schedule, SPECIFIC))
+
+    blocks = []
+    for segment in resolve_intervals(intervals, merge_key=lambda interval: interval['time_slot'].id):
+        interval = segment['interval']
+        time_slot = interval['time_slot']
+        blocks.append({
+            'name': time_slot.name,
+            'start': segment['start'],
+            'end': segment['end'],
+            'start_time': format_seconds(segment['start']),
+            'end_time': format_seconds(segment['end']),
+            'color': time_slot.color,
+            'notes': interval['assignment'].notes or '',
+            'schedule_type': interval['type'],
+            'schedule': interval['schedule'],
+            'assignment': interval['assignment'],
+            'time_slot': time_slot,
+        })
+    return blocks
+
+
+def get_schedule_name(weekly_schedule=None, group_schedules=(), specific_schedule=None):
+    """Combines the names of the schedules applied to a day"""
+    top_schedule = specific_schedule or (group_schedules[0] if group_schedules else None)
+    if top_schedule is None:
+        return weekly_schedule.name if weekly_schedule else ""
+
+    schedule_name = top_schedule.name
+    if weekly_schedule:
+        schedule_name += f" (base: {weekly_schedule.name})"
+    return schedule_name
+
+
+def serialize_day(date, blocks, schedule_name):
+    """Builds the response of a resolved day"""
+    return {
+        'date': date.strftime('%Y-%m-%d'),
+        'weekday': date.strftime('%A'),
+        'schedule_name': schedule_name,
+        'time_slots': [
+            {
+                'name': block['name'],
+                'start_time': block['start_time'],
+                'end_time': block['end_time'],
+                'color': block['color'],
+                'notes': block['notes'],
+            }
+            for block in blocks
+        ],
+    }
+
+
+class ScheduleIndex:
+    """
+    In-memory index of the schedules that may apply to a date range.
+
+    All the weekly, group and specific schedules of the range are loaded with
+    their slot assignments and time slots in a fixed number of queries, so any
+    number of days can then be resolved without touching the database.
+
+    The schedules of an establishment take the place of the shared weekly and
+    specific schedules of the same weekday or date.
+    """
+    def __init__(self, weekly_schedules, group_schedules, specific_schedules):
+        self.weekly_by_weekday = {
+            schedule.weekday: schedule for schedule in sorted(weekly_schedules, key=_owned_last)
+        }
+        self.specific_by_date = {
+            schedule.date: schedule for schedule in sorted(specific_schedules, key=_owned_last)
+        }
+        self.group_schedules = sorted(group_schedules, key=lambda schedule: -schedule.priority)
+
+    @classmethod
+    def load(cls, start_date, end_date, establishment=None):
+        weekly_schedules = WeeklySchedule.objects.for_establishment(establishment).filter(
+            active=True
+        ).with_assignments()
+        group_schedules = GroupSchedule.objects.for_establishment(establishment).overlapping(
+            start_date,
+            end_date
+        ).with_assignments()
+        specific_schedules = SpecificSchedule.objects.for_establishment(establishment).filter(
+            active=True,
+            date__range=(start_date, end_date)
+        ).with_assignments()
+        return cls(weekly_schedules, group_schedules, specific_schedules)
+
+    @classmethod
+    def load_many(cls, start_date, end_date, establishments):
+        """
+        Indexes of several establishments by id, loading the shared schedules
+        and the ones of every establishment in the same queries as load
+        """
+        establishments = set(establishments)
+        scope = Q(establishment__isnull=True) | Q(establishment__in=establishments)
+        weekly_schedules = list(WeeklySchedule.objects.filter(scope, active=True).with_assignments())
+        group_schedules = list(GroupSchedule.objects.filter(scope).overlapping(start_date, end_date).with_assignments())
+        specific_schedules = list(SpecificSchedule.objects.filter(
+            scope,
+            active=True,
+            date__range=(start_date, end_date)
+        ).with_assignments())
+
+        def owned_by(schedules, establishment):
+            return [schedule for schedule in schedules if schedule.establishment_id in (None, establishment)]
+
+        return {
+            establishment: cls(
+                owned_by(weekly_schedules, establishment),
+                owned_by(group_schedules, establishment),
+                owned_by(specific_schedules, establishment)
+            )
+            for establishment in establishments
+        }
+
+    def schedules_for(self, date):
+        """Returns the weekly schedule, group schedules and specific schedule of a date"""
+        return (
+            self.weekly_by_weekday.get(date.weekday()),
+            [schedule for schedule in self.group_schedules if schedule.applies_to_date(date)],
+            self.specific_by_date.get(date),
+        )
+
+    def resolve(self, date):
+        """Returns the resolved blocks and the schedule name of a date"""
+        weekly_schedule, group_schedules, specific_schedule = self.schedules_for(date)
+        blocks = resolve_schedule(weekly_schedule, group_schedules, specific_schedule)
+        schedule_name = get_schedule_name(weekly_schedule, group_schedules, specific_schedule)
+        return blocks, schedule_name
+
+
+def _owned_last(schedule):
+    """Sort key placing shared schedules before the ones of an establishment"""
+    return schedule.establishment_id is not None
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from .models import (
     TimeSlot, WeeklySchedule, GroupSchedule, 
-    SpecificSchedule, SlotAssignment
+    SpecificSchedule, SlotAssignment, weekdays_to_mask, mask_to_weekdays
+)
+from .conflicts import (
+    find_assignment_overlaps, overlapping_assignments, time_slot_conflicts, serialize_overlap
 )
 
 
@@ -9,6 +12,23 @@ class TimeSlotSerializer(serializers.ModelSerializer):
     class Meta:
         model = TimeSlot
         fields = '__all__'
+    
+    def validate(self, data):
+        """
+        Validate that new times don't make the slot overlap others in the schedules using it
+        """
+        if self.instance is None:
+            return data
+        
+        start_time = data.get('start_time', self.instance.start_time)
+        end_time = data.get('end_time', self.instance.end_time)
+        if time_slot_conflicts(self.instance, start_time, end_time).exists():
+            raise serializers.ValidationError(
+                "The new times overlap another time slot of a schedule using this time slot"
+            )
+        
+        return data
+
 
 class SlotAssignmentSerializer(serializers.ModelSerializer):
     time_slot_details = TimeSlotSerializer(source='time_slot', read_only=True)
@@ -39,10 +59,38 @@ class SlotAssignmentSerializer(serializers.ModelSerializer):
                 "Exactly one of weekly_schedule, group_schedule, or specific_schedule must be provided"
             )
         
+        # Check that the time slot doesn't overlap another one of the same schedule
+        schedule_field = next(field for field, value in zip(schedule_fields, schedule_values) if value is not None)
+        time_slot = data.get('time_slot') or self.instance.time_slot
+        conflicts = overlapping_assignments(
+            {schedule_field: data[schedule_field]}, time_slot.start_time, time_slot.end_time
+        )
+        if self.instance is not None:
+            conflicts = conflicts.exclude(pk=self.instance.pk)
+        conflict = conflicts.select_related('time_slot').first()
+        if conflict is not None:
+            raise serializers.ValidationError(
+                f"The time slot overlaps '{conflict.time_slot.name}' "
+                f"({conflict.time_slot.start_time} - {conflict.time_slot.end_time}) in the same schedule"
+            )
+        
         return data
 
 
-class WeeklyScheduleSerializer(serializers.ModelSerializer):
+class ScheduleConflictsMixin(serializers.Serializer):
+    """Reports the overlapping slot assignments of a schedule"""
+    conflicts = serializers.SerializerMethodField()
+    
+    def get_conflicts(self, obj):
+        if obj.pk is None:
+            return []
+        return [
+            serialize_overlap(first, second)
+            for first, second in find_assignment_overlaps(obj.slotassignment_set.all())
+        ]
+
+
+class WeeklyScheduleSerializer(ScheduleConflictsMixin, serializers.ModelSerializer):
     assignments = SlotAssignmentSerializer(
         source='slotassignment_set', 
         many=True, 
@@ -52,25 +100,35 @@ class WeeklyScheduleSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = WeeklySchedule
-        fields = ['id', 'name', 'weekday', 'weekday_name', 'active', 'assignments']
+        fields = ['id', 'name', 'weekday', 'weekday_name', 'establishment', 'active', 'assignments', 'conflicts']
 
 
-class GroupScheduleSerializer(serializers.ModelSerializer):
+class GroupScheduleSerializer(ScheduleConflictsMixin, serializers.ModelSerializer):
     assignments = SlotAssignmentSerializer(
         source='slotassignment_set', 
         many=True, 
         read_only=True
     )
+    weekdays = serializers.CharField(
+        max_length=13,
+        help_text="Format: '0,1,5' for Monday, Tuesday and Saturday"
+    )
     
     class Meta:
         model = GroupSchedule
         fields = [
             'id', 'name', 'start_date', 'end_date', 
-            'weekdays', 'priority', 'active', 'assignments'
+            'weekdays', 'priority', 'establishment', 'active', 'assignments', 'conflicts'
         ]
+    
+    def validate_weekdays(self, value):
+        """
+        Reject unknown weekdays instead of dropping them, and normalize the rest
+        """
+        return mask_to_weekdays(weekdays_to_mask(value))
 
 
-class SpecificScheduleSerializer(serializers.ModelSerializer):
+class SpecificScheduleSerializer(ScheduleConflictsMixin, serializers.ModelSerializer):
     assignments = SlotAssignmentSerializer(
         source='slotassignment_set', 
         many=True, 
@@ -79,4 +137,4 @@ class SpecificScheduleSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = SpecificSchedule
-        fields = ['id', 'name', 'date', 'active', 'assignments']
\ No newline at end of file
+        fields = ['id', 'name', 'date', 'establishment', 'active', 'assignments', 'conflicts']
\ No newline at end of file
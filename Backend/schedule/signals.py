@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .materialization import refresh_on_commit, schedule_dates, get_assignment_schedule, time_slot_dates
+from .models import TimeSlot, SlotAssignment, WeeklySchedule, GroupSchedule, SpecificSchedule
+
+
+# Sent inside the transaction of a template clone with the (source, copy) pairs
+# of the slot assignments, so that other apps copy what they attach to them
+assignments_cloned = Signal()
+
+
+def _stored(instance):
+    """Stored version of an instance that is about to change"""
+    if instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).first()
+
+
+def _refresh_schedules(*schedules):
+    """Refreshes the dates of the schedules in the scope of their establishments"""
+    dates = defaultdict(set)
+    for schedule in schedules:
+        if schedule is not None:
+            dates[schedule.establishment_id] |= schedule_dates(schedule)
+    for establishment_id, establishment_dates in dates.items():
+        refresh_on_commit(establishment_dates, establishment_id)
+
+
+@receiver(pre_save, sender=WeeklySchedule)
+@receiver(pre_save, sender=GroupSchedule)
+@receiver(pre_save, sender=SpecificSchedule)
+def capture_schedule(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._previous_schedule = _stored(instance)
+
+
+@receiver(post_save, sender=WeeklySchedule)
+@receiver(post_save, sender=GroupSchedule)
+@receiver(post_save, sender=SpecificSchedule)
+def refresh_schedule_dates(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_schedules(instance, instance._previous_schedule)
+
+
+@receiver(post_delete, sender=WeeklySchedule)
+@receiver(post_delete, sender=GroupSchedule)
+@receiver(post_delete, sender=SpecificSchedule)
+def refresh_deleted_schedule_dates(sender, instance, **kwargs):
+    _refresh_schedules(instance)
+
+
+@receiver(pre_save, sender=SlotAssignment)
+def capture_assignment_schedule(sender, instance, raw=False, **kwargs):
+    if not raw:
+        stored = _stored(instance)
+        instance._previous_schedule = get_assignment_schedule(stored) if stored else None
+
+
+@receiver(post_save, sender=SlotAssignment)
+def refresh_assignment_dates(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_schedules(get_assignment_schedule(instance), instance._previous_schedule)
+
+
+@receiver(post_delete, sender=SlotAssignment)
+def refresh_deleted_assignment_dates(sender, instance, **kwargs):
+    try:
+        _refresh_schedules(get_assignment_schedule(instance))
+    except ObjectDoesNotExist:
+        # Deleted along with its schedule, which refreshes the dates itself
+        pass
+
+
+@receiver(post_save, sender=TimeSlot)
+def refresh_time_slot_dates(sender, instance, raw=False, **kwargs):
+    if not raw:
+        for establishment_id, dates in time_slot_dates(instance).items():
+            refresh_on_commit(dates, establishment_id)
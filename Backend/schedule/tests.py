@@ -1,3 +1,743 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from establishment.models import Establishment
+from service.models import Service, ServicePriceAssignment, PriceStat
+from service.price_stats import rebuild as rebuild_price_stats
+from user.models import CustomUser
+from worker.models import Worker
+from . import cloning
+from .conflicts import audit_conflicts, find_overlaps
+from .benchmarks import run_scale, compare_reports
+from .materialization import get_days, get_horizon, materialize_dates, rebuild
+from .models import (
+    TimeSlot, WeeklySchedule, GroupSchedule, SpecificSchedule, SlotAssignment, EffectiveDay, EffectiveSlot,
+    weekdays_to_mask
+)
+from .resolution import ScheduleIndex, resolve_intervals
+
+
+def resolve_per_minute(intervals):
+    """
+    Reference resolution with the per-minute map the views used before the
+    sweep: every minute goes to the highest priority interval covering it,
+    the later one on a tie, and consecutive minutes of the same interval
+    form a segment
+    """
+    segments = []
+    for minute in range(24 * 60):
+        covering = [
+            (interval['priority'], sequence, interval)
+            for sequence, interval in enumerate(intervals)
+            if interval['start'] <= minute < interval['end']
+        ]
+        if not covering:
+            continue
+        winner = max(covering, key=lambda candidate: candidate[:2])[2]
+        if segments and segments[-1][1] == minute and segments[-1][2] == winner['name']:
+            segments[-1] = (segments[-1][0], minute + 1, winner['name'])
+        else:
+            segments.append((minute, minute + 1, winner['name']))
+    return segments
+
+
+class ResolveIntervalsTests(SimpleTestCase):
+    """The interval sweep gives the same segments as the old per-minute resolution"""
+
+    # Intervals (name, start minute, end minute, priority) and the expected segments
+    CASES = {
+        'equal priority, later wins': (
+            [('a', 0, 60, 1), ('b', 30, 90, 1)],
+            [(0, 30, 'a'), (30, 90, 'b')],
+        ),
+        'equal priority, later nested': (
+            [('a', 0, 120, 1), ('b', 30, 60, 1)],
+            [(0, 30, 'a'), (30, 60, 'b'), (60, 120, 'a')],
+        ),
+        'equal priority, earlier nested': (
+            [('a', 30, 60, 1), ('b', 0, 120, 1)],
+            [(0, 120, 'b')],
+        ),
+        'higher priority nested': (
+            [('a', 0, 120, 1), ('b', 30, 60, 2)],
+            [(0, 30, 'a'), (30, 60, 'b'), (60, 120, 'a')],
+        ),
+        'lower priority nested later': (
+            [('a', 0, 120, 2), ('b', 30, 60, 1)],
+            [(0, 120, 'a')],
+        ),
+        'same start and end': (
+            [('a', 0, 60, 1), ('b', 0, 60, 1), ('c', 0, 60, 0)],
+            [(0, 60, 'b')],
+        ),
+        'adjacent': (
+            [('a', 0, 60, 1), ('b', 60, 120, 1)],
+            [(0, 60, 'a'), (60, 120, 'b')],
+        ),
+        'gap': (
+            [('a', 0, 30, 1), ('b', 60, 90, 1)],
+            [(0, 30, 'a'), (60, 90, 'b')],
+        ),
+        'empty interval': (
+            [('a', 0, 60, 1), ('b', 30, 30, 2)],
+            [(0, 60, 'a')],
+        ),
+        # A time slot from 22:00 to 02:00 ends before it starts and covers nothing
+        'crossing midnight': (
+            [('a', 22 * 60, 2 * 60, 1), ('b', 60, 180, 0)],
+            [(60, 180, 'b')],
+        ),
+        'crossing midnight split at midnight': (
+            [('a', 22 * 60, 24 * 60, 1), ('a2', 0, 2 * 60, 1), ('b', 60, 180, 2)],
+            [(0, 60, 'a2'), (60, 180, 'b'), (22 * 60, 24 * 60, 'a')],
+        ),
+        'level and schedule priorities': (
+            [('weekly', 0, 600, (0, 0)), ('low', 60, 300, (1, 5)), ('high', 120, 180, (1, 9)), ('specific', 240, 360, (2, 0))],
+            [(0, 60, 'weekly'), (60, 120, 'low'), (120, 180, 'high'), (180, 240, 'low'), (240, 360, 'specific'), (360, 600, 'weekly')],
+        ),
+    }
+
+    def test_cases(self):
+        for case, (intervals, expected) in self.CASES.items():
+            with self.subTest(case):
+                intervals = [
+                    {'name': name, 'start': start, 'end': end, 'priority': priority}
+                    for name, start, end, priority in intervals
+                ]
+                segments = [
+                    (segment['start'], segment['end'], segment['interval']['name'])
+                    for segment in resolve_intervals(intervals)
+                ]
+                self.assertEqual(segments, expected)
+                self.assertEqual(segments, resolve_per_minute(intervals))
+
+    def test_merge_key(self):
+        intervals = [
+            {'name': 'a', 'slot': 1, 'start': 0, 'end': 60, 'priority': 1},
+            {'name': 'b', 'slot': 1, 'start': 60, 'end': 120, 'priority': 1},
+            {'name': 'c', 'slot': 2, 'start': 120, 'end': 180, 'priority': 1},
+        ]
+        segments = resolve_intervals(intervals, merge_key=lambda interval: interval['slot'])
+        self.assertEqual(
+            [(segment['start'], segment['end'], segment['interval']['name']) for segment in segments],
+            [(0, 120, 'a'), (120, 180, 'c')]
+        )
+
+
+class ScheduleRangeTests(TestCase):
+    """The range endpoint resolves every date as schedule-for-date does, in a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='ranger', email='ranger@uchoose.com'))
+        self.morning = TimeSlot.objects.create(name='Morning', start_time=time(9), end_time=time(13))
+        self.afternoon = TimeSlot.objects.create(name='Afternoon', start_time=time(12), end_time=time(18))
+        # Monday 2025-06-02 and Tuesday 2025-06-03 have weekly schedules
+        for weekday in (0, 1):
+            schedule = WeeklySchedule.objects.create(name=f"Weekly {weekday}", weekday=weekday)
+            SlotAssignment.objects.create(weekly_schedule=schedule, time_slot=self.morning)
+        specific = SpecificSchedule.objects.create(name='Holiday', date=date(2025, 6, 3))
+        SlotAssignment.objects.create(specific_schedule=specific, time_slot=self.afternoon)
+
+    def get_range(self, start, end):
+        return self.client.get(f"/schedules/schedule-for-range/?start={start}&end={end}")
+
+    def test_range(self):
+        response = self.get_range('2025-06-02', '2025-06-04')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['date'] for day in response.data], ['2025-06-02', '2025-06-03', '2025-06-04'])
+        self.assertEqual(
+            [[(slot['name'], slot['start_time'], slot['end_time']) for slot in day['time_slots']] for day in response.data],
+            [
+                [('Morning', '09:00', '13:00')],
+                [('Morning', '09:00', '12:00'), ('Afternoon', '12:00', '18:00')],
+                [],
+            ]
+        )
+        self.assertEqual(response.data[1]['schedule_name'], 'Holiday (base: Weekly 1)')
+
+    def test_matches_schedule_for_date(self):
+        days = self.get_range('2025-06-02', '2025-06-03').data
+        for day in days:
+            response = self.client.get(f"/schedules/schedule-for-date/{day['date']}/")
+            self.assertEqual(response.data, day)
+
+    def test_queries_do_not_grow_with_range(self):
+        # Both ranges are past, so no materialized day is read
+        with self.assertNumQueries(5):
+            self.get_range('2025-06-02', '2025-06-08')
+        with self.assertNumQueries(5):
+            self.get_range('2025-06-02', '2026-06-01')
+
+    def test_invalid_ranges(self):
+        self.assertEqual(self.client.get('/schedules/schedule-for-range/?start=2025-06-02').status_code, 400)
+        self.assertEqual(self.get_range('2025-06-02', 'tomorrow').status_code, 400)
+        self.assertEqual(self.get_range('2025-06-03', '2025-06-02').status_code, 400)
+        self.assertEqual(self.get_range('2025-01-01', '2026-01-02').status_code, 400)
+
+
+class GroupLayeringTests(TestCase):
+    """Group schedules overlay the weekly schedule by priority and stay under specific schedules"""
+
+    MONDAY = date(2025, 6, 2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='layers', email='layers@uchoose.com'))
+        weekly = WeeklySchedule.objects.create(name='Weekly', weekday=0)
+        self.assign(weekly_schedule=weekly, name='Base', start=8, end=20)
+        summer = GroupSchedule.objects.create(
+            name='Summer', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31), weekdays='0,1,2,3,4', priority=1
+        )
+        self.assign(group_schedule=summer, name='Summer', start=10, end=16)
+        festival = GroupSchedule.objects.create(
+            name='Festival', start_date=date(2025, 6, 2), end_date=date(2025, 6, 9), weekdays='0', priority=5
+        )
+        self.assign(group_schedule=festival, name='Festival', start=12, end=14)
+
+    def assign(self, name, start, end, **schedule):
+        time_slot = TimeSlot.objects.create(name=name, start_time=time(start), end_time=time(end))
+        SlotAssignment.objects.create(time_slot=time_slot, **schedule)
+
+    def get_slots(self, day):
+        response = self.client.get(f"/schedules/schedule-for-date/{day.isoformat()}/")
+        return [(slot['name'], slot['start_time'], slot['end_time']) for slot in response.data['time_slots']]
+
+    def test_priority_between_groups(self):
+        self.assertEqual(self.get_slots(self.MONDAY), [
+            ('Base', '08:00', '10:00'),
+            ('Summer', '10:00', '12:00'),
+            ('Festival', '12:00', '14:00'),
+            ('Summer', '14:00', '16:00'),
+            ('Base', '16:00', '20:00'),
+        ])
+
+    def test_specific_over_groups(self):
+        specific = SpecificSchedule.objects.create(name='Closing', date=self.MONDAY)
+        self.assign(specific_schedule=specific, name='Closing', start=11, end=13)
+        self.assertEqual(self.get_slots(self.MONDAY), [
+            ('Base', '08:00', '10:00'),
+            ('Summer', '10:00', '11:00'),
+            ('Closing', '11:00', '13:00'),
+            ('Festival', '13:00', '14:00'),
+            ('Summer', '14:00', '16:00'),
+            ('Base', '16:00', '20:00'),
+        ])
+
+    def test_groups_only_on_their_dates_and_weekdays(self):
+        # The festival is over and the summer group does not apply on weekends
+        self.assertEqual(self.get_slots(date(2025, 6, 16)), [
+            ('Base', '08:00', '10:00'), ('Summer', '10:00', '16:00'), ('Base', '16:00', '20:00')
+        ])
+        self.assertEqual(self.get_slots(date(2025, 9, 1)), [('Base', '08:00', '20:00')])
+        response = self.client.get('/schedules/schedule-for-date/2025-06-07/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_applying_to(self):
+        self.assertEqual(
+            list(GroupSchedule.objects.applying_to(self.MONDAY).values_list('name', flat=True)),
+            ['Festival', 'Summer']
+        )
+        self.assertEqual(list(GroupSchedule.objects.applying_to(date(2025, 6, 7))), [])
+
+
+class GroupScheduleWeekdayTests(TestCase):
+    """Group weekdays are stored as a bitmask that SQL filters by weekday"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='weekdays', email='weekdays@uchoose.com'))
+        # Only on Sundays of June 2025
+        self.sundays = GroupSchedule.objects.create(
+            name='Sundays', start_date=date(2025, 6, 1), end_date=date(2025, 6, 30), weekdays='6'
+        )
+
+    def test_mask(self):
+        self.assertEqual(weekdays_to_mask('0, 1,5'), 0b100011)
+        self.assertEqual(self.sundays.weekdays, '6')
+        self.assertEqual(self.sundays.get_weekdays_list(), [6])
+
+    def test_unknown_weekdays(self):
+        for weekdays in ('7', '1,monday', '', ' , '):
+            with self.subTest(weekdays=weekdays), self.assertRaises(ValidationError):
+                weekdays_to_mask(weekdays)
+
+    def test_serializer_rejects_unknown_weekdays(self):
+        group = {'name': 'Weekend', 'start_date': '2025-06-01', 'end_date': '2025-06-30', 'priority': 1}
+        response = self.client.post('/schedules/group-schedules/', {**group, 'weekdays': '5,sunday'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('weekdays', response.data)
+        response = self.client.post('/schedules/group-schedules/', {**group, 'weekdays': '6, 5'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['weekdays'], '5,6')
+
+    def test_overlapping(self):
+        # Monday 2025-06-02 to Saturday 2025-06-07 has no Sunday
+        self.assertFalse(GroupSchedule.objects.overlapping(date(2025, 6, 2), date(2025, 6, 7)).exists())
+        self.assertTrue(GroupSchedule.objects.overlapping(date(2025, 6, 2), date(2025, 6, 8)).exists())
+        self.assertTrue(GroupSchedule.objects.overlapping(date(2025, 5, 1), date(2025, 12, 31)).exists())
+        self.assertFalse(GroupSchedule.objects.overlapping(date(2025, 7, 1), date(2025, 7, 31)).exists())
+        self.sundays.active = False
+        self.sundays.save()
+        self.assertFalse(GroupSchedule.objects.overlapping(date(2025, 6, 2), date(2025, 6, 8)).exists())
+
+    def test_applying_to(self):
+        GroupSchedule.objects.create(
+            name='Weekend', start_date=date(2025, 6, 1), end_date=date(2025, 6, 30), weekdays='5,6', priority=20
+        )
+        self.assertEqual(
+            list(GroupSchedule.objects.applying_to(date(2025, 6, 8)).values_list('name', flat=True)),
+            ['Weekend', 'Sundays']
+        )
+        self.assertEqual(
+            list(GroupSchedule.objects.applying_to(date(2025, 6, 7)).values_list('name', flat=True)),
+            ['Weekend']
+        )
+        self.assertEqual(list(GroupSchedule.objects.applying_to(date(2025, 6, 9))), [])
+
+
+class FindOverlapsTests(SimpleTestCase):
+    """The sweep pairs intervals that share time and nothing else"""
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.assertEqual(find_overlaps([(8, 10, 'a'), (10, 12, 'b'), (12, 14, 'c')]), [])
+
+    def test_overlapping_pairs(self):
+        pairs = find_overlaps([(8, 12, 'a'), (10, 14, 'b'), (13, 15, 'c'), (16, 18, 'd')])
+        self.assertEqual({frozenset(pair) for pair in pairs}, {frozenset('ab'), frozenset('bc')})
+
+    def test_nested_and_empty_intervals(self):
+        pairs = find_overlaps([(8, 20, 'outer'), (10, 12, 'inner'), (14, 14, 'empty')])
+        self.assertEqual({frozenset(pair) for pair in pairs}, {frozenset(('outer', 'inner'))})
+
+
+class ScheduleConflictTests(TestCase):
+    """Writes that would make two slots of a schedule overlap are rejected"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='conflicts', email='conflicts@uchoose.com'))
+        self.weekly = WeeklySchedule.objects.create(name='Monday', weekday=0)
+        self.morning = self.create_slot('Morning', 8, 12)
+        SlotAssignment.objects.create(time_slot=self.morning, weekly_schedule=self.weekly)
+
+    def create_slot(self, name, start, end):
+        return TimeSlot.objects.create(name=name, start_time=time(start), end_time=time(end))
+
+    def assign(self, time_slot, **schedule):
+        return self.client.post('/schedules/slot-assignments/', {'time_slot': time_slot.id, **schedule}, format='json')
+
+    def move(self, time_slot, start, end):
+        return self.client.put(f"/schedules/time-slots/{time_slot.id}/", {
+            'name': time_slot.name, 'start_time': f"{start:02d}:00", 'end_time': f"{end:02d}:00"
+        }, format='json')
+
+    def test_touching_assignment_is_allowed(self):
+        response = self.assign(self.create_slot('Afternoon', 12, 16), weekly_schedule=self.weekly.id)
+        self.assertEqual(response.status_code, 201)
+
+    def test_overlapping_assignment_is_rejected(self):
+        response = self.assign(self.create_slot('Brunch', 11, 13), weekly_schedule=self.weekly.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("overlaps 'Morning'", str(response.data))
+        self.assertEqual(SlotAssignment.objects.filter(weekly_schedule=self.weekly).count(), 1)
+
+    def test_overlap_in_another_schedule_is_allowed(self):
+        other = SpecificSchedule.objects.create(name='Holiday', date=date(2025, 6, 2))
+        response = self.assign(self.create_slot('Brunch', 11, 13), specific_schedule=other.id)
+        self.assertEqual(response.status_code, 201)
+
+    def test_time_slot_change_into_overlap_is_rejected(self):
+        afternoon = self.create_slot('Afternoon', 12, 16)
+        SlotAssignment.objects.create(time_slot=afternoon, weekly_schedule=self.weekly)
+        response = self.move(afternoon, 11, 16)
+        self.assertEqual(response.status_code, 400)
+        afternoon.refresh_from_db()
+        self.assertEqual(afternoon.start_time, time(12))
+
+    def test_time_slot_change_to_touch_is_allowed(self):
+        afternoon = self.create_slot('Afternoon', 13, 16)
+        SlotAssignment.objects.create(time_slot=afternoon, weekly_schedule=self.weekly)
+        response = self.move(afternoon, 12, 17)
+        self.assertEqual(response.status_code, 200)
+
+    def test_audit_reports_only_true_overlaps(self):
+        SlotAssignment.objects.create(time_slot=self.create_slot('Noon', 12, 14), weekly_schedule=self.weekly)
+        brunch = SlotAssignment.objects.create(time_slot=self.create_slot('Brunch', 11, 13), weekly_schedule=self.weekly)
+        specific = SpecificSchedule.objects.create(name='Holiday', date=date(2025, 6, 2))
+        SlotAssignment.objects.create(time_slot=self.create_slot('Open', 8, 20), specific_schedule=specific)
+
+        conflicts = audit_conflicts()
+        self.assertEqual(len(conflicts), 2)
+        for conflict in conflicts:
+            self.assertEqual((conflict['schedule_type'], conflict['schedule_id']), ('weekly', self.weekly.id))
+            self.assertIn(brunch.id, (conflict['first']['assignment'], conflict['second']['assignment']))
+
+        response = self.client.get('/schedules/conflicts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+
+class WeekdayMaskMigrationTests(TransactionTestCase):
+    """Migration 0005 turns the old weekdays strings into bitmasks"""
+
+    MIGRATE_FROM = [('schedule', '0004_groupschedule_schedule_gr_active_5545ff_idx')]
+    MIGRATE_TO = [('schedule', '0005_groupschedule_weekday_mask')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_weekdays_to_mask(self):
+        apps = self.migrate(self.MIGRATE_FROM)
+        OldGroupSchedule = apps.get_model('schedule', 'GroupSchedule')
+        for name, weekdays in [('Weekdays', '0,1,2,3,4'), ('Weekend', '5, 6'), ('Broken', '1,9,x')]:
+            OldGroupSchedule.objects.create(
+                name=name, start_date=date(2025, 1, 1), end_date=date(2025, 12, 31), weekdays=weekdays, priority=1
+            )
+
+        apps = self.migrate(self.MIGRATE_TO)
+        NewGroupSchedule = apps.get_model('schedule', 'GroupSchedule')
+        self.assertEqual(
+            dict(NewGroupSchedule.objects.values_list('name', 'weekday_mask')),
+            {'Weekdays': 0b0011111, 'Weekend': 0b1100000, 'Broken': 0b0000010}
+        )
+
+
+class MaterializationTests(TestCase):
+    """The materialized days match the in-memory resolution after every schedule change"""
+
+    def setUp(self):
+        self.start_date, self.end_date = get_horizon()
+        self.morning = TimeSlot.objects.create(name='Morning', start_time=time(9), end_time=time(13))
+        self.evening = TimeSlot.objects.create(name='Evening', start_time=time(12), end_time=time(20))
+        self.weekly = WeeklySchedule.objects.create(name='Weekly', weekday=self.start_date.weekday())
+        SlotAssignment.objects.create(weekly_schedule=self.weekly, time_slot=self.morning)
+        rebuild()
+
+    def assert_materialized(self):
+        index = ScheduleIndex.load(self.start_date, self.end_date)
+        days = {day.date: day for day in EffectiveDay.objects.filter(establishment__isnull=True)}
+        self.assertEqual(sorted(days), [
+            self.start_date + timedelta(days=offset) for offset in range((self.end_date - self.start_date).days + 1)
+        ])
+        slots = {}
+        for slot in EffectiveSlot.objects.filter(establishment__isnull=True).order_by('date', 'start'):
+            slots.setdefault(slot.date, []).append((slot.start, slot.end, slot.schedule_type, slot.assignment_id))
+        for date, day in days.items():
+            blocks, schedule_name = index.resolve(date)
+            self.assertEqual(day.schedule_name, schedule_name)
+            self.assertEqual(day.scheduled, any(index.schedules_for(date)))
+            self.assertEqual(
+                slots.get(date, []),
+                [(block['start'], block['end'], block['schedule_type'], block['assignment'].id) for block in blocks]
+            )
+
+    def change(self, function):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = function()
+        self.assert_materialized()
+        return result
+
+    def test_weekly_schedule(self):
+        self.assert_materialized()
+        schedule = self.change(lambda: WeeklySchedule.objects.create(
+            name='Next day', weekday=(self.start_date.weekday() + 1) % 7
+        ))
+        self.change(lambda: SlotAssignment.objects.create(weekly_schedule=schedule, time_slot=self.evening))
+        schedule.weekday = (schedule.weekday + 1) % 7
+        self.change(schedule.save)
+        self.change(schedule.delete)
+
+    def test_group_schedule(self):
+        group = self.change(lambda: GroupSchedule.objects.create(
+            name='Group', start_date=self.start_date, end_date=self.start_date + timedelta(days=20),
+            weekdays='0,2,4,6', priority=3
+        ))
+        assignment = self.change(lambda: SlotAssignment.objects.create(group_schedule=group, time_slot=self.evening))
+        group.weekdays = '1,3,5'
+        self.change(group.save)
+        assignment.time_slot = self.morning
+        self.change(assignment.save)
+        self.change(group.delete)
+
+    def test_specific_schedule(self):
+        specific = self.change(lambda: SpecificSchedule.objects.create(name='Specific', date=self.start_date))
+        self.change(lambda: SlotAssignment.objects.create(specific_schedule=specific, time_slot=self.evening))
+        specific.date = self.start_date + timedelta(days=7)
+        self.change(specific.save)
+        self.evening.start_time = time(10)
+        self.change(self.evening.save)
+        self.change(specific.delete)
+
+    def test_repeated_refresh(self):
+        dates = [self.start_date, self.start_date + timedelta(days=7)]
+        materialize_dates(dates)
+        materialize_dates(dates)
+        self.assert_materialized()
+
+    def test_days_out_of_horizon(self):
+        # Once today moves on, the first materialized day is no longer refreshed
+        horizon = (self.start_date + timedelta(days=1), self.end_date + timedelta(days=1))
+        with mock.patch('schedule.materialization.get_horizon', return_value=horizon):
+            self.morning.start_time = time(10)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.morning.save()
+            [(day, scheduled)] = get_days(self.start_date, self.start_date)
+        self.assertEqual(EffectiveSlot.objects.get(date=self.start_date).start, 9 * 3600)
+        self.assertEqual([slot['start_time'] for slot in day['time_slots']], ['10:00'])
+        self.assertTrue(scheduled)
+
+
+class CloneTemplateTests(TestCase):
+    """A template is cloned into many dates in a fixed number of statements"""
+
+    URL = '/schedules/specific-schedules/create-from/bulk/'
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='cloner', email='cloner@uchoose.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web',
+            owner=Worker.objects.create(rol='owner', user=user)
+        )
+        self.service = Service.objects.create(
+            name='Pista', description='Pista', category='padel',
+            max_people=4, max_reservation=60, deposit=0, establishment=establishment
+        )
+        self.template = WeeklySchedule.objects.create(name='Monday', weekday=0)
+        for order, hour in enumerate((9, 18)):
+            assignment = SlotAssignment.objects.create(
+                weekly_schedule=self.template, order=order, notes=f"Note {hour}",
+                time_slot=TimeSlot.objects.create(name=f"{hour}h", start_time=time(hour), end_time=time(hour + 2))
+            )
+            ServicePriceAssignment.objects.create(service=self.service, time_slot=assignment, price=hour, bookable=True)
+
+    def clone(self, **data):
+        return self.client.post(self.URL, {'template_id': self.template.id, **data}, format='json')
+
+    def get_stats(self):
+        return {
+            (stat.category, stat.schedule_type, stat.weekday, stat.bucket): (stat.count, stat.total, stat.minimum, stat.maximum)
+            for stat in PriceStat.objects.all()
+        }
+
+    def test_clone_range(self):
+        response = self.clone(start_date='2025-12-01', end_date='2025-12-30')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 30)
+        schedules = SpecificSchedule.objects.filter(date__range=(date(2025, 12, 1), date(2025, 12, 30)))
+        self.assertEqual(schedules.count(), 30)
+        self.assertEqual(
+            set(SlotAssignment.objects.filter(specific_schedule__in=schedules).values_list('time_slot__name', 'order', 'notes')),
+            {('9h', 0, 'Note 9'), ('18h', 1, 'Note 18')}
+        )
+        self.assertEqual(SlotAssignment.objects.filter(specific_schedule__in=schedules).count(), 60)
+        # Without clone_prices only the template keeps prices
+        self.assertEqual(ServicePriceAssignment.objects.count(), 2)
+
+    def test_statements_do_not_grow_with_dates(self):
+        # Price statistics are updated once per weekday and time of day, so both ranges cover
+        # every weekday after a first clone has created the statistics of all of them
+        self.clone(start_date='2025-11-01', end_date='2025-11-07', clone_prices=True)
+        with CaptureQueriesContext(connection) as few:
+            self.clone(start_date='2025-12-01', end_date='2025-12-07', clone_prices=True)
+        with CaptureQueriesContext(connection) as many:
+            self.clone(start_date='2026-01-01', end_date='2026-02-28', clone_prices=True)
+        self.assertEqual(len(few), len(many))
+
+    def test_skip_existing_dates(self):
+        SpecificSchedule.objects.create(name='Christmas', date=date(2025, 12, 25))
+        response = self.clone(dates=['2025-12-24', '2025-12-25', '2025-12-24'])
+        self.assertEqual([day['date'] for day in response.data['created']], ['2025-12-24'])
+        self.assertEqual(response.data['skipped'], ['2025-12-25'])
+        self.assertEqual(SpecificSchedule.objects.get(date=date(2025, 12, 25)).name, 'Christmas')
+
+        response = self.clone(dates=['2025-12-24'])
+        self.assertEqual((response.data['created'], response.data['skipped']), ([], ['2025-12-24']))
+
+    def test_retry_after_concurrent_clone(self):
+        clone = cloning._clone
+        calls = []
+
+        def concurrent_clone(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                # Another request clones the same date between the check and the insert
+                SpecificSchedule.objects.create(name='Concurrent', date=date(2025, 12, 25))
+                raise IntegrityError
+            return clone(*args)
+
+        with mock.patch.object(cloning, '_clone', side_effect=concurrent_clone):
+            response = self.clone(dates=['2025-12-24', '2025-12-25'])
+        self.assertEqual(response.data['skipped'], ['2025-12-25'])
+        self.assertEqual(len(calls), 2)
+
+    def test_clone_prices(self):
+        self.clone(start_date='2025-12-01', end_date='2025-12-07', clone_prices=True)
+        prices = ServicePriceAssignment.objects.filter(time_slot__specific_schedule__isnull=False)
+        self.assertEqual(prices.count(), 14)
+        self.assertEqual(set(prices.values_list('service', 'price', 'bookable')), {
+            (self.service.id, 9, True), (self.service.id, 18, True)
+        })
+
+        # The cloned prices count in the price statistics like the ones saved one by one
+        stats = self.get_stats()
+        self.assertEqual(stats[('padel', 'specific', 0, 'morning')][0], 1)
+        self.assertEqual(stats[('padel', 'specific', 3, 'afternoon')][0], 1)
+        rebuild_price_stats()
+        self.assertEqual(self.get_stats(), stats)
+
+    def test_too_many_dates(self):
+        response = self.clone(start_date='2025-01-01', end_date='9999-12-31')
+        self.assertEqual(response.status_code, 400)
+        response = self.clone(dates=['2025-01-01'] * 400)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SpecificSchedule.objects.exists())
+
+
+class ScheduleListQueryCountTests(TestCase):
+    """The schedule list and detail views must not issue queries per schedule or assignment"""
+
+    # One query for the schedules and one for their assignments and time slots
+    EXPECTED_QUERIES = 2
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='scheduler', email='scheduler@uchoose.com'))
+        self.time_slots = [
+            TimeSlot.objects.create(name=f"Slot {hour}", start_time=time(hour), end_time=time(hour + 1))
+            for hour in range(9, 12)
+        ]
+
+    def add_assignments(self, **schedule):
+        for order, time_slot in enumerate(self.time_slots):
+            SlotAssignment.objects.create(time_slot=time_slot, order=order, **schedule)
+
+    def create_weekly_schedules(self, count):
+        first = WeeklySchedule.objects.count()
+        for weekday in range(first, first + count):
+            schedule = WeeklySchedule.objects.create(name=f"Weekly {weekday}", weekday=weekday)
+            self.add_assignments(weekly_schedule=schedule)
+        return schedule
+
+    def create_group_schedules(self, count):
+        first = GroupSchedule.objects.count()
+        for index in range(first, first + count):
+            schedule = GroupSchedule.objects.create(
+                name=f"Group {index}",
+                start_date=date(2025, 1, 1),
+                end_date=date(2025, 12, 31),
+                weekdays='5,6',
+                priority=index
+            )
+            self.add_assignments(group_schedule=schedule)
+        return schedule
+
+    def create_specific_schedules(self, count):
+        first = SpecificSchedule.objects.count()
+        for index in range(first, first + count):
+            schedule = SpecificSchedule.objects.create(name=f"Specific {index}", date=date(2025, 1, 1) + timedelta(days=index))
+            self.add_assignments(specific_schedule=schedule)
+        return schedule
+
+    def assert_list_queries(self, url, create_schedules):
+        create_schedules(2)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 2)
+
+        create_schedules(5)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 7)
+        self.assertEqual(len(response.data[-1]['assignments']), len(self.time_slots))
+
+    def test_weekly_schedule_list(self):
+        self.assert_list_queries('/schedules/weekly-schedules/', self.create_weekly_schedules)
+
+    def test_group_schedule_list(self):
+        self.assert_list_queries('/schedules/group-schedules/', self.create_group_schedules)
+
+    def test_specific_schedule_list(self):
+        self.assert_list_queries('/schedules/specific-schedules/', self.create_specific_schedules)
+
+    def test_schedule_details(self):
+        urls = [
+            f"/schedules/weekly-schedules/{self.create_weekly_schedules(1).pk}/",
+            f"/schedules/group-schedules/{self.create_group_schedules(1).pk}/",
+            f"/schedules/specific-schedules/{self.create_specific_schedules(1).pk}/",
+        ]
+        for url in urls:
+            with self.assertNumQueries(self.EXPECTED_QUERIES):
+                response = self.client.get(url)
+            self.assertEqual(len(response.data['assignments']), len(self.time_slots))
+
+
+class ScheduleListPaginationTests(TestCase):
+    """The list views answer with every row unless the request asks for pages"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='pager', email='pager@uchoose.com'))
+        for hour in range(7):
+            TimeSlot.objects.create(name=f"Slot {hour}", start_time=time(hour), end_time=time(hour + 1))
+
+    def test_full_list_without_page_size(self):
+        response = self.client.get('/schedules/time-slots/')
+        self.assertEqual(len(response.data), 7)
+
+    def test_cursor_pages(self):
+        names = []
+        url = '/schedules/time-slots/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            names += [time_slot['name'] for time_slot in response.data['results']]
+            url = response.data['next']
+        expected = list(TimeSlot.objects.order_by('id').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_empty_page(self):
+        response = self.client.get('/schedules/weekly-schedules/?page_size=100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertIsNone(response.data['next'])
+
+
+class ScheduleBenchmarkTests(TestCase):
+    """The benchmark suite runs end to end and detects regressions between reports"""
+
+    VIEWS = {'GetScheduleForDateView', 'ServicePriceForDateView', 'CreateSpecificScheduleFromView'}
+
+    def test_run_scale(self):
+        result = run_scale(weekly_slots=2, specific_dates=3, group_schedules=2, repeat=2)
+        self.assertEqual(result['data'], {'time_slots': 2, 'schedules': 12, 'assignments': 24})
+        self.assertEqual(set(result['views']), self.VIEWS)
+        for measures in result['views'].values():
+            self.assertLessEqual(measures['min_ms'], measures['median_ms'])
+            self.assertLessEqual(measures['median_ms'], measures['max_ms'])
+            self.assertGreater(measures['queries'], 0)
+
+    def test_compare_reports(self):
+        baseline = {'scales': {'small': {'views': {'GetScheduleForDateView': {'median_ms': 10, 'queries': 2}}}}}
+        within_threshold = {'scales': {'small': {'views': {'GetScheduleForDateView': {'median_ms': 11, 'queries': 2}}}}}
+        slower = {'scales': {'small': {'views': {'GetScheduleForDateView': {'median_ms': 13, 'queries': 3}}}}}
+        self.assertEqual(compare_reports(baseline, within_threshold), [])
+        self.assertEqual(len(compare_reports(baseline, slower)), 2)
+        self.assertEqual(compare_reports({'scales': {}}, slower), [])
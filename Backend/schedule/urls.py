@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     # Schedule by date
     path('schedules/schedule-for-date/<str:date>/', views.GetScheduleForDateView.as_view(), name='schedule-for-date'),
+    path('schedules/schedule-for-range/', views.GetScheduleForRangeView.as_view(), name='schedule-for-range'),
+    path('schedules/conflicts/', views.ScheduleConflictsView.as_view(), name='schedule-conflicts'),
     
     # Time slots
     path('schedules/time-slots/', views.TimeSlotListView.as_view(), name='time-slots-list'),
@@ -21,6 +23,7 @@ urlpatterns = [
     path('schedules/specific-schedules/', views.SpecificScheduleListView.as_view(), name='specific-schedules-list'),
     path('schedules/specific-schedules/<int:pk>/', views.SpecificScheduleDetailView.as_view(), name='specific-schedules-detail'),
     path('schedules/specific-schedules/create-from/', views.CreateSpecificScheduleFromView.as_view(), name='specific-schedules-create-from'),
+    path('schedules/specific-schedules/create-from/bulk/', views.BulkCreateSpecificScheduleFromView.as_view(), name='specific-schedules-bulk-create-from'),
 
     # Slot Assignment endpoints
     path('schedules/slot-assignments/', views.SlotAssignmentListView.as_view(), name='slot-assignment-list'),
@@ -10,11 +10,42 @@ from .serializers import (
     SlotAssignmentSerializer, WeeklyScheduleSerializer, GroupScheduleSerializer, 
     SpecificScheduleSerializer, TimeSlotSerializer
 )
+from .materialization import get_days, date_range
+from .cloning import clone_template
+from .conflicts import audit_conflicts
+from uchoose.pagination import list_response
+
+
+# Longest range resolved by a single request
+MAX_RANGE_DAYS = 366
+
+
+def get_establishment_id(request):
+    """Establishment of the 'establishment' query parameter, None when it is not given"""
+    value = request.query_params.get('establishment')
+    return int(value) if value else None
+
+
+def invalid_date_count_response():
+    return Response(
+        {"error": f"Between 1 and {MAX_RANGE_DAYS} dates must be provided"},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def invalid_establishment_response():
+    return Response(
+        {"error": "The 'establishment' parameter must be an establishment id"},
+        status=status.HTTP_400_BAD_REQUEST
+    )
 
 
 @permission_classes([IsAuthenticated])
 class GetScheduleForDateView(APIView):
-    """Gets the applicable schedule for a specific date with overlap handling"""
+    """
+    Gets the applicable schedule for a specific date with overlap handling.
+    Without an establishment only the shared schedules are resolved.
+    """
     def get(self, request, date):
         
         if not date:
@@ -31,138 +62,85 @@ class GetScheduleForDateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get specific schedule if it exists
-        specific_schedule = None
         try:
-            specific_schedule = SpecificSchedule.objects.get(date=date, active=True)
-        except SpecificSchedule.DoesNotExist:
-            pass
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
+        
+        response_data, scheduled = get_days(date, date, establishment_id)[0]
+        if not scheduled:
+            return Response(
+                {"message": "No schedule defined for this date"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(response_data)
+
+
+@permission_classes([IsAuthenticated])
+class GetScheduleForRangeView(APIView):
+    """Gets the applicable schedule of every date in a range"""
+    def get(self, request):
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end')
+        
+        if not start_str or not end_str:
+            return Response(
+                {"error": "The 'start' and 'end' parameters are required (format: YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if start_date > end_date:
+            return Response(
+                {"error": "'start' must not be after 'end'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Get weekly schedule
-        weekday = date.weekday()
-        weekly_schedule = None
         try:
-            weekly_schedule = WeeklySchedule.objects.get(weekday=weekday, active=True)
-        except WeeklySchedule.DoesNotExist:
-            if not specific_schedule:
-                return Response(
-                    {"message": "No schedule defined for this date"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
         
-        # Build a dictionary to manage time slots by time range
-        slots_by_time = {}
+        days = (end_date - start_date).days + 1
+        if days > MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"The range cannot exceed {MAX_RANGE_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # First add slots from the weekly schedule (lower priority)
-        if weekly_schedule:
-            for assignment in weekly_schedule.slotassignment_set.all():
-                time_slot = assignment.time_slot
-                minutes_start = time_slot.start_time.hour * 60 + time_slot.start_time.minute
-                minutes_end = time_slot.end_time.hour * 60 + time_slot.end_time.minute
-                
-                for minute in range(minutes_start, minutes_end):
-                    slots_by_time[minute] = {
-                        'time_slot': time_slot,
-                        'assignment': assignment,
-                        'type': 'weekly',
-                        'schedule': weekly_schedule
-                    }
-        
-        # Then add slots from the specific schedule (higher priority, overwrites)
-        if specific_schedule:
-            for assignment in specific_schedule.slotassignment_set.all():
-                time_slot = assignment.time_slot
-                minutes_start = time_slot.start_time.hour * 60 + time_slot.start_time.minute
-                minutes_end = time_slot.end_time.hour * 60 + time_slot.end_time.minute
-                
-                for minute in range(minutes_start, minutes_end):
-                    slots_by_time[minute] = {
-                        'time_slot': time_slot,
-                        'assignment': assignment,
-                        'type': 'specific',
-                        'schedule': specific_schedule
-                    }
-        
-        # Identify continuous blocks of time slots
-        blocks = []
-        current_block = None
-        previous_slot = None
-        
-        # Iterate through all minutes of the day (0 to 1439 = 24h * 60min)
-        for minute in range(0, 24 * 60):
-            if minute in slots_by_time:
-                slot_info = slots_by_time[minute]
-                if previous_slot is None or previous_slot['time_slot'].id != slot_info['time_slot'].id:
-                    # If the slot changes, close the previous block and open a new one
-                    if current_block is not None:
-                        current_block['minute_end'] = minute
-                        current_block['end_time'] = f"{current_block['minute_end'] // 60:02d}:{current_block['minute_end'] % 60:02d}"
-                        blocks.append(current_block)
-                    
-                    # Start new block
-                    current_block = {
-                        'name': slot_info['time_slot'].name,
-                        'minute_start': minute,
-                        'minute_end': None,
-                        'start_time': f"{minute // 60:02d}:{minute % 60:02d}",
-                        'end_time': None,
-                        'color': slot_info['time_slot'].color,
-                        'notes': slot_info['assignment'].notes or '',
-                        'schedule_type': slot_info['type'],
-                        'schedule': slot_info['schedule']
-                    }
-                previous_slot = slot_info
-            else:
-                # If there's no slot for this minute, close the current block if it exists
-                if current_block is not None:
-                    current_block['minute_end'] = minute
-                    current_block['end_time'] = f"{current_block['minute_end'] // 60:02d}:{current_block['minute_end'] % 60:02d}"
-                    blocks.append(current_block)
-                    current_block = None
-                    previous_slot = None
-        
-        # Close the last block if it's still open
-        if current_block is not None:
-            current_block['minute_end'] = 24 * 60
-            current_block['end_time'] = "24:00"
-            blocks.append(current_block)
-            
-        # Prepare the final response
-        time_slots_data = []
-        for block in blocks:
-            time_slots_data.append({
-                'name': block['name'],
-                'start_time': block['start_time'],
-                'end_time': block['end_time'],
-                'color': block['color'],
-                'notes': block['notes']
-            })
-        
-        # Get the schedule name (combining specific and weekly if needed)
-        schedule_name = ""
-        if specific_schedule:
-            schedule_name = specific_schedule.name
-            if weekly_schedule:
-                schedule_name += f" (base: {weekly_schedule.name})"
-        elif weekly_schedule:
-            schedule_name = weekly_schedule.name
-                
-        response_data = {
-            'date': date.strftime('%Y-%m-%d'),
-            'weekday': date.strftime('%A'),
-            'schedule_name': schedule_name,
-            'time_slots': time_slots_data
-        }
+        # Materialized days are read directly, the rest is resolved in memory
+        response_data = [day for day, _ in get_days(start_date, end_date, establishment_id)]
         
         return Response(response_data)
 
 
+@permission_classes([IsAuthenticated])
+class ScheduleConflictsView(APIView):
+    """Lists every pair of overlapping slot assignments across all schedules"""
+    def get(self, request):
+        return Response(audit_conflicts())
+
+
 @permission_classes([IsAuthenticated])
 class TimeSlotListView(APIView):
     def get(self, request):
         time_slots = TimeSlot.objects.all()
-        serializer = TimeSlotSerializer(time_slots, many=True)
-        return Response(serializer.data)
+        try:
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
+        if establishment_id is not None:
+            time_slots = time_slots.for_establishment(establishment_id)
+        return list_response(request, time_slots, TimeSlotSerializer)
         
     def post(self, request):
         serializer = TimeSlotSerializer(data=request.data)
@@ -196,9 +174,14 @@ class TimeSlotDetailView(APIView):
 @permission_classes([IsAuthenticated])
 class WeeklyScheduleListView(APIView):
     def get(self, request):
-        schedules = WeeklySchedule.objects.all()
-        serializer = WeeklyScheduleSerializer(schedules, many=True)
-        return Response(serializer.data)
+        schedules = WeeklySchedule.objects.with_assignments()
+        try:
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
+        if establishment_id is not None:
+            schedules = schedules.for_establishment(establishment_id)
+        return list_response(request, schedules, WeeklyScheduleSerializer)
         
     def post(self, request):
         serializer = WeeklyScheduleSerializer(data=request.data)
@@ -211,12 +194,12 @@ class WeeklyScheduleListView(APIView):
 @permission_classes([IsAuthenticated])
 class WeeklyScheduleDetailView(APIView):
     def get(self, request, pk):
-        schedule = get_object_or_404(WeeklySchedule, pk=pk)
+        schedule = get_object_or_404(WeeklySchedule.objects.with_assignments(), pk=pk)
         serializer = WeeklyScheduleSerializer(schedule)
         return Response(serializer.data)
         
     def put(self, request, pk):
-        schedule = get_object_or_404(WeeklySchedule, pk=pk)
+        schedule = get_object_or_404(WeeklySchedule.objects.with_assignments(), pk=pk)
         serializer = WeeklyScheduleSerializer(schedule, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -232,9 +215,14 @@ class WeeklyScheduleDetailView(APIView):
 @permission_classes([IsAuthenticated])
 class GroupScheduleListView(APIView):
     def get(self, request):
-        schedules = GroupSchedule.objects.all()
-        serializer = GroupScheduleSerializer(schedules, many=True)
-        return Response(serializer.data)
+        schedules = GroupSchedule.objects.with_assignments()
+        try:
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
+        if establishment_id is not None:
+            schedules = schedules.for_establishment(establishment_id)
+        return list_response(request, schedules, GroupScheduleSerializer)
         
     def post(self, request):
         serializer = GroupScheduleSerializer(data=request.data)
@@ -247,12 +235,12 @@ class GroupScheduleListView(APIView):
 @permission_classes([IsAuthenticated])
 class GroupScheduleDetailView(APIView):
     def get(self, request, pk):
-        schedule = get_object_or_404(GroupSchedule, pk=pk)
+        schedule = get_object_or_404(GroupSchedule.objects.with_assignments(), pk=pk)
         serializer = GroupScheduleSerializer(schedule)
         return Response(serializer.data)
         
     def put(self, request, pk):
-        schedule = get_object_or_404(GroupSchedule, pk=pk)
+        schedule = get_object_or_404(GroupSchedule.objects.with_assignments(), pk=pk)
         serializer = GroupScheduleSerializer(schedule, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -268,9 +256,14 @@ class GroupScheduleDetailView(APIView):
 @permission_classes([IsAuthenticated])
 class SpecificScheduleListView(APIView):
     def get(self, request):
-        schedules = SpecificSchedule.objects.all()
-        serializer = SpecificScheduleSerializer(schedules, many=True)
-        return Response(serializer.data)
+        schedules = SpecificSchedule.objects.with_assignments()
+        try:
+            establishment_id = get_establishment_id(request)
+        except ValueError:
+            return invalid_establishment_response()
+        if establishment_id is not None:
+            schedules = schedules.for_establishment(establishment_id)
+        return list_response(request, schedules, SpecificScheduleSerializer)
         
     def post(self, request):
         serializer = SpecificScheduleSerializer(data=request.data)
@@ -283,12 +276,12 @@ class SpecificScheduleListView(APIView):
 @permission_classes([IsAuthenticated])
 class SpecificScheduleDetailView(APIView):
     def get(self, request, pk):
-        schedule = get_object_or_404(SpecificSchedule, pk=pk)
+        schedule = get_object_or_404(SpecificSchedule.objects.with_assignments(), pk=pk)
         serializer = SpecificScheduleSerializer(schedule)
         return Response(serializer.data)
         
     def put(self, request, pk):
-        schedule = get_object_or_404(SpecificSchedule, pk=pk)
+        schedule = get_object_or_404(SpecificSchedule.objects.with_assignments(), pk=pk)
         serializer = SpecificScheduleSerializer(schedule, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -341,27 +334,15 @@ class CreateSpecificScheduleFromView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
         
-        # Check if a schedule already exists for this date
-        if SpecificSchedule.objects.filter(date=date).exists():
+        # Check if the establishment of the template already has a schedule for this date
+        if SpecificSchedule.objects.filter(establishment=template.establishment_id, date=date).exists():
             return Response(
                 {"error": "A specific schedule already exists for this date"},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Create the new specific schedule
-        new_schedule = SpecificSchedule.objects.create(
-            name=f"Schedule for {date.strftime('%d/%m/%Y')} (based on {template.name})",
-            date=date
-        )
-        
-        # Copy the time slots from the template
-        for assignment in template.slotassignment_set.all():
-            SlotAssignment.objects.create(
-                specific_schedule=new_schedule,
-                time_slot=assignment.time_slot,
-                order=assignment.order,
-                notes=assignment.notes
-            )
+        # Create the new specific schedule copying the time slots from the template
+        new_schedule = clone_template(template, [date])[0][0]
             
         return Response({
             "message": "Specific schedule created successfully",
@@ -369,6 +350,66 @@ class CreateSpecificScheduleFromView(APIView):
             "name": new_schedule.name
         })
 
+@permission_classes([IsAuthenticated])
+class BulkCreateSpecificScheduleFromView(APIView):
+    """Creates specific schedules for several dates based on an existing schedule"""
+    def post(self, request):
+        date_strs = request.data.get('dates')
+        start_str = request.data.get('start_date')
+        end_str = request.data.get('end_date')
+        template_id = request.data.get('template_id')
+        template_type = request.data.get('template_type', 'weekly')  # weekly or group
+        clone_prices = request.data.get('clone_prices', False) in (True, 'true', 'True', '1', 1)
+        
+        if not template_id or not (date_strs or (start_str and end_str)):
+            return Response(
+                {"error": "Parameters 'template_id' and either 'dates' or 'start_date' and 'end_date' are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Checked before parsing or expanding anything
+        if date_strs and len(date_strs) > MAX_RANGE_DAYS:
+            return invalid_date_count_response()
+        
+        try:
+            if date_strs:
+                dates = [datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in date_strs]
+                days = len(set(dates))
+            else:
+                start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+                end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+                days = (end_date - start_date).days + 1
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not 1 <= days <= MAX_RANGE_DAYS:
+            return invalid_date_count_response()
+        if not date_strs:
+            dates = date_range(start_date, end_date)
+        
+        # Get the template based on type
+        template_model = WeeklySchedule if template_type == 'weekly' else GroupSchedule
+        template = template_model.objects.filter(id=template_id).first()
+        if template is None:
+            return Response(
+                {"error": f"{template_type.capitalize()} schedule template not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        schedules, skipped = clone_template(template, dates, clone_prices=clone_prices)
+        
+        return Response({
+            "message": f"{len(schedules)} specific schedules created successfully",
+            "created": [
+                {"id": schedule.id, "name": schedule.name, "date": schedule.date.strftime('%Y-%m-%d')}
+                for schedule in schedules
+            ],
+            "skipped": [date.strftime('%Y-%m-%d') for date in skipped]
+        }, status=status.HTTP_201_CREATED)
+
 @permission_classes([IsAuthenticated])
 class SlotAssignmentListView(APIView):
     """
@@ -380,7 +421,7 @@ class SlotAssignmentListView(APIView):
         group_id = request.query_params.get('group_schedule')
         specific_id = request.query_params.get('specific_schedule')
         
-        assignments = SlotAssignment.objects.all()
+        assignments = SlotAssignment.objects.select_related('time_slot')
         
         if weekly_id:
             assignments = assignments.filter(weekly_schedule_id=weekly_id)
@@ -389,8 +430,7 @@ class SlotAssignmentListView(APIView):
         elif specific_id:
             assignments = assignments.filter(specific_schedule_id=specific_id)
             
-        serializer = SlotAssignmentSerializer(assignments, many=True)
-        return Response(serializer.data)
+        return list_response(request, assignments, SlotAssignmentSerializer)
     
     def post(self, request, format=None):
         serializer = SlotAssignmentSerializer(data=request.data)
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Service
+from .models import Service, Category
 
 admin.site.register(Service)
+admin.site.register(Category)
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from reservation.models import Reservation
+from schedule.resolution import SECONDS_PER_DAY, ScheduleIndex, format_seconds
+from .models import Service, ServicePriceAssignment
+
+
+def subtract_intervals(intervals, removed):
+    """
+    Partes de los intervalos (start, end, payload) que no cubre ningún
+    intervalo (start, end) de removed. Ambas listas deben venir ordenadas por
+    inicio y los intervalos no deben solaparse entre sí, así que se recorren a
+    la vez en una sola pasada.
+    """
+    free = []
+    index = 0
+    for start, end, payload in intervals:
+        # Los intervalos eliminados que terminan antes no afectan a los siguientes
+        while index < len(removed) and removed[index][1] <= start:
+            index += 1
+        current = start
+        position = index
+        while position < len(removed) and removed[position][0] < end:
+            removed_start, removed_end = removed[position]
+            if removed_start > current:
+                free.append((current, removed_start, payload))
+            current = max(current, removed_end)
+            position += 1
+        if current < end:
+            free.append((current, end, payload))
+    return free
+
+
+def merge_removed(intervals):
+    """Une los intervalos (start, end) que se solapan o se tocan, ordenados por inicio"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def merge_priced(intervals):
+    """
+    Une los intervalos (start, end, price) que se tocan y tienen el mismo
+    precio, ordenados por inicio. Los de precios distintos se mantienen
+    separados para que cada uno conserve el suyo.
+    """
+    merged = []
+    for start, end, price in intervals:
+        if merged and merged[-1][1] == start and merged[-1][2] == price:
+            merged[-1] = (merged[-1][0], end, price)
+        else:
+            merged.append((start, end, price))
+    return merged
+
+
+def reservation_seconds(reservation, date):
+    """Intervalo en segundos del día de la parte de una reserva que cae en esa fecha"""
+    midnight = datetime.combine(date, datetime.min.time())
+    start = (reservation['starting_date'] - midnight).total_seconds()
+    end = (reservation['end_date'] - midnight).total_seconds()
+    return max(0, int(start)), min(SECONDS_PER_DAY, int(end))
+
+
+def get_availability(service_ids, start_date, end_date):
+    """
+    Tramos libres con su precio de cada servicio y fecha del rango.
+
+    Los tramos son los del horario resuelto de cada fecha en los que el
+    servicio tiene un precio reservable, menos los intervalos ya reservados.
+    Los tramos contiguos solo se unen cuando tienen el mismo precio.
+    max_duration es la duración máxima en minutos de una reserva en el tramo,
+    limitada por max_reservation del servicio cuando está definido.
+
+    Todo se carga en un número fijo de consultas sea cual sea el número de
+    servicios y de días.
+    """
+    services = list(Service.objects.filter(id__in=service_ids).order_by('id'))
+    if not services:
+        return []
+
+    indexes = ScheduleIndex.load_many(start_date, end_date, {service.establishment_id for service in services})
+
+    prices = {
+        (price['service_id'], price['time_slot_id']): price['price']
+        for price in ServicePriceAssignment.objects.filter(
+            service__in=services,
+            bookable=True
+        ).values('service_id', 'time_slot_id', 'price')
+    }
+
+    reservations = defaultdict(list)
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    for reservation in Reservation.objects.filter(
+        service__in=services,
+        starting_date__lt=range_end,
+        end_date__gt=range_start
+    ).values('service_id', 'starting_date', 'end_date'):
+        reservations[reservation['service_id']].append(reservation)
+
+    # Un mismo horario resuelto sirve para todos los servicios del establecimiento
+    blocks_by_day = {}
+    dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    result = []
+    for service in services:
+        for date in dates:
+            day_start = datetime.combine(date, datetime.min.time())
+            day_end = day_start + timedelta(days=1)
+            key = (service.establishment_id, date)
+            if key not in blocks_by_day:
+                blocks_by_day[key] = indexes[service.establishment_id].resolve(date)[0]
+
+            priced = merge_priced(
+                (block['start'], block['end'], prices[(service.id, block['assignment'].id)])
+                for block in blocks_by_day[key]
+                if (service.id, block['assignment'].id) in prices
+            )
+            if not priced:
+                continue
+
+            removed = merge_removed(
+                reservation_seconds(reservation, date)
+                for reservation in reservations[service.id]
+                if reservation['starting_date'] < day_end and reservation['end_date'] > day_start
+            )
+            free = subtract_intervals(priced, removed)
+            result.append({
+                'service': service.id,
+                'date': date.strftime('%Y-%m-%d'),
+                'free': [
+                    {
+                        'start_time': format_seconds(start),
+                        'end_time': format_seconds(end),
+                        'price': str(price),
+                        'max_duration': min((end - start) // 60, service.max_reservation or (end - start) // 60),
+                    }
+                    for start, end, price in free
+                ],
+            })
+    return result
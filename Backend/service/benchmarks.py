@@ -0,0 +1,98 @@
+import random
+import statistics
+import time as timer
+from datetime import time
+
+from .views import merge_slots
+
+
+# Tramos por servicio de cada tamaño de tabla de precios
+SIZES = [100, 500, 2000]
+
+
+def legacy_split_slot(slot, overlap):
+    """Partes de slot que no solapan con overlap (implementación anterior)"""
+    result = []
+    if slot["start_time"] < overlap["start_time"]:
+        new_slot = slot.copy()
+        new_slot["end_time"] = overlap["start_time"]
+        result.append(new_slot)
+    if overlap["end_time"] < slot["end_time"]:
+        new_slot = slot.copy()
+        new_slot["start_time"] = overlap["end_time"]
+        result.append(new_slot)
+    return result
+
+
+def legacy_merge_slots(slots):
+    """
+    Fusión de tramos que usaba ServiceListRecomendations antes de merge_slots,
+    conservada solo como referencia del benchmark: cada tramo recorre la lista
+    ya construida, así que el coste es cuadrático o peor.
+    """
+    merged = []
+    for slot in slots:
+        solapado = False
+        for existing in merged[:]:
+            if not (slot["end_time"] <= existing["start_time"] or slot["start_time"] >= existing["end_time"]):
+                solapado = True
+                merged.remove(existing)
+                merged.extend(legacy_split_slot(existing, slot))
+                if slot["id"] not in [x["id"] for x in merged]:
+                    merged.append(slot)
+        if not solapado:
+            merged.append(slot)
+    merged.sort(key=lambda x: x["start_time"])
+    return merged
+
+
+def generate_slots(count, seed=0):
+    """Tramos semanales aleatorios, que se solapan entre sí, de un único servicio"""
+    generator = random.Random(seed)
+    slots = []
+    for index in range(count):
+        start = generator.randrange(0, 23 * 60)
+        end = min(start + generator.randrange(5, 60), 24 * 60 - 1)
+        slots.append({
+            "id": index,
+            "price": 10.0,
+            "name": f"Tramo {index}",
+            "start_time": time(start // 60, start % 60),
+            "end_time": time(end // 60, end % 60),
+            "color": "#3498db",
+            "schedule_type": {"type": "weekly", "id": 1, "name": "Semanal", "weekday": 0},
+        })
+    return slots
+
+
+def _timed(function, slots, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        result = function(slots)
+        durations.append((timer.perf_counter() - started) * 1000)
+    return result, round(statistics.median(durations), 3)
+
+
+def _intervals(slots):
+    return [(slot["id"], slot["start_time"], slot["end_time"]) for slot in slots]
+
+
+def benchmark_slot_merge(sizes=SIZES, repeat=3):
+    """
+    Compara merge_slots con la implementación anterior sobre tablas de
+    precios sintéticas. Con tramos de igual prioridad ambas deben devolver
+    los mismos tramos, lo que se comprueba en 'matches'.
+    """
+    report = {}
+    for size in sizes:
+        slots = generate_slots(size)
+        legacy, legacy_ms = _timed(legacy_merge_slots, slots, repeat)
+        merged, merged_ms = _timed(merge_slots, slots, repeat)
+        report[size] = {
+            "legacy_ms": legacy_ms,
+            "merge_ms": merged_ms,
+            "speedup": round(legacy_ms / merged_ms, 1) if merged_ms else None,
+            "matches": sorted(_intervals(legacy)) == sorted(_intervals(merged)),
+        }
+    return report
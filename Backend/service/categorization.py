@@ -0,0 +1,360 @@
+import hashlib
+import math
+import os
+import threading
+import time as timer
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from openai import OpenAI, OpenAIError
+
+from .models import Category, CategoryCache, Service
+from .recomendation import LLM_TIMEOUT
+from .search import get_words
+
+
+# Vecinos que votan la categoría de un servicio nuevo
+NEIGHBOURS = 5
+
+# Similitud mínima con el vecino más cercano y fracción mínima de los votos
+# que debe tener la categoría elegida para asignarla sin preguntar al modelo
+MIN_SIMILARITY = 0.5
+MIN_AGREEMENT = 0.6
+
+# Segundos que un proceso reutiliza su índice de vecinos antes de reconstruirlo
+# en segundo plano, para recoger los cambios hechos desde otros procesos
+INDEX_MAX_AGE = 300
+
+# Categoría de los servicios que esperan a que el modelo se la asigne
+PENDING_CATEGORY = ''
+
+
+class EmptyCategoryError(OpenAIError):
+    """El modelo respondió sin ninguna categoría"""
+
+
+def get_tokens(text):
+    """Palabras de un texto en minúsculas y sin tildes, sin las de menos de tres letras"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return [word for word in get_words(text) if len(word) > 2]
+
+
+def get_cache_key(name, description):
+    """Clave de la caché de categorías, igual para textos que solo difieren en mayúsculas, tildes o puntuación"""
+    normalized = ' '.join(get_tokens(name)) + '\n' + ' '.join(get_tokens(description))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class NeighbourIndex:
+    """
+    Índice TF-IDF invertido del nombre y la descripción de los servicios
+    categorizados, para encontrar los más parecidos a uno nuevo recorriendo
+    solo los que comparten alguna palabra con él.
+    """
+
+    def __init__(self, services):
+        documents = [
+            (service_id, Counter(get_tokens(f"{name} {description}")), category)
+            for service_id, name, description, category in services
+        ]
+        frequency = Counter(token for _, tokens, _ in documents for token in tokens)
+        # El idf se fija al construir el índice; los servicios añadidos después usan el mismo
+        self.idf = {token: math.log((1 + len(documents)) / (1 + count)) + 1 for token, count in frequency.items()}
+        self.unseen_idf = math.log(1 + len(documents)) + 1
+        self.postings = defaultdict(list)
+        # Categoría de cada documento, None en los de servicios quitados, y documento de cada servicio
+        self.categories = []
+        self.documents = {}
+        for service_id, tokens, category in documents:
+            self.add_tokens(service_id, tokens, category)
+        self.built = timer.monotonic()
+
+    def get_weights(self, tokens):
+        weights = {token: count * self.idf.get(token, self.unseen_idf) for token, count in tokens.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {token: weight / norm for token, weight in weights.items()} if norm else {}
+
+    def add_tokens(self, service_id, tokens, category):
+        self.remove(service_id)
+        document = len(self.categories)
+        self.categories.append(category)
+        self.documents[service_id] = document
+        for token, weight in self.get_weights(tokens).items():
+            self.postings[token].append((document, weight))
+
+    def add(self, service_id, name, description, category):
+        """Añade un servicio categorizado al índice, en lugar de lo que tuviera antes"""
+        self.add_tokens(service_id, Counter(get_tokens(f"{name} {description}")), category)
+
+    def remove(self, service_id):
+        """Quita un servicio del índice; sus entradas se ignoran hasta la siguiente reconstrucción"""
+        document = self.documents.pop(service_id, None)
+        if document is not None:
+            self.categories[document] = None
+
+    def nearest(self, name, description, count=NEIGHBOURS):
+        """Pares (similitud coseno, categoría) de los servicios más parecidos, de más a menos"""
+        scores = defaultdict(float)
+        for token, weight in self.get_weights(Counter(get_tokens(f"{name} {description}"))).items():
+            for document, document_weight in self.postings.get(token, ()):
+                if self.categories[document] is not None:
+                    scores[document] += weight * document_weight
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [(score, self.categories[document]) for document, score in best]
+
+    def classify(self, name, description):
+        """
+        Categoría que votan los vecinos más parecidos, ponderada por su
+        similitud, o None si el más parecido no lo es lo suficiente o los
+        vecinos no se ponen de acuerdo
+        """
+        neighbours = self.nearest(name, description)
+        if not neighbours or neighbours[0][0] < MIN_SIMILARITY:
+            return None
+        votes = defaultdict(float)
+        for score, category in neighbours:
+            votes[category] += score
+        category, score = max(votes.items(), key=lambda item: item[1])
+        return category if score / sum(votes.values()) >= MIN_AGREEMENT else None
+
+
+_index = None
+_index_lock = threading.Lock()
+# Cambios hechos en el proceso mientras otro hilo reconstruye el índice, que
+# se aplican también al nuevo; None cuando no se está reconstruyendo
+_pending_changes = None
+
+
+def build_index():
+    """Índice de vecinos de los servicios con una categoría que no votaron los vecinos"""
+    return NeighbourIndex(
+        Service.objects.exclude(category=PENDING_CATEGORY).filter(
+            category_guessed=False
+        ).values_list('id', 'name', 'description', 'category')
+    )
+
+
+def get_index():
+    """
+    Índice de vecinos del proceso. Solo se construye dentro de la petición la
+    primera vez; cuando caduca se sigue usando mientras otro hilo construye
+    el nuevo.
+    """
+    global _index, _pending_changes
+    with _index_lock:
+        if _index is None:
+            _index = build_index()
+        elif _pending_changes is None and timer.monotonic() - _index.built > INDEX_MAX_AGE:
+            _pending_changes = []
+            threading.Thread(target=_rebuild_in_background, daemon=True).start()
+        return _index
+
+
+def _rebuild_in_background():
+    global _index, _pending_changes
+    try:
+        index = build_index()
+        with _index_lock:
+            for change in _pending_changes:
+                change(index)
+            _index = index
+    finally:
+        # Si falla se sigue usando el índice anterior y se reintenta en el siguiente uso
+        with _index_lock:
+            _pending_changes = None
+        connection.close()
+
+
+def _update_index(change):
+    with _index_lock:
+        if _index is not None:
+            change(_index)
+        if _pending_changes is not None:
+            _pending_changes.append(change)
+
+
+def add_to_index(service):
+    """
+    Añade al índice del proceso, si ya está construido, un servicio cuya
+    categoría dio el modelo, la caché o el usuario. Las que votaron los
+    vecinos no se añaden para que una suposición no refuerce las siguientes.
+    """
+    if service.category == PENDING_CATEGORY or service.category_guessed:
+        remove_from_index(service.pk)
+        return
+    values = (service.pk, service.name, service.description, service.category)
+    _update_index(lambda index: index.add(*values))
+
+
+def remove_from_index(service_id):
+    """Quita un servicio del índice del proceso"""
+    _update_index(lambda index: index.remove(service_id))
+
+
+def reset_index():
+    """Descarta el índice del proceso para que se reconstruya en el siguiente uso"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def get_cached_category(name, description):
+    """Categoría que ya respondió el modelo para el mismo nombre y descripción, o None"""
+    return CategoryCache.objects.filter(
+        key=get_cache_key(name, description)
+    ).exclude(category='').values_list('category', flat=True).first()
+
+
+def get_category(name, description):
+    """
+    Categoría que se puede asignar sin esperar al modelo: la que ya respondió
+    para el mismo nombre y descripción, o la de los servicios más parecidos,
+    y si es esta última. None si ninguna de las dos es fiable.
+    """
+    cached = get_cached_category(name, description)
+    if cached is not None:
+        return cached, False
+    guessed = get_index().classify(name, description)
+    return guessed, guessed is not None
+
+
+def build_prompt(name, description, categories):
+    return f"""
+       Eres un experto en juegos y servicios que se pueden encontrar en un establecimiento de ocio.
+       Tu tarea es asignar una categoría al servicio que se te proporciona, basándote en su nombre y descripción.
+       El servicio se describe de la siguiente manera:
+       Nombre: {name}
+       Descripción: {description}
+
+       Categorías ya definidas:
+          {', '.join(categories)}
+          Si el servicio no encaja en ninguna de las categorías existentes, crea una nueva categoría. Recuerda que las categorías deben ser concisas es decir 
+          en general no deben tener más de 3 palabras, no es una descripción del servicio, simplemente una forma de clasificar los servicios que se 
+          puedan encontrar.
+          
+
+        Aqui tienes varios ejemplos de como se asignan las categorías en base a los nombres y descripciones de los servicios:
+        {{
+            "model": "service.service",
+            "pk": 457504,
+            "fields": {{
+                "name": "Televisión Sony Bravia 50 pulgadas",
+                "description": "Ideal para presentaciones o documentales. Conecta tu dispositivo y aprovecha sus aplicaciones.",
+                "category": "televisión, smart TV, LED",
+                "max_reservation": 28,
+                "max_people": 0,
+                "deposit": 18,
+                "establishment": 901234
+            }}
+        }},
+        {{
+            "model": "service.service",
+            "pk": 457582,
+            "fields": {{
+                "name": "Mesa de billar profesional",
+                "description": "Mesa de billar americana de tamaño reglamentario perfecta para torneos entre amigos con tacos incluidos.",
+                "category": "billar",
+                "max_people": 4,
+                "max_reservation": 120,
+                "deposit": 25,
+                "establishment": 123890
+            }}
+        }},
+        {{
+            "model": "service.service",
+            "pk": 457586,
+            "fields": {{
+                "name": "Karaoke profesional con pantalla",
+                "description": "Sistema completo de karaoke con miles de canciones en español e inglés y dos micrófonos inalámbricos.",
+                "category": "karaoke",
+                "max_reservation": 180,
+                "max_people": 15,
+                "deposit": 30,
+                "establishment": 345678
+            }}
+        }},
+        {{
+            "model": "service.service",
+            "pk": 457587,
+            "fields": {{
+                "name": "Mesa de air hockey LED",
+                "description": "Mesa de hockey de aire con efectos LED y marcador electrónico para partidas rápidas y emocionantes.",
+                "category": "air hockey",
+                "max_reservation": 60,
+                "max_people": 2,
+                "deposit": 22,
+                "establishment": 345678
+            }}
+        }},
+        {{
+            "model": "service.service",
+            "pk": 457588,
+            "fields": {{
+                "name": "Máquina recreativa arcade retro",
+                "description": "Máquina con más de 1000 juegos clásicos de los 80s y 90s perfecta para la nostalgia gamer.",
+                "category": "arcade",
+                "max_reservation": 120,
+                "max_people": 2,
+                "deposit": 25,
+                "establishment": 456789
+            }}
+        }},
+        Responde únicamente con la categoría asignada, sin comillas ni ningún otro texto."""
+
+
+def ask_category(name, description, timeout=LLM_TIMEOUT):
+    """
+    Pregunta la categoría al modelo y guarda la respuesta en la caché. Una
+    respuesta vacía es un fallo: no se guarda y lanza EmptyCategoryError.
+    """
+    categories = Category.objects.values_list('name', flat=True)
+    client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'), timeout=timeout, max_retries=0)
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",  # o "gpt-4o-mini"
+        messages=[
+            {"role": "system", "content": build_prompt(name, description, categories)},
+            {"role": "user", "content": "Asigna una categoría al servicio proporcionado."},
+        ],
+        temperature=0.7,
+    )
+
+    raw_content = response.choices[0].message.content or ""
+    # Limpiar el bloque ```json ... ```
+    cleaned = raw_content.strip().strip("`")  # quita los backticks
+    cleaned = cleaned.replace("json", "", 1).strip()  # quita la palabra "json" si está al inicio
+    category = cleaned[:CategoryCache._meta.get_field('category').max_length].strip()
+    if not category:
+        raise EmptyCategoryError("El modelo no ha devuelto ninguna categoría")
+
+    CategoryCache.objects.update_or_create(key=get_cache_key(name, description), defaults={'category': category})
+    return category
+
+
+def categorize_service(service_id):
+    """Asigna la categoría a un servicio pendiente, preguntando al modelo si no está en la caché"""
+    service = Service.objects.filter(pk=service_id, category=PENDING_CATEGORY).first()
+    if service is None:
+        return None
+    cached = get_cached_category(service.name, service.description)
+    service.category = cached if cached is not None else ask_category(service.name, service.description)
+    service.save(update_fields=['category'])
+    return service.category
+
+
+def _categorize_in_background(service_id):
+    try:
+        categorize_service(service_id)
+    except OpenAIError as e:
+        # Se queda pendiente para categorize_pending_services
+        print("Error al categorizar el servicio:", service_id, e)
+    finally:
+        connection.close()
+
+
+def categorize_on_commit(service):
+    """Categoriza un servicio pendiente en otro hilo cuando se confirme su creación"""
+    transaction.on_commit(
+        lambda: threading.Thread(target=_categorize_in_background, args=(service.pk,), daemon=True).start()
+    )
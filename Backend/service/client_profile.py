@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from reservation.models import Reservation
+from .models import split_categories
+
+
+# Categorías más reservadas que se guardan en el perfil
+TOP_CATEGORIES = 3
+
+# Segundos que se guarda un perfil en caché; además se invalida al crear o borrar
+# reservas del cliente y al cambiar la categoría o el número de personas de un
+# servicio que ha reservado. La caché debe ser compartida por todos los procesos
+# (ver CACHES en settings) para que la invalidación llegue a todos
+PROFILE_TIMEOUT = 60 * 60
+
+
+def get_cache_key(client_id):
+    return f"service:client-profile:{client_id}"
+
+
+def weighted_median(counts):
+    """Mediana de unos valores dados como {valor: veces que aparece}"""
+    total = sum(counts.values())
+    # Posiciones de los dos valores centrales, que coinciden si el total es impar
+    positions = [(total - 1) // 2, total // 2]
+    middle = []
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while len(middle) < 2 and seen > positions[len(middle)]:
+            middle.append(value)
+    return (middle[0] + middle[1]) / 2
+
+
+def compute_client_profile(client_id):
+    """
+    Perfil de reservas de un cliente: sus categorías más reservadas y la media,
+    la mediana y el rango del número de personas de los servicios que reserva.
+
+    Se calcula con una sola consulta que agrupa las reservas por servicio, así
+    que no depende del número de reservas sino del de servicios distintos.
+    None si el cliente no tiene reservas.
+    """
+    services = Reservation.objects.filter(client_id=client_id).values(
+        'service_id', 'service__category', 'service__max_people'
+    ).annotate(reservations=Count('id')).order_by('service_id')
+
+    categories = Counter()
+    party_sizes = Counter()
+    for service in services:
+        for category in split_categories(service['service__category']):
+            categories[category] += service['reservations']
+        party_sizes[service['service__max_people']] += service['reservations']
+
+    if not party_sizes:
+        return None
+    reservations = sum(party_sizes.values())
+    return {
+        'reservations': reservations,
+        'categories': [category for category, _ in categories.most_common(TOP_CATEGORIES)],
+        'party_size': {
+            'mean': sum(size * count for size, count in party_sizes.items()) / reservations,
+            'median': weighted_median(party_sizes),
+            'min': min(party_sizes),
+            'max': max(party_sizes),
+        },
+    }
+
+
+def get_client_profile(client_id):
+    """Perfil de reservas de un cliente, desde la caché si está"""
+    key = get_cache_key(client_id)
+    profile = cache.get(key)
+    if profile is None:
+        profile = compute_client_profile(client_id)
+        # Los clientes sin reservas también se guardan, como un perfil vacío
+        cache.set(key, profile or {}, PROFILE_TIMEOUT)
+    return profile or None
+
+
+def invalidate_client_profile(client_id):
+    cache.delete(get_cache_key(client_id))
+
+
+def invalidate_service_clients(service_id):
+    """Invalida los perfiles de los clientes que han reservado un servicio"""
+    client_ids = Reservation.objects.filter(service_id=service_id).values_list('client_id', flat=True).distinct()
+    cache.delete_many([get_cache_key(client_id) for client_id in client_ids])
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service.benchmarks import SIZES, benchmark_slot_merge
+
+
+class Command(BaseCommand):
+    help = "Compara la fusión de tramos de las recomendaciones con la implementación anterior y escribe un informe JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, help="Tramos por servicio")
+        parser.add_argument('--repeat', type=int, default=3, help="Ejecuciones medidas por tamaño")
+        parser.add_argument('--output', help="Fichero del informe JSON, por defecto la salida estándar")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat debe ser al menos 1")
+
+        output = json.dumps(benchmark_slot_merge(options['sizes'], options['repeat']), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Informe escrito en {options['output']}"))
+        else:
+            self.stdout.write(output)
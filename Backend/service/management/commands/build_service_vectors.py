@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from service.vectors import build_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los vectores de los servicios con los que se recomiendan servicios afines a cada cliente. "
+        "Los servicios creados o editados después no cambian sus recomendaciones hasta volver a ejecutarlo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.SERVICE_VECTORS_DIR, help="Directorio de los vectores")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = build_vectors(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Vectores de {count} servicios escritos en {options['output']} en {time.perf_counter() - started:.1f} s"
+        ))
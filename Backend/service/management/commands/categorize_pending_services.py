@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from openai import OpenAIError
+
+from service.categorization import PENDING_CATEGORY, categorize_service
+from service.models import Service
+
+
+class Command(BaseCommand):
+    help = "Asigna la categoría a los servicios que se quedaron pendientes porque el modelo falló o no respondió"
+
+    def handle(self, *args, **options):
+        count = 0
+        for service_id in Service.objects.filter(category=PENDING_CATEGORY).values_list('id', flat=True):
+            try:
+                categorize_service(service_id)
+                count += 1
+            except OpenAIError as e:
+                self.stderr.write(self.style.ERROR(f"Error al categorizar el servicio {service_id}: {e}"))
+        self.stdout.write(self.style.SUCCESS(f"{count} servicios categorizados"))
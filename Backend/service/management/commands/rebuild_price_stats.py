@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from service.price_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelve a calcular las estadísticas de precios de las recomendaciones. Hace falta tras cargar precios, tramos u "
+        "horarios con bulk_create o fixtures o cambiarlos con update, que no las actualizan"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas de precios recalculadas en {count} grupos"))
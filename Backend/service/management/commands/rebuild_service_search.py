@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from service.search import is_indexed, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Vuelve a generar el índice de búsqueda de texto de los servicios"
+
+    def handle(self, *args, **options):
+        if not is_indexed():
+            self.stdout.write("La base de datos mantiene el índice de búsqueda por sí misma, no hay nada que regenerar")
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda regenerado con {count} servicios"))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+def split_service_categories(apps, schema_editor):
+    Service = apps.get_model('service', 'Service')
+    Category = apps.get_model('service', 'Category')
+    categories = {}
+    for service in Service.objects.all():
+        names = []
+        for part in (service.category or '').split(','):
+            name = part.strip().lower()
+            if name and name not in names:
+                names.append(name)
+        for name in names:
+            if name not in categories:
+                categories[name], _ = Category.objects.get_or_create(name=name)
+        service.categories.set([categories[name] for name in names])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0005_service_max_people'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='categories',
+            field=models.ManyToManyField(blank=True, related_name='services', to='service.category'),
+        ),
+        migrations.RunPython(split_service_categories, migrations.RunPython.noop),
+    ]
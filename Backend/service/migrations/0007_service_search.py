@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE service_search USING fts5("
+            "name, description, category, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO service_search (rowid, name, description, category) "
+            "SELECT id, name, description, category FROM service_service"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX service_search_idx ON service_service USING GIN ("
+            "to_tsvector('spanish', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(category, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE service_search")
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX service_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0006_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:31
+
+from datetime import time
+
+from django.db import migrations, models
+
+
+def get_bucket(start_time):
+    bucket = 'night'
+    for start, name in ((time(6), 'morning'), (time(12), 'midday'), (time(16), 'afternoon'), (time(21), 'night')):
+        if start_time >= start:
+            bucket = name
+    return bucket
+
+
+def compute_price_stats(apps, schema_editor):
+    ServicePriceAssignment = apps.get_model('service', 'ServicePriceAssignment')
+    PriceStat = apps.get_model('service', 'PriceStat')
+    groups = {}
+    prices = ServicePriceAssignment.objects.filter(bookable=True).select_related(
+        'time_slot__time_slot', 'time_slot__weekly_schedule', 'time_slot__specific_schedule'
+    ).prefetch_related('service__categories')
+    for price in prices:
+        slot = price.time_slot
+        if slot.weekly_schedule_id:
+            key = ('weekly', slot.weekly_schedule.weekday)
+        elif slot.specific_schedule_id:
+            key = ('specific', slot.specific_schedule.date.weekday())
+        elif slot.group_schedule_id:
+            key = ('group', None)
+        else:
+            continue
+        for category in price.service.categories.all():
+            group = (category.name, *key, get_bucket(slot.time_slot.start_time))
+            if group not in groups:
+                groups[group] = PriceStat(
+                    category=group[0], schedule_type=group[1], weekday=group[2], bucket=group[3],
+                    count=0, total=0, total_squares=0, minimum=price.price, maximum=price.price
+                )
+            stat = groups[group]
+            stat.count += 1
+            stat.total += price.price
+            stat.total_squares += price.price * price.price
+            stat.minimum = min(stat.minimum, price.price)
+            stat.maximum = max(stat.maximum, price.price)
+    PriceStat.objects.bulk_create(groups.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_service_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100)),
+                ('schedule_type', models.CharField(max_length=10)),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('bucket', models.CharField(choices=[('morning', 'Mañana'), ('midday', 'Mediodía'), ('afternoon', 'Tarde'), ('night', 'Noche')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_squares', models.DecimalField(decimal_places=4, default=0, max_digits=30)),
+                ('minimum', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('maximum', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'schedule_type', 'weekday', 'bucket'), name='unique_price_stat'), models.UniqueConstraint(condition=models.Q(('weekday__isnull', True)), fields=('category', 'schedule_type', 'bucket'), name='unique_price_stat_any_weekday')],
+            },
+        ),
+        migrations.RunPython(compute_price_stats, migrations.RunPython.noop),
+    ]
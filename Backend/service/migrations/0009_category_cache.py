@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0008_price_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('category', models.CharField(max_length=100)),
+            ],
+        ),
+    ]
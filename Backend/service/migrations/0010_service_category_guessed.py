@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0009_category_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='category_guessed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
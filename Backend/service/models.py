@@ -4,6 +4,40 @@ from django.core.validators import MinLengthValidator, MaxLengthValidator, Regex
 from establishment.models import Establishment
 from schedule.models import SlotAssignment
 
+def split_categories(text):
+    """Categorías de un texto separado por comas, sin espacios, en minúsculas y sin repetir"""
+    categories = []
+    for part in (text or '').split(','):
+        name = part.strip().lower()
+        if name and name not in categories:
+            categories.append(name)
+    return categories
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def save(self, *args, **kwargs):
+        self.name = self.name.strip().lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryCache(models.Model):
+    """Categoría que asignó el modelo a un nombre y una descripción, para no volver a preguntarle"""
+    # sha256 del nombre y la descripción normalizados (ver categorization.get_cache_key)
+    key = models.CharField(max_length=64, unique=True)
+    category = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.category
+
+
 class Service(models.Model):
 
     def random_id():
@@ -13,12 +47,37 @@ class Service(models.Model):
     name = models.CharField(max_length=75)
     description = models.CharField(max_length=350)
     category = models.CharField(max_length=100)
+    # La categoría la votaron los servicios más parecidos y no se usa para categorizar otros
+    category_guessed = models.BooleanField(default=False)
+    categories = models.ManyToManyField(Category, related_name='services', blank=True)
     max_people = models.PositiveIntegerField()
     max_reservation = models.PositiveIntegerField()
     deposit = models.PositiveIntegerField()
     
     establishment = models.ForeignKey(Establishment, on_delete=models.CASCADE)
 
+    def sync_categories(self):
+        """Enlaza el servicio con las categorías de su campo category, creando las que falten"""
+        names = split_categories(self.category)
+        Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+        self.categories.set(Category.objects.filter(name__in=names))
+
+class ServicePriceAssignmentQuerySet(models.QuerySet):
+    def with_details(self):
+        """
+        Carga en la misma consulta el servicio con su establecimiento y el
+        tramo con su horario, y los trabajadores del establecimiento en una
+        consulta más, para serializar sin consultas por fila
+        """
+        return self.select_related(
+            'service__establishment',
+            'time_slot__time_slot',
+            'time_slot__weekly_schedule',
+            'time_slot__group_schedule',
+            'time_slot__specific_schedule'
+        ).prefetch_related('service__establishment__workers')
+
+
 class ServicePriceAssignment(models.Model):
     
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -27,4 +86,48 @@ class ServicePriceAssignment(models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     time_slot = models.ForeignKey(SlotAssignment, on_delete=models.CASCADE)
 
-    unique_together = ['time_slot', 'service']
\ No newline at end of file
+    objects = ServicePriceAssignmentQuerySet.as_manager()
+
+    unique_together = ['time_slot', 'service']
+
+
+class PriceStat(models.Model):
+    """
+    Estadísticas de los precios reservables agrupadas por categoría, tipo de
+    horario, día de la semana y franja del día. Se mantienen al guardar y
+    borrar precios (ver price_stats) para no recorrer todo el catálogo en
+    cada recomendación.
+    """
+    BUCKETS = [
+        ('morning', 'Mañana'),
+        ('midday', 'Mediodía'),
+        ('afternoon', 'Tarde'),
+        ('night', 'Noche'),
+    ]
+
+    category = models.CharField(max_length=100)
+    schedule_type = models.CharField(max_length=10)
+    # Nulo en los horarios de grupo, que abarcan varios días de la semana
+    weekday = models.PositiveSmallIntegerField(null=True, blank=True)
+    bucket = models.CharField(max_length=10, choices=BUCKETS)
+
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_squares = models.DecimalField(max_digits=30, decimal_places=4, default=0)
+    minimum = models.DecimalField(max_digits=10, decimal_places=2)
+    maximum = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'schedule_type', 'weekday', 'bucket'], name='unique_price_stat'
+            ),
+            models.UniqueConstraint(
+                fields=['category', 'schedule_type', 'bucket'],
+                condition=models.Q(weekday__isnull=True),
+                name='unique_price_stat_any_weekday'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category} - {self.schedule_type} - {self.weekday} - {self.bucket}"
\ No newline at end of file
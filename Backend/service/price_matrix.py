@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from schedule.resolution import ScheduleIndex
+from .models import ServicePriceAssignment
+
+
+def get_price_matrix(service, start_date, end_date):
+    """
+    Precios de un servicio por fecha y tramo en formato columnar: la lista de
+    fechas, la de tramos y una matriz de precios con una fila por fecha y una
+    columna por tramo, con None donde el tramo no tiene precio ese día.
+
+    Los horarios del rango y los precios del servicio se cargan una sola vez.
+    Cada fecha parte de los precios del horario semanal, a los que se
+    superponen los de los grupos, de menor a mayor prioridad, y por último los
+    del horario específico de la fecha.
+    """
+    index = ScheduleIndex.load(start_date, end_date, service.establishment_id)
+    prices = {
+        price.time_slot_id: price
+        for price in ServicePriceAssignment.objects.filter(service=service)
+    }
+
+    dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    time_slots = {}
+    rows = []
+    for date in dates:
+        weekly_schedule, group_schedules, specific_schedule = index.schedules_for(date)
+        row = {}
+        for schedule in [weekly_schedule, *reversed(group_schedules), specific_schedule]:
+            if schedule is None:
+                continue
+            for assignment in schedule.slotassignment_set.all():
+                price = prices.get(assignment.id)
+                if price is not None:
+                    time_slots[assignment.time_slot_id] = assignment.time_slot
+                    row[assignment.time_slot_id] = price
+        rows.append(row)
+
+    columns = sorted(time_slots.values(), key=lambda time_slot: (time_slot.start_time, time_slot.end_time, time_slot.id))
+    return {
+        'service': service.id,
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'slots': [
+            {
+                'id': time_slot.id,
+                'name': time_slot.name,
+                'start_time': time_slot.start_time.strftime('%H:%M'),
+                'end_time': time_slot.end_time.strftime('%H:%M'),
+            }
+            for time_slot in columns
+        ],
+        'prices': [
+            [str(row[time_slot.id].price) if time_slot.id in row else None for time_slot in columns]
+            for row in rows
+        ],
+        'bookable': [
+            [row[time_slot.id].bookable if time_slot.id in row else None for time_slot in columns]
+            for row in rows
+        ],
+    }
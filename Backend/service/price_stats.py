@@ -0,0 +1,262 @@
+from datetime import time
+
+from django.db import transaction
+from django.db.models import F, Q, Count, Min, Max, Sum, Value
+from django.db.models.functions import Least, Greatest
+
+from .models import PriceStat, ServicePriceAssignment
+
+
+# Hora a la que empieza cada franja del día; lo anterior a la primera también es de noche
+BUCKET_STARTS = [
+    (time(6), 'morning'),
+    (time(12), 'midday'),
+    (time(16), 'afternoon'),
+    (time(21), 'night'),
+]
+
+# Columnas de las filas que se pasan al análisis de precios
+STAT_FIELDS = ['schedule_type', 'bucket', 'count', 'total', 'total_squares', 'minimum', 'maximum']
+
+
+def get_bucket(start_time):
+    """Franja del día en la que empieza un tramo"""
+    bucket = 'night'
+    for start, name in BUCKET_STARTS:
+        if start_time >= start:
+            bucket = name
+    return bucket
+
+
+def get_schedule_key(slot_assignment):
+    """
+    Tipo de horario y día de la semana de un tramo, con la misma prioridad
+    que ServicePriceAssignmentSerializer: semanal, específico y de grupo
+    """
+    if slot_assignment.weekly_schedule_id:
+        return 'weekly', slot_assignment.weekly_schedule.weekday
+    if slot_assignment.specific_schedule_id:
+        return 'specific', slot_assignment.specific_schedule.date.weekday()
+    if slot_assignment.group_schedule_id:
+        return 'group', None
+    return None
+
+
+def with_stat_details(queryset):
+    """Carga lo necesario para calcular las aportaciones de cada precio sin consultas por fila"""
+    return queryset.select_related(
+        'time_slot__time_slot',
+        'time_slot__weekly_schedule',
+        'time_slot__specific_schedule'
+    ).prefetch_related('service__categories')
+
+
+def get_contributions(price, categories=None):
+    """
+    Pares (grupo, precio) con los que un precio cuenta en las estadísticas,
+    uno por categoría del servicio. Los precios no reservables no cuentan.
+    """
+    if not price.bookable:
+        return []
+    key = get_schedule_key(price.time_slot)
+    if key is None:
+        return []
+    if categories is None:
+        categories = [category.name for category in price.service.categories.all()]
+    bucket = get_bucket(price.time_slot.time_slot.start_time)
+    return [((category, *key, bucket), price.price) for category in categories]
+
+
+def _group(contributions):
+    groups = {}
+    for key, price in contributions:
+        if key in groups:
+            count, total, total_squares, minimum, maximum = groups[key]
+            groups[key] = (
+                count + 1, total + price, total_squares + price * price, min(minimum, price), max(maximum, price)
+            )
+        else:
+            groups[key] = (1, price, price * price, price, price)
+    return groups
+
+
+def _stat_filter(key):
+    category, schedule_type, weekday, bucket = key
+    return PriceStat.objects.filter(category=category, schedule_type=schedule_type, weekday=weekday, bucket=bucket)
+
+
+def add_contributions(contributions):
+    """Suma precios a sus grupos, creando los que aún no existen"""
+    for key, (count, total, total_squares, minimum, maximum) in _group(contributions).items():
+        updated = _stat_filter(key).update(
+            count=F('count') + count,
+            total=F('total') + total,
+            total_squares=F('total_squares') + total_squares,
+            minimum=Least('minimum', Value(minimum, output_field=PriceStat._meta.get_field('minimum'))),
+            maximum=Greatest('maximum', Value(maximum, output_field=PriceStat._meta.get_field('maximum')))
+        )
+        if not updated:
+            category, schedule_type, weekday, bucket = key
+            PriceStat.objects.create(
+                category=category, schedule_type=schedule_type, weekday=weekday, bucket=bucket,
+                count=count, total=total, total_squares=total_squares, minimum=minimum, maximum=maximum
+            )
+
+
+def remove_contributions(contributions):
+    """
+    Resta precios de sus grupos y borra los que se quedarían vacíos, sin
+    dejar nunca la cuenta por debajo de cero. El mínimo y el máximo solo se
+    recalculan cuando el precio quitado era uno de ellos.
+    """
+    for key, (count, total, total_squares, minimum, maximum) in _group(contributions).items():
+        _stat_filter(key).filter(count__lte=count).delete()
+        updated = _stat_filter(key).update(
+            count=F('count') - count,
+            total=F('total') - total,
+            total_squares=F('total_squares') - total_squares
+        )
+        if not updated:
+            continue
+        stat = _stat_filter(key).first()
+        if stat is not None and (minimum <= stat.minimum or maximum >= stat.maximum):
+            bounds = ServicePriceAssignment.objects.filter(get_group_filter(key)).aggregate(
+                minimum=Min('price'), maximum=Max('price')
+            )
+            _stat_filter(key).update(**bounds)
+
+
+def move_contributions(previous, current):
+    """Pasa precios de los grupos en los que contaban a los que les tocan ahora"""
+    with transaction.atomic():
+        remove_contributions(previous)
+        add_contributions(current)
+
+
+def get_price_contributions(prices):
+    """Aportaciones de los precios reservables de un queryset"""
+    return [
+        contribution
+        for price in with_stat_details(prices.filter(bookable=True))
+        for contribution in get_contributions(price)
+    ]
+
+
+def refresh_groups(keys):
+    """Vuelve a calcular unos grupos concretos a partir de los precios que cuentan en ellos"""
+    for key in keys:
+        values = ServicePriceAssignment.objects.filter(get_group_filter(key)).aggregate(
+            count=Count('id'),
+            total=Sum('price'),
+            total_squares=Sum(F('price') * F('price')),
+            minimum=Min('price'),
+            maximum=Max('price')
+        )
+        if not values['count']:
+            _stat_filter(key).delete()
+        elif not _stat_filter(key).update(**values):
+            category, schedule_type, weekday, bucket = key
+            PriceStat.objects.create(
+                category=category, schedule_type=schedule_type, weekday=weekday, bucket=bucket, **values
+            )
+
+
+def get_group_filter(key):
+    """Filtro de los precios reservables que cuentan en un grupo de estadísticas"""
+    category, schedule_type, weekday, bucket = key
+    filters = Q(bookable=True, service__categories__name=category)
+
+    if schedule_type == 'weekly':
+        filters &= Q(time_slot__weekly_schedule__weekday=weekday)
+    elif schedule_type == 'specific':
+        filters &= Q(
+            time_slot__weekly_schedule__isnull=True,
+            time_slot__specific_schedule__date__iso_week_day=weekday + 1
+        )
+    else:
+        filters &= Q(
+            time_slot__weekly_schedule__isnull=True,
+            time_slot__specific_schedule__isnull=True,
+            time_slot__group_schedule__isnull=False
+        )
+
+    starts = [start for start, _ in BUCKET_STARTS] + [None]
+    names = [name for _, name in BUCKET_STARTS]
+    position = names.index(bucket)
+    bucket_filter = Q(time_slot__time_slot__start_time__gte=starts[position])
+    if starts[position + 1] is not None:
+        bucket_filter &= Q(time_slot__time_slot__start_time__lt=starts[position + 1])
+    if bucket == 'night':
+        bucket_filter |= Q(time_slot__time_slot__start_time__lt=starts[0])
+    return filters & bucket_filter
+
+
+def update_service_categories(service, previous, current):
+    """
+    Recalcula los grupos de las categorías que ha perdido o ganado un
+    servicio. Se recalculan en lugar de restar y sumar sus precios porque las
+    categorías enlazadas pueden no coincidir con las que contaron al guardar
+    los precios (por ejemplo tras cargar fixtures).
+    """
+    changed = sorted(set(previous) ^ set(current))
+    if not changed:
+        return
+    prices = with_stat_details(ServicePriceAssignment.objects.filter(service=service, bookable=True))
+    keys = {key for price in prices for key, _ in get_contributions(price, changed)}
+    with transaction.atomic():
+        refresh_groups(keys)
+
+
+def rebuild(batch_size=1000):
+    """Vuelve a calcular todas las estadísticas a partir de los precios reservables"""
+    prices = with_stat_details(ServicePriceAssignment.objects.filter(bookable=True).order_by('id'))
+    groups = _group(
+        contribution for price in prices.iterator(chunk_size=batch_size) for contribution in get_contributions(price)
+    )
+    with transaction.atomic():
+        PriceStat.objects.all().delete()
+        PriceStat.objects.bulk_create([
+            PriceStat(
+                category=category, schedule_type=schedule_type, weekday=weekday, bucket=bucket,
+                count=count, total=total, total_squares=total_squares, minimum=minimum, maximum=maximum
+            )
+            for (category, schedule_type, weekday, bucket), (count, total, total_squares, minimum, maximum)
+            in groups.items()
+        ], batch_size=batch_size)
+    return len(groups)
+
+
+def get_price_stats(categories):
+    """
+    Estadísticas con las que se recomienda un precio: las de las categorías
+    del servicio por tipo de horario, día y franja, y las de todo el catálogo
+    por tipo de horario y franja. Ambas tienen un tamaño acotado sea cual sea
+    el número de servicios y precios.
+    """
+    return {
+        'categories': list(
+            PriceStat.objects.filter(category__in=categories)
+            .order_by('category', 'schedule_type', 'weekday', 'bucket')
+            .values('category', 'weekday', *STAT_FIELDS)
+        ),
+        'overall': [
+            {
+                'schedule_type': stat['schedule_type'],
+                'bucket': stat['bucket'],
+                'count': stat['stat_count'],
+                'total': stat['stat_total'],
+                'total_squares': stat['stat_total_squares'],
+                'minimum': stat['stat_minimum'],
+                'maximum': stat['stat_maximum'],
+            }
+            for stat in PriceStat.objects.values('schedule_type', 'bucket')
+            .order_by('schedule_type', 'bucket')
+            .annotate(
+                stat_count=Sum('count'),
+                stat_total=Sum('total'),
+                stat_total_squares=Sum('total_squares'),
+                stat_minimum=Min('minimum'),
+                stat_maximum=Max('maximum')
+            )
+        ],
+    }
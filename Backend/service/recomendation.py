@@ -1,75 +1,219 @@
 import json
 from openai import OpenAI
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
+from .price_stats import STAT_FIELDS
 
-# Procesar y analizar los datos históricos
-def analyze_historical_data(data: pd.DataFrame) -> Dict[str, Any]:
+
+# Motores de recomendación que se pueden pedir con ?engine=; llm usa el local si falla o tarda demasiado
+RECOMMENDATION_ENGINES = ['llm', 'local']
+
+# Segundos que se espera al modelo antes de recurrir al recomendador local
+LLM_TIMEOUT = 10
+
+# Número de precios que pesa la estimación de un nivel al combinarla con la del siguiente más concreto
+PRIOR_WEIGHT = 5
+
+# Desviaciones típicas entre la media y los cuartiles de una normal, que delimitan el rango recomendado
+QUARTILE_Z = 0.6745
+
+# Claves que debe traer la respuesta del modelo para usarla
+RECOMENDATION_FIELDS = ('rango', 'optimo')
+
+
+def parse_recomendation(raw_content: Optional[str]) -> Dict[str, Any]:
     """
-    Analiza los datos históricos para extraer información relevante.
-    
+    Lee la recomendación JSON que devuelve el modelo, quitando el bloque
+    ```json ... ``` si lo trae.
+
+    Returns:
+        La recomendación, o un diccionario vacío si no es un objeto JSON con
+        "rango" y "optimo", para que se use el recomendador local
+    """
+    cleaned = (raw_content or "").strip().strip("`")  # quita los backticks
+    cleaned = cleaned.replace("json", "", 1).strip()  # quita la palabra "json" si está al inicio
+    try:
+        recomendation = json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        print("Error al parsear JSON:", e)
+        return {}
+    if not isinstance(recomendation, dict) or any(field not in recomendation for field in RECOMENDATION_FIELDS):
+        print("Respuesta del modelo sin rango y optimo:", recomendation)
+        return {}
+    return recomendation
+
+
+def summarize_stats(stats: pd.DataFrame, columns: List[str]) -> List[Dict[str, Any]]:
+    """
+    Combina filas de estadísticas agrupándolas por las columnas dadas.
+
     Args:
-        data: DataFrame con datos históricos
-        
+        stats: DataFrame con count, total, total_squares, minimum y maximum por fila
+        columns: Columnas por las que agrupar
+
+    Returns:
+        Lista con el número de precios, la media, la desviación típica, el mínimo y el máximo de cada grupo
+    """
+    grouped = stats.groupby(columns, dropna=False).agg({
+        'count': 'sum',
+        'total': 'sum',
+        'total_squares': 'sum',
+        'minimum': 'min',
+        'maximum': 'max',
+    }).reset_index()
+    grouped['mean'] = grouped['total'] / grouped['count']
+    grouped['std'] = (grouped['total_squares'] / grouped['count'] - grouped['mean'] ** 2).clip(lower=0) ** 0.5
+    grouped = grouped.astype(object).where(grouped.notna(), None)
+    return [
+        {
+            **{column: row[column] for column in columns},
+            'count': int(row['count']),
+            'mean': round(float(row['mean']), 2),
+            'std': round(float(row['std']), 2),
+            'min': float(row['minimum']),
+            'max': float(row['maximum']),
+        }
+        for _, row in grouped.iterrows()
+    ]
+
+
+# Procesar y analizar las estadísticas de precios
+def analyze_price_stats(price_stats: Dict[str, List[Dict]]) -> Dict[str, Any]:
+    """
+    Analiza las estadísticas agregadas de precios para extraer información relevante.
+
+    Args:
+        price_stats: Estadísticas de las categorías del servicio y de todo el catálogo (ver price_stats.get_price_stats)
+
     Returns:
         Diccionario con análisis y estadísticas
     """
-    print(data)
-    # Calcular métricas relevantes
+    overall = pd.DataFrame(price_stats['overall'], columns=STAT_FIELDS)
+    if overall.empty:
+        return {"has_data": False, "sample_size": 0}
+    overall[STAT_FIELDS[2:]] = overall[STAT_FIELDS[2:]].astype(float)
+
+    total = summarize_stats(overall.assign(all=True), ['all'])[0]
     analysis = {
         "has_data": True,
-        "avg_price": data['price'].mean(),
-        "median_price": data['price'].median(),
-        "min_price": data['price'].min(),
-        "max_price": data['price'].max(),
-        "price_to_max_ratio": data['max_reservation'].mean() / data['price'].mean() if data['price'].mean() > 0 else 0,
-        "sample_size": len(data)
+        "avg_price": total['mean'],
+        "std_price": total['std'],
+        "min_price": total['min'],
+        "max_price": total['max'],
+        "sample_size": total['count'],
+        "type_analysis": summarize_stats(overall, ['schedule_type']),
+        "bucket_analysis": summarize_stats(overall, ['schedule_type', 'bucket']),
+        "category_segments": [],
     }
-    
-    # Segmentación por condición del ítem
-    category_analysis = data.groupby('category').agg({
-        'price': ['mean', 'median']
-    }).reset_index()
 
-    type_analysis = data.groupby('type').agg({
-        'price': ['mean', 'median']
-    }).reset_index()
+    categories = pd.DataFrame(price_stats['categories'], columns=['category', 'weekday', *STAT_FIELDS])
+    if not categories.empty:
+        categories[STAT_FIELDS[2:]] = categories[STAT_FIELDS[2:]].astype(float)
+        analysis["category_segments"] = summarize_stats(categories, ['category', 'schedule_type'])
+        analysis["category_slots"] = summarize_stats(categories, ['category', 'schedule_type', 'weekday', 'bucket'])
 
-    analysis["type_analysis"] = type_analysis.to_dict()
-    
-    analysis["category_segments"] = category_analysis.to_dict()
-    
     return analysis
 
+def combine_stats(stats: pd.DataFrame) -> Optional[tuple]:
+    """Número de precios, media y varianza de un conjunto de filas de estadísticas, o None si está vacío"""
+    count = stats['count'].to_numpy(dtype=float).sum()
+    if count == 0:
+        return None
+    mean = stats['total'].to_numpy(dtype=float).sum() / count
+    variance = max(stats['total_squares'].to_numpy(dtype=float).sum() / count - mean ** 2, 0.0)
+    return count, mean, variance
+
+
+def local_service_price_recomendation(
+    price_stats: Dict[str, List[Dict]],
+    schedule_type: Optional[str],
+    weekday: Optional[int],
+    bucket: str,
+) -> Dict[str, Any]:
+    """
+    Recomienda un precio de reserva sin llamar al modelo, a partir de las
+    mismas estadísticas agregadas que el prompt.
+
+    La media y la varianza se estiman de lo general a lo concreto: todo el
+    catálogo, su tipo de horario, su franja, y las categorías del servicio con
+    ese tipo, franja y día. Cada nivel con datos corrige la estimación anterior
+    en proporción a su número de precios, así que los grupos con pocos precios
+    apenas la mueven. El rango son los cuartiles de una normal con esa media y
+    varianza.
+
+    Args:
+        price_stats: Estadísticas agregadas de precios (ver price_stats.get_price_stats)
+        schedule_type: Tipo de horario del tramo
+        weekday: Día de la semana del tramo, None en los horarios de grupo
+        bucket: Franja del día en la que empieza el tramo
+
+    Returns:
+        Diccionario con "rango" y "optimo", vacío si no hay precios
+    """
+    overall = pd.DataFrame(price_stats['overall'], columns=STAT_FIELDS)
+    categories = pd.DataFrame(price_stats['categories'], columns=['category', 'weekday', *STAT_FIELDS])
+    same_type = categories['schedule_type'] == schedule_type
+    same_bucket = same_type & (categories['bucket'] == bucket)
+    levels = [
+        overall,
+        overall[overall['schedule_type'] == schedule_type],
+        overall[(overall['schedule_type'] == schedule_type) & (overall['bucket'] == bucket)],
+        categories[same_type],
+        categories[same_bucket],
+        categories[same_bucket & (categories['weekday'] == weekday)] if weekday is not None else categories[:0],
+    ]
+
+    estimate = None
+    for level in levels:
+        stats = combine_stats(level)
+        if stats is None:
+            continue
+        count, mean, variance = stats
+        if estimate is None:
+            estimate = (mean, variance)
+            continue
+        weight = count / (count + PRIOR_WEIGHT)
+        estimate = (
+            weight * mean + (1 - weight) * estimate[0],
+            weight * variance + (1 - weight) * estimate[1],
+        )
+
+    if estimate is None:
+        return {}
+    mean, variance = estimate
+    spread = QUARTILE_Z * np.sqrt(variance)
+    return {
+        "rango": f"{max(mean - spread, 0):.0f}-{mean + spread:.0f}",
+        "optimo": int(round(mean)),
+    }
+
+
 # Función principal para generar recomendaciones
 def generate_service_price_recomendation(
     api_key: str,
-    historical_data_list: List[Dict],
+    price_stats: Dict[str, List[Dict]],
     service: dict,
     slot: dict,
+    timeout: float = LLM_TIMEOUT,
 ) -> Dict[str, Any]:
     """
-    Genera una recomendación de starting_bid para una nueva subasta.
+    Genera una recomendación de precio de reserva para un tramo de un servicio.
     
     Args:
-        connection_string: String de conexión a la BD
         api_key: API key para el modelo LLM
-        item_category: Categoría del ítem
-        item_condition: Condición del ítem
-        estimated_value: Valor estimado por el vendedor
-        urgency: Urgencia de venta (1-10)
-        seller_rating: Calificación del vendedor
+        price_stats: Estadísticas agregadas de precios (ver price_stats.get_price_stats)
+        service: Datos del servicio a reservar
+        slot: Datos del tramo horario a reservar
+        timeout: Segundos que se espera la respuesta del modelo
         
     Returns:
         Diccionario con la recomendación y justificación
     """
-    historical_data = pd.DataFrame(historical_data_list)
-
-    # Analizar datos históricos
-    analysis = analyze_historical_data(historical_data)
-    
-    print(analysis)
+    # El análisis es el único contexto de precios del prompt, con un tamaño
+    # acotado sea cual sea el tamaño del catálogo
+    analysis = analyze_price_stats(price_stats)
 
     template = f"""
     Como experto en servicios de bares como futbolines, mesas de billar, dianas de dardos.., tu tarea es recomendar un precio de reserva por hora óptimo 
@@ -80,12 +224,15 @@ def generate_service_price_recomendation(
     - Tramo horario: {slot}
     - Urgencia de venta (1-10): 8
     
-    DATOS HISTORICOS:
-    {historical_data}
-
     ANÁLISIS DE DATOS HISTÓRICOS:
     {analysis}
 
+    En el análisis, count es el número de precios de cada grupo, mean su media, std su desviación típica y min y max
+    sus extremos. type_analysis y bucket_analysis resumen todo el catálogo por tipo de horario y franja del día
+    (morning: 6-12h, midday: 12-16h, afternoon: 16-21h, night: 21-6h); category_segments y category_slots resumen
+    únicamente las categorías del servicio a reservar, estas últimas por día de la semana (0 es lunes, vacío en los
+    horarios de grupo) y franja.
+
     Tu objetivo es obtener el precio de reserva más óptimo. Para ello debes conocer que los tramos horarios pueden ser de dos tipos, weekly o 
     specific (días especiales en los que los precios de reserva suelen ser más caros), analiza que tramo horario tiene el servicio a reservar, ya sea
     de un día festivo o laboral, entre semana o fin de semana, mañana medio día o tarde, y comparalo con el precio que suelen tener los servicios durante tramos 
@@ -109,14 +256,12 @@ def generate_service_price_recomendation(
     - Tramo horario: {{'id': 2, 'time_slot': 1, 'time_slot_details': {{'id': 1, 'name': 'Mañana', 'start_time': '09:00:00', 'end_time': '15:00:00', 'color': '#3498db'}}, 'weekly_schedule': 1, 'group_schedule': None, 'specific_schedule': None, 'order': 1, 'notes': None}}
     - Urgencia de venta (1-10): 8
     
-    DATOS HISTORICOS:
-    [{{'id': 2, 'price': 2.0, 'category': 'televisión', 'max_reservation': 20, 'start_time': datetime.time(9, 0), 'end_time': datetime.time(15, 0), 'type': 'weekly', 'weekday': 0}},
-    {{'id': 3, 'price': 2.0, 'category': 'televisión', 'max_reservation': 20, 'start_time': datetime.time(9, 0), 'end_time': datetime.time(15, 0), 'type': 'weekly', 'weekday': 1}}, 
-    {{'id': 4, 'price': 10.0, 'category': 'televisión', 'max_reservation': 20, 'start_time': datetime.time(19, 0), 'end_time': datetime.time(21, 0), 'type': 'specific', 'date': datetime.date(2025, 4, 7)}},
-    {{'id': 5, 'price': 100.0, 'category': 'billar, profesional', 'max_reservation': 60, 'start_time': datetime.time(9, 0), 'end_time': datetime.time(15, 0), 'type': 'weekly', 'weekday': 0}}]
-
     ANÁLISIS DE DATOS HISTÓRICOS:
-    {{'has_data': True, 'avg_price': np.float64(28.5), 'median_price': np.float64(6.0), 'min_price': np.float64(2.0), 'max_price': np.float64(100.0), 'price_to_max_ratio': np.float64(1.0526315789473684), 'sample_size': 4, 'type_analysis': {{('type', ''): {{0: 'specific', 1: 'weekly'}}, ('price', 'mean'): {{0: 10.0, 1: 34.666666666666664}}, ('price', 'median'): {{0: 10.0, 1: 2.0}}}}, 'category_segments': {{('category', ''): {{0: 'billar, profesional', 1: 'televisión'}}, ('price', 'mean'): {{0: 100.0, 1: 4.666666666666667}}, ('price', 'median'): {{0: 100.0, 1: 2.0}}}}}}
+    {{'has_data': True, 'avg_price': 28.5, 'std_price': 41.15, 'min_price': 2.0, 'max_price': 100.0, 'sample_size': 4,
+    'type_analysis': [{{'schedule_type': 'specific', 'count': 1, 'mean': 10.0, 'std': 0.0, 'min': 10.0, 'max': 10.0}}, {{'schedule_type': 'weekly', 'count': 3, 'mean': 34.67, 'std': 46.2, 'min': 2.0, 'max': 100.0}}],
+    'bucket_analysis': [{{'schedule_type': 'specific', 'bucket': 'afternoon', 'count': 1, 'mean': 10.0, 'std': 0.0, 'min': 10.0, 'max': 10.0}}, {{'schedule_type': 'weekly', 'bucket': 'morning', 'count': 3, 'mean': 34.67, 'std': 46.2, 'min': 2.0, 'max': 100.0}}],
+    'category_segments': [{{'category': 'billar', 'schedule_type': 'weekly', 'count': 1, 'mean': 100.0, 'std': 0.0, 'min': 100.0, 'max': 100.0}}],
+    'category_slots': [{{'category': 'billar', 'schedule_type': 'weekly', 'weekday': 0, 'bucket': 'morning', 'count': 1, 'mean': 100.0, 'std': 0.0, 'min': 100.0, 'max': 100.0}}]}}
     
 
     SALIDA:
@@ -126,14 +271,14 @@ def generate_service_price_recomendation(
     
     RAZONAMIENTO:
 
-    El servicio tiene como categoria "billar", por lo que se toma en consideracion los datos historicos cuyas categorias contengan la palabra billar, en este caso la media de precio
-    para esa categoria es 100 por lo que daremos como salida un rango alrededor de 100 (90-110) y un precio competitivo de 99
+    El servicio tiene como categoria "billar", por lo que se toma en consideracion los datos historicos de la categoria billar, en este caso la media de precio
+    para esa categoria en tramos weekly de mañana es 100 por lo que daremos como salida un rango alrededor de 100 (90-110) y un precio competitivo de 99
     
     Tu recomendación debe balancear el beneficio economico para el dueño con la reserva y la atracción de clientes dando un precio competitivo..
     """
 
    
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=api_key, timeout=timeout, max_retries=0)
     response = client.chat.completions.create(
         model="gpt-4o-mini",  # o "gpt-4o-mini"
         messages=[
@@ -143,19 +288,6 @@ def generate_service_price_recomendation(
         temperature=0.7,
     )
     
-    raw_content = response.choices[0].message.content
-
-    # 2. Limpiar el bloque ```json ... ```
-    cleaned = raw_content.strip("`")  # quita los backticks
-    cleaned = cleaned.replace("json", "", 1).strip()  # quita la palabra "json" si está al inicio
-
-    recomendation = {}
-    # 3. Parsear el contenido JSON
-    try:
-        recomendation = json.loads(cleaned)
-    except json.JSONDecodeError as e:
-        print("Error al parsear JSON:", e)
-    
-    return recomendation
+    return parse_recomendation(response.choices[0].message.content)
 
 
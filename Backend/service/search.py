@@ -0,0 +1,142 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Service
+
+
+# Tabla virtual FTS5 con el nombre, la descripción y las categorías de cada servicio (SQLite)
+SQLITE_TABLE = 'service_search'
+
+# Configuración de texto y expresión del índice GIN de la migración 0007 (PostgreSQL)
+POSTGRES_CONFIG = 'spanish'
+POSTGRES_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(category, '')"
+
+# Resultados devueltos por defecto y como máximo en una búsqueda
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+WORD = re.compile(r'\w+')
+
+
+def is_indexed():
+    """Si la base de datos mantiene una tabla de búsqueda propia que hay que sincronizar"""
+    return connection.vendor == 'sqlite'
+
+
+def get_words(text):
+    """Palabras de un texto de búsqueda, sin la sintaxis de consulta del motor"""
+    return WORD.findall(text or '')
+
+
+def index_services(services):
+    """Añade o actualiza los servicios en el índice de búsqueda"""
+    if not is_indexed():
+        return
+    rows = [(service.id, service.name, service.description, service.category) for service in services]
+    if not rows:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def remove_service(service_id):
+    """Quita un servicio del índice de búsqueda"""
+    if is_indexed():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [service_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Vuelve a generar el índice de búsqueda a partir de todos los servicios"""
+    if not is_indexed():
+        return 0
+    count = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+        services = Service.objects.only('id', 'name', 'description', 'category').order_by('id')
+        batch = []
+        for service in services.iterator(chunk_size=batch_size):
+            batch.append(service)
+            if len(batch) == batch_size:
+                index_services(batch)
+                count += len(batch)
+                batch = []
+        index_services(batch)
+        count += len(batch)
+    return count
+
+
+def get_match(text):
+    """
+    Consulta SQL de los ids de los servicios cuyo nombre, descripción o
+    categorías contienen todas las palabras buscadas, con sus parámetros, la
+    expresión de orden por relevancia y la columna del id. None cuando la
+    base de datos no tiene índice de búsqueda. La última palabra se busca
+    también como prefijo para poder buscar mientras se escribe.
+    """
+    words = get_words(text)
+    if connection.vendor == 'postgresql':
+        query = ' & '.join(f"{word}:*" if index == len(words) - 1 else word for index, word in enumerate(words))
+        document = f"to_tsvector('{POSTGRES_CONFIG}', {POSTGRES_DOCUMENT})"
+        condition = f"to_tsquery('{POSTGRES_CONFIG}', %s)"
+        return (
+            f"SELECT id FROM service_service WHERE {document} @@ {condition}", [query],
+            f"ts_rank({document}, {condition}) DESC", [query], 'id'
+        )
+    if is_indexed():
+        # Cada palabra entre comillas para que no se interprete como operador de FTS5
+        query = ' '.join(f'"{word}"' for word in words) + '*'
+        return f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [query], 'rank', [], 'rowid'
+    return None
+
+
+def match_services(text):
+    """
+    Subconsulta de los ids de los servicios que coinciden con el texto, para
+    filtrar con service_id__in sin limitar antes el número de resultados
+    """
+    if not get_words(text):
+        return Service.objects.none().values('id')
+    match = get_match(text)
+    if match is None:
+        return Service.objects.filter(name__icontains=' '.join(get_words(text))).values('id')
+    sql, params, _, _, _ = match
+    return RawSQL(sql, params)
+
+
+def search_service_ids(text, limit=DEFAULT_LIMIT):
+    """Ids de los servicios que coinciden con el texto, de más a menos relevante"""
+    if not get_words(text):
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    match = get_match(text)
+    if match is None:
+        return list(match_services(text).values_list('id', flat=True)[:limit])
+    sql, params, order, order_params, _ = match
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} ORDER BY {order} LIMIT %s", [*params, *order_params, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_service_ids(text, service_ids):
+    """Los servicios dados que coinciden con el texto, de más a menos relevante"""
+    service_ids = list(service_ids)
+    if not service_ids or not get_words(text):
+        return []
+    match = get_match(text)
+    if match is None:
+        matching = set(match_services(text).filter(id__in=service_ids).values_list('id', flat=True))
+        return [id for id in service_ids if id in matching]
+    sql, params, order, order_params, column = match
+    placeholders = ', '.join(['%s'] * len(service_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{sql} AND {column} IN ({placeholders}) ORDER BY {order}", [*params, *service_ids, *order_params]
+        )
+        return [row[0] for row in cursor.fetchall()]
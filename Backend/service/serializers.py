@@ -1,15 +1,23 @@
 from rest_framework import serializers
 from .models import Service, ServicePriceAssignment
 from establishment.serializers import EstablishmentSerializer
+from uchoose.serializers import DynamicFieldsMixin
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     establishment_details = EstablishmentSerializer(source='establishment', read_only=True)
     class Meta:
         model = Service
         fields = ['id', 'name', 'description', 'category', 'max_reservation', 'max_people', 'deposit', 
                   'establishment', 'establishment_details']
 
-class ServicePriceAssignmentSerializer(serializers.ModelSerializer):
+class ServiceCreateSerializer(ServiceSerializer):
+    """
+    Serializer para crear servicios, cuya categoría la asigna el sistema
+    """
+    class Meta(ServiceSerializer.Meta):
+        read_only_fields = ['category']
+
+class ServicePriceAssignmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     service_details = ServiceSerializer(source='service', read_only=True)
     time_slot_details = serializers.SerializerMethodField()
     
@@ -63,7 +71,8 @@ class ServicePriceAssignmentSerializer(serializers.ModelSerializer):
             return {
                 'type': 'group',
                 'id': slot_assignment.group_schedule.id,
-                'name': slot_assignment.group_schedule.name
+                'name': slot_assignment.group_schedule.name,
+                'priority': slot_assignment.group_schedule.priority
             }
         return None
     
@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from reservation.models import Reservation
+from schedule.models import TimeSlot, WeeklySchedule, SpecificSchedule, SlotAssignment
+from schedule.signals import assignments_cloned
+from .categorization import add_to_index, remove_from_index
+from .client_profile import invalidate_client_profile, invalidate_service_clients
+from .models import Service, ServicePriceAssignment, split_categories
+from .price_stats import (
+    with_stat_details, get_contributions, get_price_contributions, add_contributions, remove_contributions,
+    move_contributions, update_service_categories
+)
+from .search import index_services, remove_service
+
+
+@receiver(post_save, sender=Service)
+def sync_service_categories(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # También en las cargas de fixtures, que solo traen el texto de category
+    if update_fields is None or 'category' in update_fields:
+        previous = [] if created else list(instance.categories.values_list('name', flat=True))
+        instance.sync_categories()
+        if not created and not raw:
+            update_service_categories(instance, previous, split_categories(instance.category))
+
+
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'description', 'category'} & set(update_fields):
+        index_services([instance])
+
+
+@receiver(post_delete, sender=Service)
+def remove_service_from_index(sender, instance, **kwargs):
+    remove_service(instance.id)
+
+
+@receiver(post_save, sender=Service)
+def add_service_to_neighbours(sender, instance, created=False, update_fields=None, **kwargs):
+    # Las ediciones del usuario las añade ServiceUpdateView; las demás se recogen al reconstruir el índice cuando caduca
+    if created or (update_fields is not None and 'category' in update_fields):
+        add_to_index(instance)
+
+
+@receiver(post_delete, sender=Service)
+def remove_service_from_neighbours(sender, instance, **kwargs):
+    remove_from_index(instance.pk)
+
+
+# Las cargas de fixtures, bulk_create y update no actualizan las estadísticas de precios; se recalculan con rebuild_price_stats
+
+@receiver(pre_save, sender=ServicePriceAssignment)
+def store_previous_price(sender, instance, raw=False, **kwargs):
+    instance._previous_contributions = []
+    if not raw and instance.pk is not None:
+        previous = with_stat_details(ServicePriceAssignment.objects.filter(pk=instance.pk)).first()
+        if previous is not None:
+            instance._previous_contributions = get_contributions(previous)
+
+
+@receiver(post_save, sender=ServicePriceAssignment)
+def update_price_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    move_contributions(getattr(instance, '_previous_contributions', []), get_contributions(instance))
+
+
+@receiver(pre_delete, sender=ServicePriceAssignment)
+def store_deleted_price(sender, instance, **kwargs):
+    # Antes del borrado, cuando aún existen el tramo y las categorías del servicio
+    instance._previous_contributions = get_contributions(instance)
+
+
+@receiver(post_delete, sender=ServicePriceAssignment)
+def remove_price_stats(sender, instance, **kwargs):
+    remove_contributions(getattr(instance, '_previous_contributions', []))
+
+
+@receiver(assignments_cloned)
+def clone_prices(sender, pairs, **kwargs):
+    # Copia los precios de los tramos de la plantilla a sus copias
+    prices_by_assignment = defaultdict(list)
+    prices = ServicePriceAssignment.objects.filter(time_slot__in={source.id for source, _ in pairs})
+    for price in prices.select_related('service').prefetch_related('service__categories'):
+        prices_by_assignment[price.time_slot_id].append(price)
+    prices = ServicePriceAssignment.objects.bulk_create([
+        ServicePriceAssignment(service=price.service, time_slot=copy, price=price.price, bookable=price.bookable)
+        for source, copy in pairs
+        for price in prices_by_assignment[source.id]
+    ])
+    # bulk_create no envía las señales que actualizan las estadísticas de precios
+    add_contributions(contribution for price in prices for contribution in get_contributions(price))
+
+
+# Campos de los tramos y horarios que deciden el grupo de estadísticas de sus
+# precios (franja, día de la semana y tipo de horario) y relación desde los precios
+STAT_SOURCES = {
+    TimeSlot: (['start_time'], 'time_slot__time_slot'),
+    WeeklySchedule: (['weekday'], 'time_slot__weekly_schedule'),
+    SpecificSchedule: (['date'], 'time_slot__specific_schedule'),
+    SlotAssignment: (['time_slot_id', 'weekly_schedule_id', 'specific_schedule_id', 'group_schedule_id'], 'time_slot'),
+}
+
+
+@receiver(pre_save, sender=TimeSlot)
+@receiver(pre_save, sender=WeeklySchedule)
+@receiver(pre_save, sender=SpecificSchedule)
+@receiver(pre_save, sender=SlotAssignment)
+def store_previous_schedule_prices(sender, instance, raw=False, **kwargs):
+    # Solo cuando cambia algún campo que mueve los precios de grupo
+    instance._previous_price_contributions = None
+    if raw or instance.pk is None:
+        return
+    fields, relation = STAT_SOURCES[sender]
+    previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    if previous is not None and any(previous[field] != getattr(instance, field) for field in fields):
+        instance._previous_price_contributions = get_price_contributions(
+            ServicePriceAssignment.objects.filter(**{relation: instance.pk})
+        )
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_save, sender=WeeklySchedule)
+@receiver(post_save, sender=SpecificSchedule)
+@receiver(post_save, sender=SlotAssignment)
+def move_schedule_price_stats(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_price_contributions', None)
+    if raw or previous is None:
+        return
+    _, relation = STAT_SOURCES[sender]
+    move_contributions(previous, get_price_contributions(ServicePriceAssignment.objects.filter(**{relation: instance.pk})))
+
+
+# Campos de un servicio que forman parte del perfil de los clientes que lo reservan
+PROFILE_FIELDS = ['category', 'max_people']
+
+
+@receiver(pre_save, sender=Service)
+def store_previous_profile_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_profile_fields = None
+    if raw or instance._state.adding or (update_fields is not None and not set(PROFILE_FIELDS) & set(update_fields)):
+        return
+    instance._previous_profile_fields = Service.objects.filter(pk=instance.pk).values(*PROFILE_FIELDS).first()
+
+
+@receiver(post_save, sender=Service)
+def invalidate_service_client_profiles(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_profile_fields', None)
+    if previous is not None and any(previous[field] != getattr(instance, field) for field in PROFILE_FIELDS):
+        invalidate_service_clients(instance.pk)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_reservation_client_profile(sender, instance, **kwargs):
+    invalidate_client_profile(instance.client_id)
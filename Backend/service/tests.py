@@ -1,3 +1,1052 @@
-from django.test import TestCase
+from datetime import date, datetime, time
+from decimal import Decimal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core import serializers
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from client.models import Client
+from establishment.models import Establishment
+from reservation.models import Reservation
+from reservation.tests import ReservationTestCase
+from schedule.models import TimeSlot, WeeklySchedule, GroupSchedule, SpecificSchedule, SlotAssignment
+from schedule.resolution import LEVEL_RANK, ScheduleIndex
+from user.models import CustomUser
+from worker.models import Worker
+from .availability import get_availability
+from .benchmarks import generate_slots, legacy_merge_slots
+from .categorization import (
+    INDEX_MAX_AGE, NeighbourIndex, EmptyCategoryError, PENDING_CATEGORY, _categorize_in_background, categorize_service,
+    get_index, reset_index
+)
+from .client_profile import get_client_profile, weighted_median
+from .vectors import (
+    DIMENSIONS, KEEP_VERSIONS, VectorIndex, build_vectors, get_current_version, get_index as get_vector_index,
+    hash_token, recommend_services
+)
+from .models import Service, ServicePriceAssignment, PriceStat, Category, CategoryCache, split_categories
+from .price_stats import get_contributions, get_price_stats, rebuild, remove_contributions
+from .search import MAX_LIMIT, rebuild_index, search_service_ids
+from .recomendation import analyze_price_stats, local_service_price_recomendation
+from .views import get_prices_for_date, merge_slots
+
+
+def make_slot(id, start, end, schedule_type):
+    return {"id": id, "start_time": time(start), "end_time": time(end), "schedule_type": schedule_type}
+
+
+class MergeSlotsTests(SimpleTestCase):
+    """Fusión de tramos de ServiceListRecomendations"""
+
+    WEEKLY = {"type": "weekly"}
+    SPECIFIC = {"type": "specific"}
+
+    def intervals(self, slots):
+        return [(slot["id"], slot["start_time"].hour, slot["end_time"].hour) for slot in slots]
+
+    def test_higher_priority_splits_lower(self):
+        slots = [make_slot(1, 13, 16, self.SPECIFIC), make_slot(2, 9, 20, self.WEEKLY)]
+        self.assertEqual(self.intervals(merge_slots(slots)), [(2, 9, 13), (1, 13, 16), (2, 16, 20)])
+
+    def test_higher_group_priority_wins(self):
+        slots = [
+            make_slot(1, 9, 14, {"type": "group", "priority": 5}),
+            make_slot(2, 12, 18, {"type": "group", "priority": 1}),
+        ]
+        self.assertEqual(self.intervals(merge_slots(slots)), [(1, 9, 14), (2, 14, 18)])
+
+    def test_matches_legacy_merge_on_equal_priority(self):
+        slots = generate_slots(300)
+        key = lambda slot: (slot["start_time"], slot["end_time"], slot["id"])
+        self.assertEqual(
+            [key(slot) for slot in merge_slots(slots)],
+            sorted(key(slot) for slot in legacy_merge_slots(slots))
+        )
+
+
+class ServicePriceQueryCountTests(TestCase):
+    """Las vistas de precios no deben lanzar consultas por cada precio"""
+
+    # Una consulta para los precios con su servicio, establecimiento, tramo y
+    # horario, y otra para los trabajadores de los establecimientos
+    EXPECTED_QUERIES = 2
+
+    DATE = date(2025, 6, 2)
+
+    def setUp(self):
+        self.client = APIClient()
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com')
+        self.client.force_authenticate(user)
+        owner = Worker.objects.create(rol='owner', user=user)
+        self.establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web', owner=owner
+        )
+        self.establishment.workers.add(owner)
+        self.schedules = [
+            {'weekly_schedule': WeeklySchedule.objects.create(name='Lunes', weekday=self.DATE.weekday())},
+            {'group_schedule': GroupSchedule.objects.create(
+                name='Verano', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31), weekdays='0,1,2,3,4'
+            )},
+            {'specific_schedule': SpecificSchedule.objects.create(name='Torneo', date=self.DATE)},
+        ]
+
+    def create_prices(self, count):
+        for index in range(count):
+            service = Service.objects.create(
+                name=f"Pista {index}", description='Pista', category='padel',
+                max_people=4, max_reservation=1, deposit=0, establishment=self.establishment
+            )
+            for hour, schedule in enumerate(self.schedules, start=9):
+                assignment = SlotAssignment.objects.create(
+                    time_slot=TimeSlot.objects.create(name=f"{hour}h", start_time=time(hour), end_time=time(hour + 1)),
+                    **schedule
+                )
+                ServicePriceAssignment.objects.create(service=service, time_slot=assignment, price=10, bookable=True)
+
+    def assert_constant_queries(self, url):
+        self.create_prices(1)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 3)
+
+        self.create_prices(5)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 18)
+        self.assertEqual(
+            {item['time_slot_details']['schedule_type']['type'] for item in response.data},
+            {'weekly', 'group', 'specific'}
+        )
+        self.assertEqual(response.data[0]['service_details']['establishment_details']['workers'], [self.establishment.owner_id])
+
+    def test_service_price_for_date(self):
+        self.assert_constant_queries(f"/services/service-date-prices/{self.DATE.isoformat()}/0/")
+
+    def test_service_price_list(self):
+        self.assert_constant_queries('/services/service-prices/')
+
+
+class PriceTestCase(TestCase):
+    """Servicios con precios en horarios semanales, específicos y de grupo"""
+
+    MONDAY = date(2025, 6, 2)
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com')
+        owner = Worker.objects.create(rol='owner', user=user)
+        self.establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web', owner=owner
+        )
+        self.weekly = WeeklySchedule.objects.create(name='Lunes', weekday=0)
+        self.specific = SpecificSchedule.objects.create(name='Torneo', date=self.MONDAY)
+        self.group = GroupSchedule.objects.create(
+            name='Verano', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31), weekdays='0,1,2,3,4'
+        )
+
+    def create_service(self, category):
+        return Service.objects.create(
+            name='Pista', description='Pista', category=category,
+            max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+        )
+
+    def create_price(self, service, price, hour, bookable=True, **schedule):
+        assignment = SlotAssignment.objects.create(
+            time_slot=TimeSlot.objects.create(name=f"{hour}h", start_time=time(hour), end_time=time(hour + 1)),
+            **(schedule or {'weekly_schedule': self.weekly})
+        )
+        return ServicePriceAssignment.objects.create(service=service, time_slot=assignment, price=price, bookable=bookable)
+
+
+
+class DatePricingTests(PriceTestCase):
+    """Los precios de una fecha incluyen los de los grupos que aplican, con su prioridad"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.get(username='owner'))
+        self.service = self.create_service('padel')
+        self.create_price(self.service, 10, 9)
+        self.create_price(self.service, 20, 10, group_schedule=self.group)
+        self.create_price(self.service, 30, 11, specific_schedule=self.specific)
+
+    def get_prices(self, day):
+        response = self.client.get(f"/services/service-date-prices/{day.isoformat()}/{self.service.id}/")
+        return {
+            item['time_slot_details']['schedule_type']['type']: item['time_slot_details']['schedule_type']
+            for item in response.data
+        }
+
+    def test_group_applies(self):
+        prices = self.get_prices(self.MONDAY)
+        self.assertEqual(set(prices), {'weekly', 'group', 'specific'})
+        self.assertEqual(prices['group']['priority'], self.group.priority)
+
+    def test_group_outside_its_dates_or_weekdays(self):
+        # Lunes fuera del verano y sábado dentro de él
+        self.assertEqual(set(self.get_prices(date(2025, 9, 1))), {'weekly'})
+        self.assertEqual(set(self.get_prices(date(2025, 6, 7))), set())
+
+    def test_priority_of_the_layers(self):
+        # En la fecha, el horario específico está por encima del grupo y este por encima del semanal
+        group_rank, specific_rank = LEVEL_RANK['group'], LEVEL_RANK['specific']
+        self.assertLess(LEVEL_RANK['weekly'], group_rank)
+        self.assertLess(group_rank, specific_rank)
+        blocks, _ = ScheduleIndex.load(self.MONDAY, self.MONDAY).resolve(self.MONDAY)
+        self.assertEqual([block['schedule_type'] for block in blocks], ['weekly', 'group', 'specific'])
+
+
+class DatePricingScopeTests(PriceTestCase):
+    """Los precios de una fecha solo usan horarios compartidos o del establecimiento del servicio"""
+
+    def setUp(self):
+        super().setUp()
+        self.service = self.create_service('padel')
+        self.create_price(self.service, 10, 9)
+        self.create_price(self.service, 30, 11, specific_schedule=self.specific)
+        self.other = Establishment.objects.create(
+            name='Otro', description='Otro', location='Cádiz', platforms='web', owner=self.establishment.owner
+        )
+
+    def get_prices(self, day=None):
+        return sorted(int(price) for price in get_prices_for_date(day or self.MONDAY, self.service.id).values_list('price', flat=True))
+
+    def test_ignores_schedules_of_other_establishments(self):
+        weekly = WeeklySchedule.objects.create(name='Lunes ajeno', weekday=0, establishment=self.other)
+        specific = SpecificSchedule.objects.create(name='Torneo ajeno', date=self.MONDAY, establishment=self.other)
+        group = GroupSchedule.objects.create(
+            name='Verano ajeno', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31),
+            weekdays='0', establishment=self.other
+        )
+        self.create_price(self.service, 40, 12, weekly_schedule=weekly)
+        self.create_price(self.service, 50, 13, specific_schedule=specific)
+        self.create_price(self.service, 60, 14, group_schedule=group)
+        # Los horarios ajenos tampoco sustituyen a los compartidos
+        self.assertEqual(self.get_prices(), [10, 30])
+
+    def test_own_schedules_replace_shared_ones(self):
+        weekly = WeeklySchedule.objects.create(name='Lunes propio', weekday=0, establishment=self.establishment)
+        self.create_price(self.service, 40, 12, weekly_schedule=weekly)
+        self.assertEqual(self.get_prices(), [30, 40])
+
+        specific = SpecificSchedule.objects.create(name='Torneo propio', date=self.MONDAY, establishment=self.establishment)
+        self.create_price(self.service, 50, 13, specific_schedule=specific)
+        self.assertEqual(self.get_prices(), [40, 50])
+
+        # El horario específico propio solo sustituye al de su fecha
+        self.assertEqual(self.get_prices(date(2025, 6, 9)), [40])
+
+    def test_own_groups_add_to_shared_ones(self):
+        group = GroupSchedule.objects.create(
+            name='Verano propio', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31),
+            weekdays='0', establishment=self.establishment
+        )
+        self.create_price(self.service, 20, 10, group_schedule=self.group)
+        self.create_price(self.service, 60, 14, group_schedule=group)
+        self.assertEqual(self.get_prices(), [10, 20, 30, 60])
+
+    def test_inactive_own_schedule_does_not_replace(self):
+        WeeklySchedule.objects.create(name='Lunes propio', weekday=0, establishment=self.establishment, active=False)
+        self.assertEqual(self.get_prices(), [10, 30])
+
+    def test_scope_of_each_service_without_service_id(self):
+        weekly = WeeklySchedule.objects.create(name='Lunes ajeno', weekday=0, establishment=self.other)
+        other_service = Service.objects.create(
+            name='Pista', description='Pista', category='padel',
+            max_people=4, max_reservation=60, deposit=0, establishment=self.other
+        )
+        self.create_price(other_service, 70, 12, weekly_schedule=weekly)
+        self.create_price(other_service, 80, 9)
+        prices = get_prices_for_date(self.MONDAY)
+        self.assertEqual(
+            sorted((price.service_id == self.service.id, int(price.price)) for price in prices),
+            [(False, 70), (True, 10), (True, 30)]
+        )
+
+
+class RecomendationFilterTests(PriceTestCase):
+    """Cada filtro de ServiceListRecomendations deja solo los servicios que lo cumplen"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        tuesday = WeeklySchedule.objects.create(name='Martes', weekday=1)
+        self.services = {}
+        for name, category, max_people, price, hour, schedule in [
+            ('morning', 'padel', 4, 10, 9, self.weekly),
+            ('evening', 'tenis', 2, 30, 17, self.weekly),
+            ('outdoor', 'padel, exterior', 6, 50, 11, self.weekly),
+            ('tuesday', 'padel', 4, 10, 9, tuesday),
+        ]:
+            service = self.create_service(category)
+            service.max_people = max_people
+            service.save()
+            self.create_price(service, price, hour, weekly_schedule=schedule)
+            self.services[service.id] = name
+
+    def get_services(self, **params):
+        response = self.client.get('/services/recomendations/', {'date': self.MONDAY.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return {self.services[item['service']] for item in response.data}
+
+    def test_date(self):
+        self.assertEqual(self.get_services(), {'morning', 'evening', 'outdoor'})
+        self.assertEqual(self.get_services(date='2025-06-03'), {'tuesday'})
+        self.assertEqual(self.get_services(date='2025-06-04'), set())
+
+    def test_price_range(self):
+        self.assertEqual(self.get_services(price='30'), {'morning', 'evening'})
+        self.assertEqual(self.get_services(price='9.99'), set())
+
+    def test_time_window(self):
+        self.assertEqual(self.get_services(start_time='09:30'), {'morning'})
+        self.assertEqual(self.get_services(end_time='18:00'), {'evening'})
+        self.assertEqual(self.get_services(start_time='11:00', end_time='12:00'), {'outdoor'})
+        # Ningún tramo contiene la ventana completa
+        self.assertEqual(self.get_services(start_time='09:00', end_time='12:00'), set())
+
+    def test_people_and_category(self):
+        self.assertEqual(self.get_services(max_people='5'), {'outdoor'})
+        self.assertEqual(self.get_services(category='exterior'), {'outdoor'})
+        self.assertEqual(self.get_services(category='tenis, exterior'), {'evening', 'outdoor'})
+        self.assertEqual(self.get_services(category='padel', price='20', start_time='09:00'), {'morning'})
+
+    def test_invalid_filters(self):
+        for params in [{'price': 'barato'}, {'max_people': 'dos'}, {'start_time': '9h'}, {'date': '02/06/2025'}]:
+            response = self.client.get('/services/recomendations/', {'date': self.MONDAY.isoformat(), **params})
+            self.assertEqual(response.status_code, 400)
+
+
+class ServiceSearchTests(PriceTestCase):
+    """La búsqueda de texto se mantiene al día con los servicios y se combina con los filtros de precios"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def create_named(self, name, description='Pista', category='padel'):
+        return Service.objects.create(
+            name=name, description=description, category=category,
+            max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+        )
+
+    def search(self, text):
+        return [item['id'] for item in self.client.get('/services/search/', {'q': text}).data]
+
+    def test_search(self):
+        billiards = self.create_named('Mesa de billar', category='billar')
+        television = self.create_named('Televisión OLED', category='pantallas')
+        self.assertEqual(self.search('billar'), [billiards.id])
+        self.assertEqual(self.search('bill'), [billiards.id])
+        self.assertEqual(self.search('television'), [television.id])
+        self.assertEqual(self.search('pantallas'), [television.id])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        service = self.create_named('Mesa de billar')
+        service.name = 'Diana de dardos'
+        service.save()
+        self.assertEqual(self.search('billar'), [])
+        self.assertEqual(self.search('dardos'), [service.id])
+
+        service.delete()
+        self.assertEqual(self.search('dardos'), [])
+
+    def test_search_with_filters_beyond_the_result_limit(self):
+        # Más coincidencias que MAX_LIMIT, y la única que cumple los filtros es la menos relevante
+        Service.objects.bulk_create([
+            Service(
+                id=index, name=f"Padel {index}", description='Padel', category='padel',
+                max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+            )
+            for index in range(1, MAX_LIMIT + 11)
+        ])
+        rebuild_index()
+        priced = self.create_named('Padel', description=' '.join(['Pista cubierta con iluminación'] * 20))
+        self.create_price(priced, 10, 9)
+        self.assertNotIn(priced.id, search_service_ids('padel', MAX_LIMIT))
+
+        response = self.client.get('/services/recomendations/', {'date': self.MONDAY.isoformat(), 'q': 'padel', 'price': '20'})
+        self.assertEqual([item['service'] for item in response.data], [priced.id])
+
+    def test_search_results_by_relevance(self):
+        weak = self.create_named('Pista', description=' '.join(['Pista cubierta de padel con iluminación'] * 10))
+        strong = self.create_named('Padel', description='Padel')
+        other = self.create_named('Billar', category='billar')
+        for service in (weak, strong, other):
+            self.create_price(service, 10, 9)
+        response = self.client.get('/services/recomendations/', {'date': self.MONDAY.isoformat(), 'q': 'padel'})
+        self.assertEqual([item['service'] for item in response.data], [strong.id, weak.id])
+
+
+class AvailabilityTests(PriceTestCase):
+    """Los tramos libres descuentan las reservas y solo se unen cuando tienen el mismo precio"""
+
+    def setUp(self):
+        super().setUp()
+        user = CustomUser.objects.create(username='client', email='client@uchoose.com', rol='client')
+        self.customer = Client.objects.create(gender='other', credits=0, preferences='', user=user)
+        self.service = self.create_service('padel')
+        self.service.max_reservation = 0
+        self.service.save()
+        self.create_price(self.service, 10, 9)
+        self.create_price(self.service, 10, 10)
+        self.create_price(self.service, 20, 11)
+
+    def reserve(self, start, end):
+        Reservation.objects.create(
+            starting_date=datetime.combine(self.MONDAY, start), end_date=datetime.combine(self.MONDAY, end),
+            client=self.customer, service=self.service
+        )
+
+    def get_free(self):
+        days = get_availability([self.service.id], self.MONDAY, self.MONDAY)
+        return [(slot['start_time'], slot['end_time'], slot['price'], slot['max_duration']) for slot in days[0]['free']]
+
+    def test_merges_only_equal_prices(self):
+        self.assertEqual(self.get_free(), [('09:00', '11:00', '10.00', 120), ('11:00', '12:00', '20.00', 60)])
+
+    def test_reservations_at_block_edges(self):
+        self.reserve(time(8), time(9))
+        self.reserve(time(9), time(9, 30))
+        self.reserve(time(11, 30), time(12))
+        self.assertEqual(self.get_free(), [('09:30', '11:00', '10.00', 90), ('11:00', '11:30', '20.00', 30)])
+
+    def test_reservation_across_blocks(self):
+        self.reserve(time(10, 30), time(11, 30))
+        self.assertEqual(self.get_free(), [('09:00', '10:30', '10.00', 90), ('11:30', '12:00', '20.00', 30)])
+
+    def test_reservations_inside_blocks(self):
+        self.reserve(time(9, 45), time(10, 15))
+        self.reserve(time(11, 15), time(11, 45))
+        self.assertEqual(self.get_free(), [
+            ('09:00', '09:45', '10.00', 45), ('10:15', '11:00', '10.00', 45),
+            ('11:00', '11:15', '20.00', 15), ('11:45', '12:00', '20.00', 15),
+        ])
+
+    def test_max_reservation_limits_duration(self):
+        self.service.max_reservation = 30
+        self.service.save()
+        self.assertEqual([slot[3] for slot in self.get_free()], [30, 30])
+
+
+class PriceMatrixTests(PriceTestCase):
+    """La matriz de precios coincide con los precios de cada fecha"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.get(username='owner'))
+        self.service = self.create_service('padel')
+        self.create_price(self.service, 10, 9)
+        self.create_price(self.service, 15, 18, bookable=False)
+        self.create_price(self.service, 20, 10, group_schedule=self.group)
+        self.create_price(self.service, 30, 11, specific_schedule=self.specific)
+        tuesday = WeeklySchedule.objects.create(name='Martes propio', weekday=1, establishment=self.establishment)
+        self.create_price(self.service, 40, 12, weekly_schedule=tuesday)
+        self.create_price(self.service, 50, 13, weekly_schedule=WeeklySchedule.objects.create(name='Martes', weekday=1))
+
+    def get_matrix(self, **params):
+        return self.client.get(f"/services/{self.service.id}/price-matrix/", params)
+
+    def test_cells_match_prices_for_date(self):
+        matrix = self.get_matrix(month='2025-06').data
+        self.assertEqual(len(matrix['dates']), 30)
+        for day in [self.MONDAY, date(2025, 6, 3), date(2025, 6, 7), date(2025, 6, 9)]:
+            row = matrix['dates'].index(day.isoformat())
+            cells = {
+                (slot['id'], price)
+                for slot, price, bookable in zip(matrix['slots'], matrix['prices'][row], matrix['bookable'][row])
+                if bookable
+            }
+            expected = {
+                (price.time_slot.time_slot_id, str(price.price))
+                for price in get_prices_for_date(day, self.service.id).select_related('time_slot')
+            }
+            self.assertEqual(cells, expected, day)
+            if day == date(2025, 6, 3):
+                # El horario propio del martes sustituye al compartido
+                self.assertEqual({price for _, price in cells}, {'20.00', '40.00'})
+
+    def test_month_at_the_end_of_the_calendar(self):
+        response = self.get_matrix(month='9999-12')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['dates'][-1], '9999-12-31')
+
+    def test_invalid_ranges(self):
+        for params in [{'month': '2025-13'}, {'start': '2025-06-10', 'end': '2025-06-01'}, {'start': '2025-06-01'}]:
+            self.assertEqual(self.get_matrix(**params).status_code, 400)
+
+
+class PriceStatTests(PriceTestCase):
+    """Las estadísticas de precios se mantienen al cambiar los precios y coinciden con las recalculadas"""
+
+    def get_stats(self):
+        return {
+            (stat.category, stat.schedule_type, stat.weekday, stat.bucket):
+                (stat.count, stat.total, stat.total_squares, stat.minimum, stat.maximum)
+            for stat in PriceStat.objects.all()
+        }
+
+    def assert_matches_rebuild(self):
+        stats = self.get_stats()
+        rebuild()
+        self.assertEqual(self.get_stats(), stats)
+
+    def test_groups_by_category_schedule_weekday_and_bucket(self):
+        service = self.create_service('Padel, exterior')
+        self.create_price(service, 10, 9)
+        self.create_price(service, 20, 17, specific_schedule=self.specific)
+        self.create_price(service, 30, 22, group_schedule=self.group)
+        self.create_price(service, 99, 10, bookable=False)
+
+        stats = self.get_stats()
+        self.assertEqual(len(stats), 6)
+        self.assertEqual(stats[('padel', 'weekly', 0, 'morning')], (1, 10, 100, 10, 10))
+        self.assertEqual(stats[('exterior', 'specific', 0, 'afternoon')], (1, 20, 400, 20, 20))
+        self.assertEqual(stats[('padel', 'group', None, 'night')], (1, 30, 900, 30, 30))
+        self.assert_matches_rebuild()
+
+    def test_updates_and_deletes_prices_incrementally(self):
+        service = self.create_service('padel')
+        low = self.create_price(service, 10, 9)
+        high = self.create_price(service, 20, 10)
+        self.assertEqual(self.get_stats()[('padel', 'weekly', 0, 'morning')], (2, 30, 500, 10, 20))
+
+        low.price = Decimal('15')
+        low.save()
+        self.assertEqual(self.get_stats()[('padel', 'weekly', 0, 'morning')], (2, 35, 625, 15, 20))
+        self.assert_matches_rebuild()
+
+        high.bookable = False
+        high.save()
+        self.assertEqual(self.get_stats()[('padel', 'weekly', 0, 'morning')], (1, 15, 225, 15, 15))
+
+        low.delete()
+        self.assertEqual(self.get_stats(), {})
+
+    def test_moves_prices_when_service_categories_change(self):
+        service = self.create_service('padel, exterior')
+        self.create_price(service, 10, 9)
+
+        service.category = 'padel, cubierta'
+        service.save()
+        self.assertEqual(
+            set(self.get_stats()),
+            {('padel', 'weekly', 0, 'morning'), ('cubierta', 'weekly', 0, 'morning')}
+        )
+        self.assert_matches_rebuild()
+
+        service.delete()
+        self.assertEqual(self.get_stats(), {})
+
+    def test_moves_prices_when_slot_times_change(self):
+        service = self.create_service('padel')
+        price = self.create_price(service, 10, 9)
+        self.create_price(service, 20, 10)
+
+        time_slot = price.time_slot.time_slot
+        time_slot.start_time, time_slot.end_time = time(17), time(18)
+        time_slot.save()
+        stats = self.get_stats()
+        self.assertEqual(stats[('padel', 'weekly', 0, 'morning')], (1, 20, 400, 20, 20))
+        self.assertEqual(stats[('padel', 'weekly', 0, 'afternoon')], (1, 10, 100, 10, 10))
+        self.assert_matches_rebuild()
+
+    def test_moves_prices_when_schedule_days_change(self):
+        service = self.create_service('padel')
+        self.create_price(service, 10, 9)
+        self.create_price(service, 30, 11, specific_schedule=self.specific)
+
+        self.weekly.weekday = 2
+        self.weekly.save()
+        self.specific.date = date(2025, 6, 7)
+        self.specific.save()
+        self.assertEqual(
+            set(self.get_stats()),
+            {('padel', 'weekly', 2, 'morning'), ('padel', 'specific', 5, 'morning')}
+        )
+        self.assert_matches_rebuild()
+
+    def test_moves_prices_when_assignment_changes_schedule(self):
+        service = self.create_service('padel')
+        price = self.create_price(service, 10, 9)
+
+        assignment = price.time_slot
+        assignment.weekly_schedule = None
+        assignment.group_schedule = self.group
+        assignment.save()
+        self.assertEqual(set(self.get_stats()), {('padel', 'group', None, 'morning')})
+        self.assert_matches_rebuild()
+
+    def test_removing_more_than_counted_deletes_the_group(self):
+        service = self.create_service('padel')
+        price = self.create_price(service, 10, 9)
+        contributions = get_contributions(price)
+        remove_contributions(contributions * 2)
+        self.assertEqual(self.get_stats(), {})
+        remove_contributions(contributions)
+        self.assertEqual(self.get_stats(), {})
+
+    def test_category_changes_after_unsynced_load(self):
+        # Categorías enlazadas sin que sus precios contaran, como tras cargar fixtures
+        service = self.create_service('padel')
+        self.create_price(service, 10, 9)
+        service.categories.add(Category.objects.create(name='exterior'))
+
+        service.category = 'tenis'
+        service.save()
+        self.assertEqual(set(self.get_stats()), {('tenis', 'weekly', 0, 'morning')})
+        self.assert_matches_rebuild()
+
+    def test_analysis_size_does_not_grow_with_catalogue(self):
+        for index in range(10):
+            service = self.create_service('padel' if index % 2 else f"otra {index}")
+            self.create_price(service, 10 + index, 9)
+            self.create_price(service, 20 + index, 18, specific_schedule=self.specific)
+
+        with self.assertNumQueries(2):
+            price_stats = get_price_stats(['padel'])
+        self.assertEqual(len(price_stats['categories']), 2)
+        self.assertEqual(len(price_stats['overall']), 2)
+
+        analysis = analyze_price_stats(price_stats)
+        self.assertEqual(analysis['sample_size'], 20)
+        self.assertEqual(analysis['min_price'], 10)
+        self.assertEqual(analysis['max_price'], 29)
+        self.assertEqual(
+            analysis['category_segments'][1],
+            {'category': 'padel', 'schedule_type': 'weekly', 'count': 5, 'mean': 15.0, 'std': 2.83, 'min': 11.0, 'max': 19.0}
+        )
+
+
+class LocalPriceRecomendationTests(SimpleTestCase):
+    """El recomendador local responde sin el modelo a partir de las estadísticas de precios"""
+
+    def stats(self, categories=(), overall=()):
+        def row(schedule_type, bucket, prices, **extra):
+            return {
+                **extra, 'schedule_type': schedule_type, 'bucket': bucket, 'count': len(prices),
+                'total': sum(prices), 'total_squares': sum(price * price for price in prices),
+                'minimum': min(prices), 'maximum': max(prices)
+            }
+        return {
+            'categories': [row(*values, category='billar', weekday=weekday) for weekday, *values in categories],
+            'overall': [row(*values) for values in overall],
+        }
+
+    def test_without_prices_returns_nothing(self):
+        self.assertEqual(local_service_price_recomendation(self.stats(), 'weekly', 0, 'morning'), {})
+
+    def test_uses_the_catalogue_when_the_category_has_no_prices(self):
+        stats = self.stats(overall=[('weekly', 'morning', [8, 10, 12])])
+        recomendation = local_service_price_recomendation(stats, 'weekly', 0, 'morning')
+        self.assertEqual(recomendation, {'rango': '9-11', 'optimo': 10})
+
+    def test_similar_slots_of_the_category_weigh_more(self):
+        stats = self.stats(
+            categories=[(0, 'weekly', 'morning', [100] * 20), (None, 'group', 'night', [5] * 10)],
+            overall=[('weekly', 'morning', [2] * 20 + [100] * 20), ('group', 'night', [5] * 10)]
+        )
+        self.assertGreater(local_service_price_recomendation(stats, 'weekly', 0, 'morning')['optimo'], 80)
+        self.assertLess(local_service_price_recomendation(stats, 'group', None, 'night')['optimo'], 20)
+
+
+class ServicePriceRecomendationViewTests(PriceTestCase):
+    """La recomendación de precios se puede pedir al recomendador local sin conexión"""
+
+    def test_local_engine(self):
+        service = self.create_service('padel')
+        price = self.create_price(service, 10, 9)
+        self.create_price(service, 14, 10)
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.get(username='owner'))
+        url = f"/services/price-recomendation/{price.time_slot_id}/{service.id}/"
+
+        response = client.get(url, {'engine': 'local'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'rango': '11-13', 'optimo': 12})
+
+        response = client.get(url, {'engine': 'otro'})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('service.views.OPENAI_API_KEY', 'key')
+    @mock.patch('service.recomendation.OpenAI')
+    def test_incomplete_model_answers_use_the_local_engine(self, openai):
+        service = self.create_service('padel')
+        price = self.create_price(service, 10, 9)
+        self.create_price(service, 14, 10)
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.get(username='owner'))
+        url = f"/services/price-recomendation/{price.time_slot_id}/{service.id}/"
+
+        for content in ['```json\n{"rango": "5-8"}\n```', '[10, 12]', '"12"', 'no sé', None]:
+            openai.return_value.chat.completions.create.return_value.choices = [
+                mock.Mock(message=mock.Mock(content=content))
+            ]
+            self.assertEqual(client.get(url).data, {'rango': '11-13', 'optimo': 12}, content)
+
+        openai.return_value.chat.completions.create.return_value.choices = [
+            mock.Mock(message=mock.Mock(content='```json\n{"rango": "5-8", "optimo": 7}\n```'))
+        ]
+        self.assertEqual(client.get(url).data, {'rango': '5-8', 'optimo': 7})
+
+
+class CategorizationTests(TestCase):
+    """Los servicios nuevos se categorizan sin esperar al modelo cuando hay servicios parecidos o una respuesta guardada"""
+
+    SERVICES = [
+        ('Mesa de billar profesional', 'Mesa de billar americana con tacos incluidos', 'billar'),
+        ('Billar pool', 'Mesa de billar con bolas nuevas', 'billar'),
+        ('Diana de dardos electrónica', 'Diana con marcador automático para partidas de dardos', 'dardos'),
+        ('Dardos clásicos', 'Diana de corcho y dardos de acero', 'dardos'),
+    ]
+
+    def setUp(self):
+        reset_index()
+        self.client = APIClient()
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com')
+        self.client.force_authenticate(user)
+        owner = Worker.objects.create(rol='owner', user=user)
+        self.establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web', owner=owner
+        )
+        for name, description, category in self.SERVICES:
+            Service.objects.create(
+                name=name, description=description, category=category,
+                max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+            )
+
+    def tearDown(self):
+        reset_index()
+
+    def create(self, name, description):
+        return self.client.post('/services/create/', {
+            'name': name, 'description': description, 'category': 'ignorada',
+            'max_people': 2, 'max_reservation': 60, 'deposit': 0, 'establishment': self.establishment.id
+        }, format='json')
+
+    def test_nearest_neighbours(self):
+        index = NeighbourIndex([(service_id, *service) for service_id, service in enumerate(self.SERVICES)])
+        self.assertEqual(index.classify('Mesa de billar', 'Billar americano con tacos'), 'billar')
+        self.assertEqual(index.classify('Dardos', 'Diana electrónica de dardos'), 'dardos')
+        self.assertIsNone(index.classify('Consola', 'Videojuegos de última generación'))
+
+    def test_similar_service_is_categorized_immediately(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create('Mesa de billar', 'Billar americano con tacos')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['category'], 'billar')
+        self.assertEqual(callbacks, [])
+
+    @mock.patch('service.categorization.OpenAI')
+    def test_unknown_service_is_categorized_in_background_and_cached(self, openai):
+        openai.return_value.chat.completions.create.return_value.choices = [
+            mock.Mock(message=mock.Mock(content='consolas'))
+        ]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create('Consola PS5', 'Videojuegos de última generación')
+        self.assertEqual(response.data['category'], '')
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(categorize_service(response.data['id']), 'consolas')
+        self.assertEqual(Service.objects.get(pk=response.data['id']).categories.get().name, 'consolas')
+        self.assertEqual(CategoryCache.objects.get().category, 'consolas')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create('consola ps5', 'Videojuegos de ultima generacion.')
+        self.assertEqual(response.data['category'], 'consolas')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(openai.return_value.chat.completions.create.call_count, 1)
+
+
+    def test_guessed_categories_do_not_feed_the_index(self):
+        size = len(get_index().categories)
+        response = self.create('Mesa de billar', 'Billar americano con tacos')
+        service = Service.objects.get(pk=response.data['id'])
+        self.assertTrue(service.category_guessed)
+        self.assertEqual(len(get_index().categories), size)
+
+        reset_index()
+        self.assertEqual(len(get_index().categories), size)
+
+        # Cuando el usuario la corrige sí cuenta
+        response = self.client.put(f"/services/{service.id}/update/", {'category': 'billar americano'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Service.objects.get(pk=service.id).category_guessed)
+        self.assertEqual(get_index().categories[-1], 'billar americano')
+
+    @mock.patch('service.categorization.OpenAI')
+    def test_empty_answer_is_a_failure(self, openai):
+        openai.return_value.chat.completions.create.return_value.choices = [
+            mock.Mock(message=mock.Mock(content=' ``` '))
+        ]
+        with self.captureOnCommitCallbacks():
+            response = self.create('Consola PS5', 'Videojuegos de última generación')
+        with self.assertRaises(EmptyCategoryError):
+            categorize_service(response.data['id'])
+        self.assertEqual(Service.objects.get(pk=response.data['id']).category, PENDING_CATEGORY)
+        self.assertFalse(CategoryCache.objects.exists())
+
+        # Desde el hilo en segundo plano el servicio se queda pendiente
+        with mock.patch('service.categorization.connection'):
+            _categorize_in_background(response.data['id'])
+        self.assertEqual(Service.objects.get(pk=response.data['id']).category, PENDING_CATEGORY)
+        self.assertEqual(len(get_index().categories), len(self.SERVICES))
+
+    def test_deleted_service_leaves_the_index(self):
+        index = get_index()
+        Service.objects.filter(category='dardos').delete()
+        self.assertIs(get_index(), index)
+        self.assertIsNone(index.classify('Dardos', 'Diana electrónica de dardos'))
+
+    @mock.patch('service.categorization.threading.Thread')
+    def test_expired_index_is_rebuilt_in_background(self, thread):
+        index = get_index()
+        index.built -= INDEX_MAX_AGE + 1
+        # Mientras se reconstruye se sigue usando el índice anterior, que recibe los cambios
+        self.assertIs(get_index(), index)
+        self.assertIs(get_index(), index)
+        thread.assert_called_once()
+        service = Service.objects.create(
+            name='Futbolín', description='Futbolín profesional', category='futbolín',
+            max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+        )
+        self.assertEqual(index.categories[-1], 'futbolín')
+
+        # El índice nuevo incluye los cambios hechos durante la reconstrucción
+        with mock.patch('service.categorization.build_index', return_value=NeighbourIndex([])):
+            with mock.patch('service.categorization.connection'):
+                thread.call_args.kwargs['target']()
+        self.assertIsNot(get_index(), index)
+        self.assertEqual(get_index().documents, {service.id: 0})
+
+
+class ServiceCategoryTests(TestCase):
+    """El texto de category se normaliza y se refleja en las categorías enlazadas del servicio"""
+
+    def setUp(self):
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com')
+        owner = Worker.objects.create(rol='owner', user=user)
+        self.establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web', owner=owner
+        )
+
+    def create_service(self, category):
+        return Service.objects.create(
+            name='Pista', description='Pista', category=category,
+            max_people=4, max_reservation=60, deposit=0, establishment=self.establishment
+        )
+
+    def get_categories(self, service):
+        return list(service.categories.values_list('name', flat=True))
+
+    def test_normalization(self):
+        self.assertEqual(split_categories(' Padel , exterior,PADEL,, '), ['padel', 'exterior'])
+        self.assertEqual(split_categories(''), [])
+        self.assertEqual(split_categories(None), [])
+        self.assertEqual(Category.objects.create(name='  Tenis ').name, 'tenis')
+
+    def test_sync_on_save(self):
+        service = self.create_service('Padel, Exterior')
+        self.assertEqual(self.get_categories(service), ['exterior', 'padel'])
+
+        service.category = 'tenis, padel'
+        service.save()
+        self.assertEqual(self.get_categories(service), ['padel', 'tenis'])
+        # Las categorías sin servicios se conservan
+        self.assertTrue(Category.objects.filter(name='exterior').exists())
+
+        # Guardar otros campos no toca las categorías
+        Service.objects.filter(pk=service.pk).update(category='dardos')
+        service.name = 'Pista central'
+        service.save(update_fields=['name'])
+        self.assertEqual(self.get_categories(service), ['padel', 'tenis'])
+
+    def test_sync_on_fixture_load(self):
+        service = self.create_service('padel')
+        # Como las de fixtures/services.json, sin las categorías enlazadas
+        fields = ['name', 'description', 'category', 'max_people', 'max_reservation', 'deposit', 'establishment']
+        fixture = serializers.serialize('json', [service], fields=fields).replace('"padel"', '"Billar, DARDOS"')
+        service.categories.clear()
+        for loaded in serializers.deserialize('json', fixture):
+            loaded.save()
+        self.assertEqual(self.get_categories(service), ['billar', 'dardos'])
+
+
+class CategoryMigrationTests(TransactionTestCase):
+    """La migración 0006 crea las categorías de los textos de category existentes"""
+
+    MIGRATE_FROM = [('service', '0005_service_max_people')]
+    MIGRATE_TO = [('service', '0006_category')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        user = CustomUser.objects.create(username='owner', email='owner@uchoose.com')
+        establishment = Establishment.objects.create(
+            name='Club', description='Club', location='Sevilla', platforms='web',
+            owner=Worker.objects.create(rol='owner', user=user)
+        )
+        apps = self.migrate(self.MIGRATE_FROM)
+        OldService = apps.get_model('service', 'Service')
+        for pk, category in [(1, 'Padel, Exterior'), (2, ' padel ,padel'), (3, '')]:
+            OldService.objects.create(
+                id=pk, name='Pista', description='Pista', category=category,
+                max_people=4, max_reservation=60, deposit=0, establishment_id=establishment.id
+            )
+
+        apps = self.migrate(self.MIGRATE_TO)
+        NewService = apps.get_model('service', 'Service')
+        NewCategory = apps.get_model('service', 'Category')
+        self.assertEqual(list(NewCategory.objects.values_list('name', flat=True)), ['exterior', 'padel'])
+        self.assertEqual(
+            {service.id: sorted(service.categories.values_list('name', flat=True)) for service in NewService.objects.all()},
+            {1: ['exterior', 'padel'], 2: ['padel'], 3: []}
+        )
+
+
+class ClientProfileTests(ReservationTestCase):
+    """El perfil de reservas de un cliente se calcula en una consulta y se guarda en caché"""
+
+    def get_profile(self):
+        """Perfil del cliente y consultas hechas para obtenerlo"""
+        with CaptureQueriesContext(connection) as queries:
+            profile = get_client_profile(self.customer.id)
+        return profile, len(queries)
+
+    def test_weighted_median(self):
+        self.assertEqual(weighted_median({4: 3}), 4)
+        self.assertEqual(weighted_median({2: 1, 4: 1}), 3)
+        self.assertEqual(weighted_median({2: 1, 4: 2, 10: 1}), 4)
+
+    def test_profile_is_aggregated_cached_and_invalidated(self):
+        self.assertIsNone(get_client_profile(self.customer.id))
+        self.reserve(self.billar, 20)
+        self.reserve(self.dardos, 5)
+
+        profile, queries = self.get_profile()
+        self.assertEqual(queries, 1)
+        self.assertEqual(profile, {
+            'reservations': 25,
+            'categories': ['billar', 'profesional', 'dardos'],
+            'party_size': {'mean': 3.6, 'median': 4, 'min': 2, 'max': 4},
+        })
+        self.assertEqual(self.get_profile(), (profile, 0))
+
+        self.reserve(self.karaoke)
+        self.assertEqual(get_client_profile(self.customer.id)['party_size']['max'], 10)
+        Reservation.objects.filter(service=self.karaoke).delete()
+        self.assertEqual(get_client_profile(self.customer.id), profile)
+
+    def test_profile_is_invalidated_when_reserved_services_change(self):
+        self.reserve(self.billar, 2)
+        self.reserve(self.dardos)
+        self.assertEqual(self.get_profile()[0]['categories'], ['billar', 'profesional', 'dardos'])
+
+        # Otros campos no invalidan el perfil
+        self.billar.name = 'Mesa de billar'
+        self.billar.save()
+        self.assertEqual(self.get_profile()[1], 0)
+
+        self.billar.category = 'pool'
+        self.billar.save()
+        self.assertEqual(self.get_profile()[0]['categories'], ['pool', 'dardos'])
+
+        self.dardos.max_people = 6
+        self.dardos.save(update_fields=['max_people'])
+        self.assertEqual(self.get_profile()[0]['party_size']['max'], 6)
+
+        # Los servicios que el cliente no ha reservado no le afectan
+        self.karaoke.category = 'canciones'
+        self.karaoke.save()
+        self.assertEqual(self.get_profile()[1], 0)
+
+    @override_settings(SERVICE_VECTORS_DIR='/nonexistent')
+    def test_for_you_feed(self):
+        response = self.client.get('/services/fyp/')
+        self.assertEqual(response.data, [])
+
+        self.reserve(self.billar, 3)
+        response = self.client.get('/services/fyp/')
+        self.assertEqual([service['id'] for service in response.data], [self.billar.id])
+
+
+class ServiceVectorTests(ReservationTestCase):
+    """Los servicios se ordenan por el parecido de sus vectores con las reservas del cliente"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = TemporaryDirectory()
+        self.vectors_settings = override_settings(SERVICE_VECTORS_DIR=self.directory.name)
+        self.vectors_settings.enable()
+        self.other_billar = self.create_service('billar', 4)
+        self.other_billar.name = 'Mesa de billar americano'
+        self.other_billar.save()
+
+    def tearDown(self):
+        self.vectors_settings.disable()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_hash_token_is_stable(self):
+        self.assertEqual(hash_token('billar'), hash_token('billar'))
+        self.assertLess(hash_token('billar')[0], DIMENSIONS)
+
+    def test_build_writes_memory_mapped_float32_vectors(self):
+        self.assertEqual(build_vectors(), 4)
+        index = VectorIndex(Path(self.directory.name) / get_current_version(self.directory.name))
+        self.assertEqual(index.vectors.dtype, np.float32)
+        self.assertIsInstance(index.vectors, np.memmap)
+        self.assertEqual(index.vectors.shape, (4, DIMENSIONS))
+        self.assertEqual(list(index.ids), sorted(Service.objects.values_list('id', flat=True)))
+
+    def test_rebuild_switches_whole_versions(self):
+        build_vectors()
+        first = get_current_version(self.directory.name)
+        index = get_vector_index()
+        self.assertEqual(len(index.ids), 4)
+
+        # Una versión a medio escribir no se usa hasta que pasa a ser la actual
+        (Path(self.directory.name) / '00000000000000000000-partial').mkdir()
+        self.assertIs(get_vector_index(), index)
+
+        self.create_service('karaoke', 8)
+        for _ in range(KEEP_VERSIONS + 1):
+            build_vectors()
+        current = get_current_version(self.directory.name)
+        self.assertNotEqual(current, first)
+        self.assertEqual(len(get_vector_index().ids), 5)
+        versions = sorted(path.name for path in Path(self.directory.name).iterdir() if path.is_dir())
+        self.assertEqual(len(versions), KEEP_VERSIONS)
+        self.assertEqual(versions[-1], current)
+
+    def test_ranks_unreserved_services_by_similarity(self):
+        build_vectors()
+        self.assertIsNone(recommend_services(self.customer.id))
+
+        self.reserve(self.billar, 3)
+        ranked = recommend_services(self.customer.id)
+        self.assertEqual(ranked[0], self.other_billar.id)
+        self.assertNotIn(self.billar.id, ranked)
+        self.assertEqual(set(ranked), {self.other_billar.id, self.dardos.id, self.karaoke.id})
+        self.assertEqual(recommend_services(self.customer.id, limit=1), [self.other_billar.id])
+
+        response = self.client.get('/services/fyp/', {'limit': 2})
+        self.assertEqual([service['id'] for service in response.data], ranked[:2])
+        self.assertEqual(self.client.get('/services/fyp/', {'limit': 'x'}).status_code, 400)
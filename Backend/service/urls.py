@@ -8,6 +8,9 @@ urlpatterns = [
     path('services/<int:pk>/update/', views.ServiceUpdateView.as_view(), name='service_update'),
     path('services/establishment/<int:fk>/', views.ServiceListByEstablishmentView.as_view(), name='service_list_establishment'),
     path('services/recomendations/', views.ServiceListRecomendations.as_view(), name='service-list-recomendations'),
+    path('services/search/', views.ServiceSearchView.as_view(), name='service-search'),
+    path('services/availability/', views.ServiceAvailabilityView.as_view(), name='service-availability'),
+    path('services/<int:pk>/price-matrix/', views.ServicePriceMatrixView.as_view(), name='service-price-matrix'),
     path('services/fyp/', views.ServiceListForYou.as_view(), name='service-fyp-list'),
 
     # ServicePriceAssignment endpoints
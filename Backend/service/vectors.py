@@ -0,0 +1,266 @@
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Q
+
+from reservation.models import Reservation
+from .categorization import get_tokens
+from .models import Service, ServicePriceAssignment
+from .price_stats import BUCKET_STARTS, get_bucket
+
+
+# Componentes entre los que se reparten por hash las palabras del nombre, la descripción y la categoría
+TEXT_DIMENSIONS = 128
+
+# Peso de las palabras de la categoría frente a las del nombre y la descripción
+CATEGORY_TOKEN_WEIGHT = 2.0
+
+# Peso de cada bloque del vector: texto, nivel de precio, número de personas y franjas del día de sus tramos
+TEXT_WEIGHT = 1.0
+PRICE_WEIGHT = 0.5
+PARTY_WEIGHT = 0.3
+TIME_WEIGHT = 0.5
+
+BUCKETS = [name for _, name in BUCKET_STARTS]
+PRICE_COMPONENT = TEXT_DIMENSIONS
+PARTY_COMPONENT = TEXT_DIMENSIONS + 1
+TIME_COMPONENTS = slice(TEXT_DIMENSIONS + 2, TEXT_DIMENSIONS + 2 + len(BUCKETS))
+DIMENSIONS = TEXT_DIMENSIONS + 2 + len(BUCKETS)
+
+# Ficheros de cada versión de los vectores, un subdirectorio de SERVICE_VECTORS_DIR:
+# una fila float32 por servicio y los ids de las filas, ordenados
+VECTORS_FILE = 'vectors.npy'
+IDS_FILE = 'ids.npy'
+
+# Fichero de SERVICE_VECTORS_DIR con el nombre de la versión en uso. Se sustituye
+# de una vez, así que nunca se leen los ids de una versión con los vectores de otra
+CURRENT_FILE = 'CURRENT'
+
+# Versiones más recientes que se conservan para los procesos que aún tienen abierta una anterior
+KEEP_VERSIONS = 2
+
+# Servicios recomendados por defecto y como máximo
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def hash_token(token):
+    """Componente de texto y signo de una palabra, iguales en todos los procesos"""
+    value = zlib.crc32(token.encode())
+    return value % TEXT_DIMENSIONS, 1.0 if value >> 31 else -1.0
+
+
+def text_vector(name, description, category):
+    """Frecuencias por hash de las palabras de un servicio, normalizadas"""
+    vector = np.zeros(TEXT_DIMENSIONS, dtype=np.float32)
+    tokens = [(token, 1.0) for token in get_tokens(f"{name} {description}")]
+    tokens += [(token, CATEGORY_TOKEN_WEIGHT) for token in get_tokens(category)]
+    for token, weight in tokens:
+        component, sign = hash_token(token)
+        vector[component] += sign * weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def service_vector(name, description, category, max_people, price, buckets, scales):
+    """
+    Vector normalizado de un servicio. price es la media de sus precios
+    reservables, buckets el número de tramos reservables por franja del día
+    y scales los logaritmos del mayor precio y número de personas del catálogo.
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    vector[:TEXT_DIMENSIONS] = TEXT_WEIGHT * text_vector(name, description, category)
+    if price is not None and scales['price']:
+        vector[PRICE_COMPONENT] = PRICE_WEIGHT * math.log1p(float(price)) / scales['price']
+    if scales['max_people']:
+        vector[PARTY_COMPONENT] = PARTY_WEIGHT * math.log1p(max_people) / scales['max_people']
+    total = sum(buckets.values())
+    if total:
+        vector[TIME_COMPONENTS] = [TIME_WEIGHT * buckets[bucket] / total for bucket in BUCKETS]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def build_vectors(directory=None, batch_size=1000):
+    """
+    Calcula los vectores de todos los servicios y los escribe en disco sin
+    tenerlos todos en memoria, en una versión nueva que pasa a usarse al
+    final. Los procesos que usan la anterior siguen con ella hasta entonces.
+    """
+    directory = Path(directory or settings.SERVICE_VECTORS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Nombres ordenados por fecha de creación
+    version = Path(tempfile.mkdtemp(prefix=f"{time.time_ns():020d}-", dir=directory))
+
+    ids = np.array(Service.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    prices = dict(
+        ServicePriceAssignment.objects.filter(bookable=True).values('service_id')
+        .annotate(average=Avg('price')).values_list('service_id', 'average')
+    )
+    buckets = defaultdict(Counter)
+    for service_id, start_time, count in (
+        ServicePriceAssignment.objects.filter(bookable=True)
+        .values('service_id', 'time_slot__time_slot__start_time')
+        .annotate(count=Count('id'))
+        .values_list('service_id', 'time_slot__time_slot__start_time', 'count')
+    ):
+        buckets[service_id][get_bucket(start_time)] += count
+    scales = {
+        'price': math.log1p(float(max(prices.values(), default=0))),
+        'max_people': math.log1p(Service.objects.aggregate(value=Max('max_people'))['value'] or 0),
+    }
+
+    vectors = np.lib.format.open_memmap(
+        version / VECTORS_FILE, mode='w+', dtype=np.float32, shape=(len(ids), DIMENSIONS)
+    )
+    services = Service.objects.order_by('id').values_list('id', 'name', 'description', 'category', 'max_people')
+    for service_id, name, description, category, max_people in services.iterator(chunk_size=batch_size):
+        row = np.searchsorted(ids, service_id)
+        # Los servicios creados mientras se calculan quedan para la siguiente vez
+        if row < len(ids) and ids[row] == service_id:
+            vectors[row] = service_vector(
+                name, description, category, max_people, prices.get(service_id), buckets[service_id], scales
+            )
+    vectors.flush()
+    del vectors
+
+    np.save(version / IDS_FILE, ids)
+
+    current = version / CURRENT_FILE
+    current.write_text(version.name)
+    os.replace(current, directory / CURRENT_FILE)
+    remove_old_versions(directory)
+    return len(ids)
+
+
+def get_current_version(directory):
+    """Nombre de la versión en uso de los vectores, o None si aún no se han calculado"""
+    try:
+        return (Path(directory) / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def remove_old_versions(directory):
+    """Borra las versiones anteriores a las KEEP_VERSIONS más recientes, salvo la que está en uso"""
+    current = get_current_version(directory)
+    versions = sorted(path for path in Path(directory).iterdir() if path.is_dir())
+    for path in versions[:-KEEP_VERSIONS]:
+        if path.name != current:
+            # Donde los ficheros abiertos no se pueden borrar se reintenta en la siguiente versión
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class VectorIndex:
+    """Vectores de servicios mapeados desde disco, que se leen solo al puntuarlos"""
+
+    def __init__(self, directory):
+        self.vectors = np.load(directory / VECTORS_FILE, mmap_mode='r')
+        self.ids = np.load(directory / IDS_FILE)
+        if self.vectors.shape != (len(self.ids), DIMENSIONS):
+            raise ValueError("Los vectores y los ids de los servicios no coinciden")
+
+    def get_rows(self, service_ids):
+        """Filas de los servicios que tienen vector, en el orden dado"""
+        service_ids = np.asarray(service_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, service_ids), max(len(self.ids) - 1, 0))
+        found = self.ids[rows] == service_ids if len(self.ids) else np.zeros(len(service_ids), dtype=bool)
+        return rows, found
+
+    def top(self, profile, limit, exclude=()):
+        """Ids de los servicios más parecidos al perfil por similitud coseno, de más a menos"""
+        scores = np.asarray(self.vectors @ profile)
+        rows, found = self.get_rows(list(exclude))
+        scores[rows[found]] = -np.inf
+        limit = min(limit, int(np.isfinite(scores).sum()))
+        if limit <= 0:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [int(service_id) for service_id in self.ids[best]]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Índice de vectores del proceso, que se vuelve a abrir cuando cambia la versión en uso. None si no hay"""
+    global _index, _index_version
+    directory = Path(settings.SERVICE_VECTORS_DIR)
+    current = get_current_version(directory)
+    if current is None:
+        return None
+    version = (directory, current)
+    with _index_lock:
+        if version != _index_version:
+            try:
+                _index = VectorIndex(directory / current)
+            except (OSError, ValueError):
+                # Versión borrada o dañada; se vuelve a intentar en la siguiente petición
+                return None
+            _index_version = version
+        return _index
+
+
+def _hour_filter(bucket):
+    starts = [start.hour for start, _ in BUCKET_STARTS]
+    position = BUCKETS.index(bucket)
+    if position == len(BUCKETS) - 1:
+        return Q(starting_date__hour__gte=starts[position]) | Q(starting_date__hour__lt=starts[0])
+    return Q(starting_date__hour__gte=starts[position], starting_date__hour__lt=starts[position + 1])
+
+
+def client_vector(index, client_id):
+    """
+    Perfil de un cliente en el espacio de los servicios: la suma de los
+    vectores de los servicios que ha reservado, ponderados por sus reservas,
+    con las franjas del día de sus reservas mezcladas con las de los tramos.
+    Devuelve el perfil y los ids reservados; el perfil es None si ninguno de
+    ellos tiene vector.
+    """
+    history = list(
+        Reservation.objects.filter(client_id=client_id).values('service_id')
+        .annotate(reservations=Count('id'), **{bucket: Count('id', filter=_hour_filter(bucket)) for bucket in BUCKETS})
+        .order_by('service_id')
+    )
+    service_ids = [service['service_id'] for service in history]
+    rows, found = index.get_rows(service_ids)
+    if not found.any():
+        return None, service_ids
+
+    weights = np.array([service['reservations'] for service in history], dtype=np.float32)[found]
+    profile = weights @ np.asarray(index.vectors[rows[found]])
+    norm = np.linalg.norm(profile)
+    if not norm:
+        return None, service_ids
+    profile /= norm
+
+    habits = np.array([sum(service[bucket] for service in history) for bucket in BUCKETS], dtype=np.float32)
+    profile[TIME_COMPONENTS] = (profile[TIME_COMPONENTS] + TIME_WEIGHT * habits / habits.sum()) / 2
+    return profile, service_ids
+
+
+def recommend_services(client_id, limit=DEFAULT_LIMIT):
+    """
+    Ids de los servicios no reservados más afines al cliente, de más a menos.
+    None si no hay vectores o el cliente no tiene reservas de servicios con
+    vector, para que se use otra forma de recomendar.
+    """
+    index = get_index()
+    if index is None:
+        return None
+    profile, reserved = client_vector(index, client_id)
+    if profile is None:
+        return None
+    return index.top(profile, max(1, min(limit, MAX_LIMIT)), exclude=reserved)
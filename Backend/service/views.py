@@ -1,139 +1,60 @@
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
+import calendar
 import os
 from django.shortcuts import get_object_or_404
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAIError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 
-from reservation.serializers import ReservationSerializer
-from reservation.models import Reservation
 from user.models import CustomUser
 from worker.models import Worker
 from client.models import Client
 from schedule.serializers import SlotAssignmentSerializer
-from schedule.models import SlotAssignment
-from service.models import Service, ServicePriceAssignment
-from .serializers import ServicePriceAssignmentSerializer, ServiceSerializer
+from schedule.models import SlotAssignment, GroupSchedule, WeeklySchedule, SpecificSchedule
+from schedule.resolution import LEVEL_RANK, resolve_intervals
+from service.models import Service, ServicePriceAssignment, split_categories
+from .serializers import ServicePriceAssignmentSerializer, ServiceSerializer, ServiceCreateSerializer
 
-from .recomendation import generate_service_price_recomendation
+from .recomendation import generate_service_price_recomendation, local_service_price_recomendation, RECOMMENDATION_ENGINES
+from .search import search_service_ids, match_services, rank_service_ids, DEFAULT_LIMIT
+from .availability import get_availability
+from .price_matrix import get_price_matrix
+from .price_stats import get_price_stats, get_schedule_key, get_bucket
+from .categorization import get_category, categorize_on_commit, add_to_index, PENDING_CATEGORY
+from .client_profile import get_client_profile
+from .vectors import recommend_services, DEFAULT_LIMIT as VECTOR_LIMIT
+from uchoose.pagination import list_response
+from uchoose.serializers import get_field_options, optimize_queryset
 
-from django.db.models import Q
-from collections import Counter
+from django.db.models import Q, Exists, OuterRef
 import math
 
 load_dotenv()
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
+# Número máximo de días de las consultas por rango de fechas
+MAX_RANGE_DAYS = 93
+
 @permission_classes([IsAuthenticated])
 class ServiceCreateView(APIView):
+    """
+    Crea un servicio y le asigna una categoría: la que ya dio el modelo para el
+    mismo nombre y descripción o la de los servicios más parecidos. Si ninguna
+    es fiable, el servicio se crea sin categoría y el modelo se la asigna en
+    segundo plano.
+    """
+
     def post(self, request):
-        categories = set(Service.objects.values_list('category', flat=True))
-        prompt = f"""
-           Eres un experto en juegos y servicios que se pueden encontrar en un establecimiento de ocio.
-           Tu tarea es asignar una categoría al servicio que se te proporciona, basándote en su nombre y descripción.
-           El servicio se describe de la siguiente manera:
-           Nombre: {request.data.get('name')}
-           Descripción: {request.data.get('description')}
-
-           Categorías ya definidas:
-              {', '.join(categories)}
-              Si el servicio no encaja en ninguna de las categorías existentes, crea una nueva categoría. Recuerda que las categorías deben ser concisas es decir 
-              en general no deben tener más de 3 palabras, no es una descripción del servicio, simplemente una forma de clasificar los servicios que se 
-              puedan encontrar.
-              
-
-            Aqui tienes varios ejemplos de como se asignan las categorías en base a los nombres y descripciones de los servicios:
-            {{
-                "model": "service.service",
-                "pk": 457504,
-                "fields": {{
-                    "name": "Televisión Sony Bravia 50 pulgadas",
-                    "description": "Ideal para presentaciones o documentales. Conecta tu dispositivo y aprovecha sus aplicaciones.",
-                    "category": "televisión, smart TV, LED",
-                    "max_reservation": 28,
-                    "max_people": 0,
-                    "deposit": 18,
-                    "establishment": 901234
-                }}
-            }},
-            {{
-                "model": "service.service",
-                "pk": 457582,
-                "fields": {{
-                    "name": "Mesa de billar profesional",
-                    "description": "Mesa de billar americana de tamaño reglamentario perfecta para torneos entre amigos con tacos incluidos.",
-                    "category": "billar",
-                    "max_people": 4,
-                    "max_reservation": 120,
-                    "deposit": 25,
-                    "establishment": 123890
-                }}
-            }},
-            {{
-                "model": "service.service",
-                "pk": 457586,
-                "fields": {{
-                    "name": "Karaoke profesional con pantalla",
-                    "description": "Sistema completo de karaoke con miles de canciones en español e inglés y dos micrófonos inalámbricos.",
-                    "category": "karaoke",
-                    "max_reservation": 180,
-                    "max_people": 15,
-                    "deposit": 30,
-                    "establishment": 345678
-                }}
-            }},
-            {{
-                "model": "service.service",
-                "pk": 457587,
-                "fields": {{
-                    "name": "Mesa de air hockey LED",
-                    "description": "Mesa de hockey de aire con efectos LED y marcador electrónico para partidas rápidas y emocionantes.",
-                    "category": "air hockey",
-                    "max_reservation": 60,
-                    "max_people": 2,
-                    "deposit": 22,
-                    "establishment": 345678
-                }}
-            }},
-            {{
-                "model": "service.service",
-                "pk": 457588,
-                "fields": {{
-                    "name": "Máquina recreativa arcade retro",
-                    "description": "Máquina con más de 1000 juegos clásicos de los 80s y 90s perfecta para la nostalgia gamer.",
-                    "category": "arcade",
-                    "max_reservation": 120,
-                    "max_people": 2,
-                    "deposit": 25,
-                    "establishment": 456789
-                }}
-            }},
-            Responde únicamente con la categoría asignada, sin comillas ni ningún otro texto."""
-        
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # o "gpt-4o-mini"
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": "Asigna una categoría al servicio proporcionado."},
-            ],
-            temperature=0.7,
-        )
-        
-        raw_content = response.choices[0].message.content
-        print("RAW CONTENT:", raw_content)
-        # 2. Limpiar el bloque ```json ... ```
-        cleaned = raw_content.strip("`")  # quita los backticks
-        cleaned = cleaned.replace("json", "", 1).strip()  # quita la palabra "json" si está al inicio
-
-        request.data['category'] = cleaned
-        serializer = ServiceSerializer(data=request.data)
+        serializer = ServiceCreateSerializer(data=request.data)
         if serializer.is_valid():
-            service = serializer.save()
+            category, guessed = get_category(serializer.validated_data['name'], serializer.validated_data['description'])
+            service = serializer.save(category=category or PENDING_CATEGORY, category_guessed=guessed)
+            if category is None:
+                categorize_on_commit(service)
             return Response(serializer.data, status=201)
         print(serializer.errors)
         return Response(serializer.errors, status=400)
@@ -141,8 +62,9 @@ class ServiceCreateView(APIView):
 @permission_classes([IsAuthenticated])
 class ServiceDetailView(APIView):
     def get(self, request, pk):
-        service = get_object_or_404(Service, pk=pk)
-        serializer = ServiceSerializer(service)
+        options = get_field_options(request)
+        service = get_object_or_404(optimize_queryset(Service.objects.all(), ServiceSerializer(**options)), pk=pk)
+        serializer = ServiceSerializer(service, **options)
         return Response(serializer.data)
     
 @permission_classes([IsAuthenticated])
@@ -151,7 +73,12 @@ class ServiceUpdateView(APIView):
         service = get_object_or_404(Service, pk=pk)
         serializer = ServiceSerializer(service, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            if 'category' in serializer.validated_data:
+                # La categoría que da el usuario sirve para categorizar otros servicios
+                serializer.save(category_guessed=False)
+                add_to_index(service)
+            else:
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
@@ -175,182 +102,288 @@ class ServiceDeleteView(APIView):
 class ServiceListByEstablishmentView(APIView):
     def get(self, request, fk):
         services = Service.objects.filter(establishment = fk)
-        serializer = ServiceSerializer(services, many=True)
-        return Response(serializer.data)
+        return list_response(request, services, ServiceSerializer)
 
 def to_time(val):
     if isinstance(val, time):
         return val
     return datetime.strptime(val, "%H:%M:%S").time()
 
-def split_slot(slot, overlap):
+def slot_priority(slot):
+    """
+    Prioridad de un tramo: los horarios específicos ganan a los de grupo, que
+    ganan a los semanales, y entre grupos gana el de mayor prioridad.
+    """
+    schedule_type = slot["schedule_type"] or {}
+    return (LEVEL_RANK.get(schedule_type.get("type"), -1), schedule_type.get("priority", 0))
+
+
+def merge_slots(slots):
     """
-    slot: dict con 'start_time' y 'end_time'
-    overlap: dict con 'start_time' y 'end_time'
-    Devuelve lista de slots (dict) no solapados con overlap.
+    Resuelve los solapamientos entre los tramos de un servicio.
+
+    Los tramos se ordenan una sola vez y se recorren en una pasada: donde se
+    solapan gana el de mayor prioridad y, a igual prioridad, el último. Un
+    tramo tapado en parte queda partido en los huecos que no solapan.
+    Devuelve los tramos resultantes ordenados por hora de inicio.
     """
-    s_start = slot["start_time"]
-    s_end = slot["end_time"]
-    o_start = overlap["start_time"]
-    o_end = overlap["end_time"]
-    result = []
-    # Antes del solapamiento
-    if s_start < o_start:
-        new_slot = slot.copy()
-        new_slot["end_time"] = o_start
-        result.append(new_slot)
-    # Después del solapamiento
-    if o_end < s_end:
-        new_slot = slot.copy()
-        new_slot["start_time"] = o_end
-        result.append(new_slot)
-
-    return result
+    intervals = [
+        {"start": slot["start_time"], "end": slot["end_time"], "priority": slot_priority(slot), "slot": slot}
+        for slot in slots
+    ]
+    merged = []
+    for segment in resolve_intervals(intervals):
+        slot = segment["interval"]["slot"].copy()
+        slot["start_time"] = segment["start"]
+        slot["end_time"] = segment["end"]
+        merged.append(slot)
+    return merged
 
 
 @permission_classes([IsAuthenticated])
 class ServiceListForYou(APIView):
     """
-    Lista de servicios más afines al usuario autenticado.
+    Lista de servicios más afines al usuario autenticado. Con los vectores de
+    build_service_vectors se ordenan por su parecido con los que ha reservado;
+    sin ellos, son los de sus categorías más reservadas.
     """
     def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', VECTOR_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "El parámetro 'limit' debe ser un entero"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         user = CustomUser.objects.get(username=request.user)
         if user.rol == "client":
             client= Client.objects.get(user=user)
-            reservations = Reservation.objects.filter(client=client)
-            if not reservations:
-                serializer = ServiceSerializer(reservations, many=True)
+            services = Service.objects.select_related('establishment').prefetch_related('establishment__workers')
+            ids = recommend_services(client.id, limit)
+            if ids is not None:
+                ranked = services.in_bulk(ids)
+                serializer = ServiceSerializer(
+                    [ranked[id] for id in ids if id in ranked], many=True, **get_field_options(request)
+                )
                 return Response(serializer.data)
-            reservation_serializer = ReservationSerializer(reservations, many=True)
-            reserved_services = [reservation["service_details"] for reservation in reservation_serializer.data]
-            # Contar las categorías más repetidas
-            category_list = [service["category"] for service in reserved_services]
-            most_common_categories = [cat for cat, _ in Counter(category_list).most_common(3)]
-            # Obtener mediana de max_people de los servicios reservados
-            avg_max_people = sum(service["max_people"] for service in reserved_services) / len(reserved_services)
+
+            profile = get_client_profile(client.id)
+            if profile is None:
+                return Response([])
+            # Servicios de las categorías más reservadas con un número de personas cercano a la media
+            avg_max_people = profile['party_size']['mean']
             floor_max_people = math.floor(avg_max_people-1)
             ceiling_max_people = math.ceil(avg_max_people+1)
-            # Filtrar servicios por las categorías más comunes (excluyendo los ya reservados)
-            services = Service.objects.filter(category__in=most_common_categories, max_people__lte = ceiling_max_people, max_people__gte = floor_max_people)
+            services = services.filter(
+                id__in=Service.objects.filter(categories__name__in=profile['categories']).values('id'),
+                max_people__lte = ceiling_max_people,
+                max_people__gte = floor_max_people
+            )
         else:
             return Response("Inicia sesión como cliente para ver los servicios", status=403)
 
-        serializer = ServiceSerializer(services, many=True)
+        serializer = ServiceSerializer(services, many=True, **get_field_options(request))
         return Response(serializer.data)
 
 @authentication_classes([])  # Desactiva la autenticación
 @permission_classes([AllowAny])
 class ServiceListRecomendations(APIView):
     def get(self, request):
-        date = request.query_params.get('date') if request.query_params.get('date') != "" else ""
-        
-        
+        date = request.query_params.get('date')
 
         services_dict = {}
         if date != None:
-            service_id = int(request.query_params.get('service')) if request.query_params.get('service') != None else 0
-            view = ServicePriceForDateView()
-            response = ServicePriceForDateView.get(view, request, date=date,service_id=service_id).data
-            for item in response:
-                check = self.check_filter(request, item)
-                if item["time_slot_details"]["schedule_type"] == "specific":
-                    break
-
-                if check:
-                    
-
-                    service_id = item["service"]
-                    
-                    # Si es el primer item de este servicio, inicializar los detalles del servicio
-                    if service_id not in services_dict:
-                        services_dict[service_id] = {
-                            "service": service_id,
-                            "service_details": item["service_details"],
-                            "slots": []
-                        }
-                    
-                    # Añadir el time_slot a la lista de slots de este servicio
-                    slot = {
-                        "id": item["id"],
-                        "price": float(item["price"]) if isinstance(item["price"], str) else item["price"],
-                        "name": item["time_slot_details"]["name"],
-                        "start_time": item["time_slot_details"]["start_time"],
-                        "end_time": item["time_slot_details"]["end_time"],
-                        "color": item["time_slot_details"]["color"],
-                        "schedule_type": item["time_slot_details"]["schedule_type"],
+            try:
+                date_obj = datetime.strptime(date, "%Y-%m-%d").date()
+            except ValueError:
+                return Response(
+                    {"error": "Formato de fecha inválido. Use YYYY-MM-DD"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                service_id = int(request.query_params.get('service')) if request.query_params.get('service') != None else 0
+                filters = self.get_filters(request)
+            except ValueError:
+                return Response(
+                    {"error": "Filtros inválidos: 'service' y 'max_people' son enteros, 'price' un número y las horas HH:MM"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Los filtros se aplican en la consulta, solo se serializan los precios que cumplen
+            prices = get_prices_for_date(date_obj, service_id).filter(filters).with_details()
+
+            # Con texto de búsqueda solo los servicios que coinciden, en la misma consulta
+            search = request.query_params.get('q')
+            if search:
+                prices = prices.filter(service_id__in=match_services(search))
+            for item in ServicePriceAssignmentSerializer(prices, many=True).data:
+                service_id = item["service"]
+                
+                # Si es el primer item de este servicio, inicializar los detalles del servicio
+                if service_id not in services_dict:
+                    services_dict[service_id] = {
+                        "service": service_id,
+                        "service_details": item["service_details"],
+                        "slots": []
                     }
-                    slots = services_dict[service_id]["slots"]
-                    solapado = False
-                    for existing in slots[:]:
-                        # Comprobar solapamiento
-                        s_start = slot["start_time"]
-                        s_end = slot["end_time"]
-                        e_start = existing["start_time"]
-                        e_end = existing["end_time"]
-                        if not (s_end <= e_start or s_start >= e_end):
-                            solapado = True
-                            # Partir el slot a añadir en los huecos que no solapan
-                            slots.remove(existing)
-                            nuevos = split_slot(existing, slot)
-                            for n in nuevos:
-                                slots.append(n)
-
-                            if slot["id"] not in [x["id"] for x in slots]:
-                                slots.append(slot)
-                    if not solapado:
-                        slots.append(slot)
-                else: 
-                    continue
+                
+                # Añadir el time_slot a la lista de slots de este servicio
+                services_dict[service_id]["slots"].append({
+                    "id": item["id"],
+                    "price": float(item["price"]) if isinstance(item["price"], str) else item["price"],
+                    "name": item["time_slot_details"]["name"],
+                    "start_time": item["time_slot_details"]["start_time"],
+                    "end_time": item["time_slot_details"]["end_time"],
+                    "color": item["time_slot_details"]["color"],
+                    "schedule_type": item["time_slot_details"]["schedule_type"],
+                })
+
+        # Resolver los solapamientos de cada servicio en una sola pasada
         for s in services_dict.values():
-            s["slots"].sort(key=lambda x: x["start_time"])  
+            s["slots"] = merge_slots(s["slots"])
 
-        print("SERVICES DICT:", services_dict.values())
-        return Response(list(services_dict.values()))
+        services = list(services_dict.values())
+        # Ordenar por relevancia solo los servicios que cumplen los filtros
+        if services_dict and request.query_params.get('q'):
+            ranking = {id: position for position, id in enumerate(rank_service_ids(request.query_params.get('q'), services_dict))}
+            services.sort(key=lambda s: ranking.get(s["service"], len(ranking)))
+        return Response(services)
 
-    def check_filter(self, request, item):
-        hora_inicio = request.query_params.get('start_time') if request.query_params.get('start_time') != "" else ""
-        hora_fin = request.query_params.get('end_time') if request.query_params.get('end_time') != "" else ""
+    def get_filters(self, request):
+        """
+        Traduce los filtros de la petición a una condición sobre los precios:
+        tramo que contiene start_time y end_time, precio máximo, capacidad
+        mínima y alguna de las categorías separadas por comas.
+        """
+        hora_inicio = request.query_params.get('start_time')
+        hora_fin = request.query_params.get('end_time')
         precio = float(request.query_params.get('price')) if request.query_params.get('price') != None else ""
-        categoria = request.query_params.get('category') if request.query_params.get('category') != "" else ""
+        categoria = request.query_params.get('category')
         max_personas = int(request.query_params.get('max_people')) if request.query_params.get('max_people') != None else 0
-        start_time = item['time_slot_details']['start_time']
-        end_time = item['time_slot_details']['end_time']
-        price = float(item['price'])
-        category = item['service_details']['category']
-        max_people = item['service_details']['max_people']
-    
-        if not start_time or not end_time or not price or not max_people:
-            cumple_filtro = False
-            
-        
-        # Aplicar filtros
-        cumple_filtro = True
-        
+
+        filters = Q()
+
         if hora_inicio:
             hora_inicio_obj = datetime.strptime(hora_inicio, "%H:%M").time()
-            if not (start_time <= hora_inicio_obj and end_time > hora_inicio_obj):
-                cumple_filtro = False
+            filters &= Q(time_slot__time_slot__start_time__lte=hora_inicio_obj, time_slot__time_slot__end_time__gt=hora_inicio_obj)
                 
         if hora_fin:
             hora_fin_obj = datetime.strptime(hora_fin, "%H:%M").time()
-            if not (start_time < hora_fin_obj and end_time >= hora_fin_obj):
-                cumple_filtro = False
+            filters &= Q(time_slot__time_slot__start_time__lt=hora_fin_obj, time_slot__time_slot__end_time__gte=hora_fin_obj)
 
         if precio:
-            if price > precio:
-                cumple_filtro = False
+            filters &= Q(price__lte=precio)
 
-        if max_people:
-            if max_people < max_personas:
-                cumple_filtro = False
+        if max_personas:
+            filters &= Q(service__max_people__gte=max_personas)
 
         if categoria:
-            splited = categoria.split(",")
-            if not any(x in category for x in splited):
-                cumple_filtro = False
+            filters &= Q(service__in=Service.objects.filter(categories__name__in=split_categories(categoria)).values('id'))
 
+        return filters
 
-        return cumple_filtro
+@authentication_classes([])  # Desactiva la autenticación
+@permission_classes([AllowAny])
+class ServiceSearchView(APIView):
+    """
+    Busca servicios por las palabras de su nombre, descripción o categorías,
+    ordenados por relevancia
+    """
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "El parámetro 'limit' debe ser un entero"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = search_service_ids(request.query_params.get('q'), limit)
+        services = Service.objects.select_related('establishment').prefetch_related('establishment__workers').in_bulk(ids)
+        serializer = ServiceSerializer(
+            [services[id] for id in ids if id in services], many=True, **get_field_options(request)
+        )
+        return Response(serializer.data)
+
+@permission_classes([IsAuthenticated])
+class ServiceAvailabilityView(APIView):
+    """
+    Tramos libres con su precio de uno o varios servicios en un rango de
+    fechas, descontando las reservas existentes
+    """
+    def get(self, request):
+        try:
+            service_ids = [int(id) for id in request.query_params.get('service', '').split(',') if id]
+        except ValueError:
+            return Response(
+                {"error": "El parámetro 'service' debe ser una lista de ids separados por comas"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end') or start_str
+
+        if not service_ids or not start_str:
+            return Response(
+                {"error": "Se requieren los parámetros 'service' y 'start' (formato: YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response(
+                {"error": "Formato de fecha inválido. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if start_date > end_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"'start' debe ser anterior a 'end' y el rango no puede superar {MAX_RANGE_DAYS} días"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(get_availability(service_ids, start_date, end_date))
+
+@permission_classes([IsAuthenticated])
+class ServicePriceMatrixView(APIView):
+    """
+    Matriz de precios de un servicio por fecha y tramo para un mes
+    (month=YYYY-MM) o un rango de fechas (start y end)
+    """
+    def get(self, request, pk):
+        service = get_object_or_404(Service, pk=pk)
+        month_str = request.query_params.get('month')
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end')
+
+        try:
+            if month_str:
+                start_date = datetime.strptime(month_str, "%Y-%m").date()
+                # Sin sumar días, que se saldrían del calendario en 9999-12
+                end_date = start_date.replace(day=calendar.monthrange(start_date.year, start_date.month)[1])
+            elif start_str and end_str:
+                start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+                end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+            else:
+                return Response(
+                    {"error": "Se requiere el parámetro 'month' (YYYY-MM) o los parámetros 'start' y 'end' (YYYY-MM-DD)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except ValueError:
+            return Response(
+                {"error": "Formato de fecha inválido. Use YYYY-MM o YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if start_date > end_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"'start' debe ser anterior a 'end' y el rango no puede superar {MAX_RANGE_DAYS} días"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(get_price_matrix(service, start_date, end_date))
 
 @permission_classes([IsAuthenticated])
 class ServicePriceAssignmentListView(APIView):
@@ -360,16 +393,20 @@ class ServicePriceAssignmentListView(APIView):
     def get(self, request, format=None):
         # Filtros opcionales
         service_id = request.query_params.get('service')
+        establishment_id = request.query_params.get('establishment')
         slot_id = request.query_params.get('time_slot')
         schedule_type = request.query_params.get('schedule_type')
         schedule_id = request.query_params.get('schedule_id')
         
-        assignments = ServicePriceAssignment.objects.all()
+        assignments = ServicePriceAssignment.objects.with_details()
         
         # Aplicar filtros si se proporcionan
         if service_id:
             assignments = assignments.filter(service_id=service_id)
         
+        if establishment_id:
+            assignments = assignments.filter(service__establishment_id=establishment_id)
+        
         if slot_id:
             assignments = assignments.filter(time_slot_id=slot_id)
         
@@ -386,8 +423,7 @@ class ServicePriceAssignmentListView(APIView):
             if filter_kwargs:
                 assignments = assignments.filter(**filter_kwargs)
         
-        serializer = ServicePriceAssignmentSerializer(assignments, many=True)
-        return Response(serializer.data)
+        return list_response(request, assignments, ServicePriceAssignmentSerializer)
     
     def post(self, request, format=None):
         serializer = ServicePriceAssignmentSerializer(data=request.data)
@@ -451,12 +487,65 @@ class ServicePriceByServiceView(APIView):
         # Verificar que el servicio existe
         service = get_object_or_404(Service, pk=service_id)
         
-        service_prices = ServicePriceAssignment.objects.filter(service=service)
+        service_prices = ServicePriceAssignment.objects.filter(service=service).with_details()
         serializer = ServicePriceAssignmentSerializer(service_prices, many=True)
         return Response(serializer.data)
     
     
     
+def get_prices_for_date(date_obj, service_id=0):
+    """
+    Precios reservables de los tramos de los horarios que aplican a una fecha,
+    sin evaluar. Con service_id distinto de 0 solo los de ese servicio.
+
+    Solo cuentan los horarios compartidos y los del establecimiento del
+    servicio. Como en ScheduleIndex, un horario semanal o específico propio
+    sustituye a los compartidos del mismo día de la semana o fecha.
+    """
+    weekday = date_obj.weekday()
+    establishment = OuterRef('service__establishment')
+
+    # Horarios propios del establecimiento de cada servicio para esta fecha,
+    # consultados desde los tramos (de ahí la doble referencia exterior)
+    owned_weekly = WeeklySchedule.objects.filter(weekday=weekday, active=True, establishment=OuterRef(establishment))
+    owned_specific = SpecificSchedule.objects.filter(date=date_obj, active=True, establishment=OuterRef(establishment))
+
+    # Obtener horarios específicos para esta fecha
+    specific_slots = SlotAssignment.objects.filter(
+        Q(specific_schedule__establishment=establishment) |
+        Q(specific_schedule__establishment__isnull=True) & ~Exists(owned_specific),
+        pk=OuterRef('time_slot'),
+        specific_schedule__date=date_obj,
+        specific_schedule__active=True
+    )
+    
+    # Obtener horarios semanales para el día de la semana correspondiente
+    weekly_slots = SlotAssignment.objects.filter(
+        Q(weekly_schedule__establishment=establishment) |
+        Q(weekly_schedule__establishment__isnull=True) & ~Exists(owned_weekly),
+        pk=OuterRef('time_slot'),
+        weekly_schedule__weekday=weekday,
+        weekly_schedule__active=True
+    )
+    
+    # Obtener horarios de los grupos que aplican a la fecha
+    group_slots = SlotAssignment.objects.filter(
+        Q(group_schedule__establishment=establishment) | Q(group_schedule__establishment__isnull=True),
+        pk=OuterRef('time_slot'),
+        group_schedule__in=GroupSchedule.objects.applying_to(date_obj)
+    )
+    
+    # Construir la consulta para los precios de servicios
+    query = Exists(specific_slots) | Exists(group_slots) | Exists(weekly_slots)
+    
+    # Filtrar por servicio si se proporciona
+    if service_id != 0:
+        query &= Q(service_id=service_id)
+        
+    # Obtener los precios de servicios
+    return ServicePriceAssignment.objects.filter(query, bookable=True)
+
+
 @permission_classes([IsAuthenticated])
 class ServicePriceForDateView(APIView):
     """
@@ -479,28 +568,7 @@ class ServicePriceForDateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Obtener horarios específicos para esta fecha
-        specific_slots = SlotAssignment.objects.filter(
-            specific_schedule__date=date_obj,
-            specific_schedule__active=True
-        )
-        
-        # Obtener horarios semanales para el día de la semana correspondiente
-        weekday = date_obj.weekday()
-        weekly_slots = SlotAssignment.objects.filter(
-            weekly_schedule__weekday=weekday,
-            weekly_schedule__active=True
-        )
-        
-        # Construir la consulta para los precios de servicios
-        query = Q(time_slot__in=specific_slots) | Q(time_slot__in=weekly_slots)
-        
-        # Filtrar por servicio si se proporciona
-        if service_id != 0:
-            query &= Q(service_id=service_id)
-            
-        # Obtener los precios de servicios
-        service_prices = ServicePriceAssignment.objects.filter(query, bookable= True)
+        service_prices = get_prices_for_date(date_obj, service_id).with_details()
         serializer = ServicePriceAssignmentSerializer(service_prices, many=True)
         
         return Response(serializer.data)
@@ -508,41 +576,42 @@ class ServicePriceForDateView(APIView):
 @permission_classes([IsAuthenticated])
 class ServicePriceRecomendation(APIView):
     """
-    Genera recomendaciones de precios para tramos horarios
+    Genera recomendaciones de precios para tramos horarios. Con ?engine=local
+    se calculan sin llamar al modelo.
     """
 
     def get(self, request, assing_id, service_id):
-        ids = ServicePriceAssignment.objects.filter(bookable = True)
-        prices = ServicePriceAssignmentSerializer(ids, many=True)
-        data_list = []
-        for item in prices.data:
-            dict={}
-            dict['id'] = item['id']
-            dict['price'] = float(item['price'])
-            dict['category'] = item['service_details']['category']
-            dict['max_reservation'] = item['service_details']['max_reservation']
-            dict['max_people'] = item['service_details']['max_people']
-            dict['start_time'] = item['time_slot_details']['start_time']
-            dict['end_time'] =  item['time_slot_details']['end_time']
-            dict['type'] = item['time_slot_details']['schedule_type']['type']
-            if (item['time_slot_details']['schedule_type']['type'] == 'weekly'):
-                dict['weekday'] = item['time_slot_details']['schedule_type']['weekday']
-            else:
-                dict['date']= item['time_slot_details']['schedule_type']['date']
-            data_list.append(dict)
-        
+        engine = request.query_params.get('engine', 'llm')
+        if engine not in RECOMMENDATION_ENGINES:
+            return Response(
+                {"error": f"Motor de recomendación inválido. Use {' o '.join(RECOMMENDATION_ENGINES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         assign_object = get_object_or_404(SlotAssignment, pk=assing_id)
-        assing_data = SlotAssignmentSerializer(assign_object)
-        print("ASSIGN DATA:",assing_data.data)
         service_object = get_object_or_404(Service, pk=service_id)
-        service_data = ServiceSerializer(service_object)
-        print("SERVICE DATA:",service_data.data)
-        print(data_list)
-        result = generate_service_price_recomendation(
-                api_key=OPENAI_API_KEY,
-                historical_data_list=data_list,
-                service=service_data.data,
-                slot=assing_data.data,
+        price_stats = get_price_stats(split_categories(service_object.category))
+
+        result = {}
+        if engine == 'llm' and OPENAI_API_KEY:
+            try:
+                result = generate_service_price_recomendation(
+                    api_key=OPENAI_API_KEY,
+                    price_stats=price_stats,
+                    service=ServiceSerializer(service_object).data,
+                    slot=SlotAssignmentSerializer(assign_object).data,
+                )
+            except OpenAIError as e:
+                print("Error al generar la recomendación con el modelo:", e)
+
+        # El recomendador local responde cuando se pide o cuando el modelo falla o tarda demasiado
+        if not result:
+            schedule_type, weekday = get_schedule_key(assign_object) or (None, None)
+            result = local_service_price_recomendation(
+                price_stats=price_stats,
+                schedule_type=schedule_type,
+                weekday=weekday,
+                bucket=get_bucket(assign_object.time_slot.start_time),
             )
         
         
@@ -0,0 +1,52 @@
+from rest_framework.pagination import CursorPagination as BaseCursorPagination
+from rest_framework.response import Response
+
+from .serializers import DynamicFieldsMixin, get_field_options, optimize_queryset
+
+
+class CursorPagination(BaseCursorPagination):
+    """
+    Keyset pagination: each page continues after the last row of the previous
+    one through an opaque cursor, so its cost does not depend on how deep the
+    page is. The ordering must be on indexed columns.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    ordering = 'id'
+
+
+# Newest first, as the reservation and auction lists are ordered; the id makes
+# the ordering unique so that no row is skipped or repeated between pages
+DATE_ORDERING = ('-starting_date', '-id')
+
+
+def is_paginated(request):
+    """
+    Pagination is opt-in until every client has migrated: a request is paginated
+    when it asks for a page size or follows a cursor
+    """
+    params = request.query_params
+    return CursorPagination.page_size_query_param in params or CursorPagination.cursor_query_param in params
+
+
+def list_response(request, queryset, serializer_class, ordering=CursorPagination.ordering):
+    """
+    Response with every row of the queryset, as the list views have always
+    answered, or with one page and the next and previous links when the
+    request opts in to pagination. Serializers with DynamicFieldsMixin answer
+    with the fields and expansions asked for, reading only what they need;
+    without them the queryset of the view is used as it is.
+    """
+    options = get_field_options(request) if issubclass(serializer_class, DynamicFieldsMixin) else {}
+    if options:
+        orderings = [ordering] if isinstance(ordering, str) else ordering
+        queryset = optimize_queryset(
+            queryset, serializer_class(**options), required=[name.lstrip('-') for name in orderings]
+        )
+    if not is_paginated(request):
+        return Response(serializer_class(queryset, many=True, **options).data)
+    paginator = CursorPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serializer_class(page, many=True, **options).data)
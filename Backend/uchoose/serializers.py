@@ -0,0 +1,125 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import BaseSerializer
+
+
+# Query parameters of the sparse fieldsets
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(value):
+    """Set of the names in a comma separated parameter"""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def split_names(names):
+    """
+    Names of this level and names for each nested field: {'id', 'service.name'}
+    gives {'id', 'service'} and {'service': {'name'}}
+    """
+    own = set()
+    nested = {}
+    for name in names:
+        head, _, rest = name.partition('.')
+        own.add(head)
+        if rest:
+            nested.setdefault(head, set()).add(rest)
+    return own, nested
+
+
+def get_field_options(request):
+    """
+    Keyword arguments of a DynamicFieldsMixin serializer for the fields and
+    expansions asked for in the request. Empty when the request asks for
+    neither, so that the serializer answers with every field as it always has.
+    """
+    params = request.query_params
+    return {
+        option: parse_names(params[option])
+        for option in (FIELDS_PARAM, EXPAND_PARAM)
+        if option in params
+    }
+
+
+def is_expandable(field):
+    """Whether a field embeds a related object"""
+    return isinstance(field, BaseSerializer)
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer that can answer with part of its fields. fields names the
+    columns to include and expand the nested serializers to embed; both
+    accept dotted names for the levels below, as in service_details.name.
+    When either is given, nested serializers are left out unless they are
+    expanded. Without any of them every field is included.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or expand is not None:
+            self.restrict_fields(fields, expand or set())
+
+    def restrict_fields(self, fields, expand):
+        own_fields, nested_fields = split_names(fields or set())
+        own_expand, nested_expand = split_names(expand)
+        for name, field in list(self.fields.items()):
+            if is_expandable(field):
+                # Asking for fields of a related object also embeds it
+                keep = name in own_expand or name in nested_fields
+            else:
+                keep = fields is None or name in own_fields
+            if not keep:
+                self.fields.pop(name)
+                continue
+            # Nested lists restrict the serializer of each item
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, DynamicFieldsMixin):
+                nested.restrict_fields(nested_fields.get(name), nested_expand.get(name, set()))
+
+
+def get_query_plan(serializer, prefix=''):
+    """
+    Relations to join, relations to prefetch and columns to load for a
+    serializer. The columns are None when a field reads something other than
+    a model field, in which case every column is loaded.
+    """
+    model = serializer.Meta.model
+    joins = []
+    prefetches = []
+    columns = [prefix + model._meta.pk.name]
+    for field in serializer.fields.values():
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            # Method fields, properties and the whole object ('*')
+            columns = None
+            continue
+        path = prefix + field.source
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetches.append(path)
+        elif is_expandable(field):
+            nested_joins, nested_prefetches, nested_columns = get_query_plan(field, f"{path}__")
+            joins += [path, *nested_joins]
+            prefetches += nested_prefetches
+            if columns is not None and nested_columns is not None:
+                columns += [path, *nested_columns]
+            else:
+                columns = None
+        elif columns is not None:
+            columns.append(path)
+    return joins, prefetches, columns
+
+
+def optimize_queryset(queryset, serializer, required=()):
+    """
+    Queryset that joins and prefetches only the relations the serializer
+    embeds and loads only the columns it reads, plus the required ones. The
+    joins of the queryset are kept when the serializer has fields that read
+    something other than model fields.
+    """
+    joins, prefetches, columns = get_query_plan(serializer)
+    if columns is not None:
+        # Everything the serializer reads is known, so other joins are not needed
+        queryset = queryset.select_related(None).only(*columns, *required)
+    return queryset.select_related(*joins).prefetch_related(*prefetches)
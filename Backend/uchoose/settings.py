@@ -187,6 +187,16 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Client profiles are kept in the default cache, which is per process. When
+# several worker processes serve the API, point CACHES at a shared backend
+# (Redis or Memcached) in local_settings.py so that invalidating a profile
+# reaches all of them; the database backend also needs "python manage.py
+# createcachetable" on every deploy
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Service vectors of the "for you" recommendations, written by the build_service_vectors command
+SERVICE_VECTORS_DIR = BASE_DIR / 'service_vectors'
+
 try:
     from local_settings import *
 except ImportError:
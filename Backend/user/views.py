@@ -10,13 +10,13 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.contrib.auth.tokens import default_token_generator
+from uchoose.pagination import list_response
 
 @permission_classes([IsAuthenticated, IsAdminUser])
 class UserListView(APIView):
     def get(self, request):
         users = CustomUser.objects.all()
-        serializer = CustomUserSerializer(users, many=True)
-        return Response(serializer.data)
+        return list_response(request, users, CustomUserSerializer)
 
 @permission_classes([IsAuthenticated])    
 class UserDetailView(APIView):